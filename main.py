@@ -3,16 +3,28 @@ import cProfile
 import logging
 import os
 import time
-from typing import Dict
+from pathlib import Path
+from typing import Dict, List, Optional
 import yaml
 
 from utils import log_config
 
+from utils.benchmark import BENCHMARK_BASELINE_FILE, BENCHMARK_HEADER, BENCHMARK_MODES, compare_with_baseline, \
+    load_baseline, run_benchmark, save_baseline
+from utils.http_service import serve
+from utils.output_sink import OUTPUT_SINKS
+from utils.parser import TYPE_FILTERS
 from utils.quiz_processor import QuizProcessor
+from utils.score_analytics import analyze_scores, format_score_report, REPORT_FORMATS, SCORE_REPORT_FILE, \
+    write_score_report
+from utils.score_store import SCORE_STORE_DIR
+from utils.search_index import SearchIndex, SEARCH_INDEX_FILE
+from utils.work_queue import default_worker_id
+from utils.worker_pool import START_METHODS
 
 
 class QuizProcessorMain:
-    def __init__(self):
+    def __init__(self, argv: Optional[List[str]] = None):
         self.file_choices = ["txt", "json", "yaml", "md", "qz.txt"]
         self.default_file = "qz.txt"
 
@@ -20,12 +32,75 @@ class QuizProcessorMain:
         self.parser.add_argument("-f", "--file_type", type=str, default=self.default_file, nargs="+",
                                  choices=self.file_choices,
                                  help=f"File type to save the quiz. Options: {', '.join(self.file_choices)}.")
-        self.parser.add_argument("-c", "--cores", type=int, default=os.cpu_count() // 2,
-                                 help="Number of CPU cores for processing. Default is half the available cores.")
+        self.parser.add_argument("-c", "--cores", type=int, default=None,
+                                 help="Number of CPU cores for processing. Default is chosen from the size of the "
+                                      "input set.")
+        self.parser.add_argument("--config", type=str, default="configurations.yaml",
+                                 help="Path of the configuration file. Default is ./configurations.yaml.")
         self.parser.add_argument("-sj", "--search_json", action="store_true",
                                  help="Search for JSON files instead of HTML and combine all quiz objects represented.")
         self.parser.add_argument("-cb", "--combine", action="store_true",
                                  help="Combine all quizzes found into one quiz item.")
+        self.parser.add_argument("--shard_questions", type=int, default=None,
+                                 help="With -cb, split the combined quiz into shards of at most this many questions.")
+        self.parser.add_argument("--shard_bytes", type=int, default=None,
+                                 help="With -cb, split the combined quiz into shards of about this many bytes at most.")
+        self.parser.add_argument("--types", type=str, nargs="+", default=None, choices=list(TYPE_FILTERS),
+                                 help="Only keep these question types. Questions of other types are skipped before "
+                                      "they are parsed. Default is every type.")
+        self.parser.add_argument("-qb", "--question_bank", action="store_true",
+                                 help="Add every parsed question to the persistent question bank.")
+        self.parser.add_argument("-eb", "--export_bank", action="store_true",
+                                 help="Export the persistent question bank as question_bank.[ext].")
+        self.parser.add_argument("-ix", "--search_index", action="store_true",
+                                 help="Add every parsed question to the search index used by the search command.")
+        self.parser.add_argument("-rc", "--reconcile", action="store_true",
+                                 help="Record what every attempt reveals about each answer, and fill in unanswered "
+                                      "questions from other attempts when combining (-cb) or exporting (-eb).")
+        self.parser.add_argument("-sc", "--record_scores", action="store_true",
+                                 help="Record the points earned in every question attempt for the analytics command.")
+        self.parser.add_argument("-o", "--output_sink", type=str, default="files", choices=OUTPUT_SINKS,
+                                 help="Where per-quiz output goes: one file per quiz and file type (files), one "
+                                      "JSON Lines file (jsonl), or one zip/tar archive per file type. "
+                                      "Default is files.")
+        self.parser.add_argument("--metrics_file", type=str, default=None,
+                                 help="Rewrite this file with live run metrics in Prometheus text format while "
+                                      "processing.")
+        self.parser.add_argument("--metrics_interval", type=float, default=10,
+                                 help="Seconds between rewrites of --metrics_file. Default is 10.")
+        self.parser.add_argument("--metrics_port", type=int, default=None,
+                                 help="Serve live run metrics on http://127.0.0.1:PORT/metrics while processing.")
+        self.parser.add_argument("-t", "--timeout", type=float, default=300,
+                                 help="Seconds a single file may take before it is abandoned and quarantined. "
+                                      "0 disables the limit. Default is 300.")
+        self.parser.add_argument("--no_prefilter", action="store_true",
+                                 help="Parse every input file, including those whose first chunk does not look like a "
+                                      "quiz page.")
+        self.parser.add_argument("--split_threshold", type=int, default=200,
+                                 help="Pages with more questions than this are split and parsed across all workers. "
+                                      "0 disables splitting. Default is 200.")
+        self.parser.add_argument("-sm", "--start_method", type=str, default=None, choices=START_METHODS,
+                                 help="How worker processes are started. Default is the platform default.")
+        self.parser.add_argument("-dq", "--distributed", action="store_true",
+                                 help="Claim files from a raw_html directory shared with other hosts or processes. "
+                                      "Cannot use with -dm or -cb.")
+        self.parser.add_argument("--worker_id", type=str, default=default_worker_id(),
+                                 help="Name of this worker in distributed mode. Default is <hostname>-<pid>.")
+        self.parser.add_argument("--lease_seconds", type=float, default=900,
+                                 help="How long a claimed file stays reserved without a renewal in distributed mode. "
+                                      "Default is 900.")
+        self.parser.add_argument("--profile_memory", action="store_true",
+                                 help="Trace allocations of parsing, combining and writing in every process and add "
+                                      "a memory profile to the run summary. Slows the run down.")
+        self.parser.add_argument("--resume", action="store_true",
+                                 help="Skip the files an interrupted earlier run already finished, using the run "
+                                      "journal. Cannot use with -cb, -sj or -dq.")
+        self.parser.add_argument("--dry_run", "--dry-run", action="store_true",
+                                 help="Print the execution plan for the input set and exit without processing.")
+
+        self.parser.add_argument("-ca", "--compact_archive", action="store_true",
+                                 help="Archive processed pages in parsed_html as <title>.html.gz, stripped down to "
+                                      "the title and questions. Ignored with -rm and -dm.")
 
         exclusive_group = self.parser.add_mutually_exclusive_group()
         exclusive_group.add_argument("-rm", "--remove_html", action="store_true",
@@ -33,17 +108,91 @@ class QuizProcessorMain:
         exclusive_group.add_argument("-dm", "--dont_move", action="store_true",
                                      help="Keep .html files in origin directory with original names. Cannot use with -rm flag.")
 
-        self.args = self.parser.parse_args()
+        subparsers = self.parser.add_subparsers(dest="command", title="commands")
+        search_parser = subparsers.add_parser("search", help="Search the indexed questions.")
+        search_parser.add_argument("query", type=str,
+                                   help='Keywords to rank by. Wrap phrases that must match exactly in quotes.')
+        search_parser.add_argument("-n", "--limit", type=int, default=10,
+                                   help="Maximum number of results. Default is 10.")
+        index_parser = subparsers.add_parser("index", help="Add quiz JSON exports to the search index.")
+        index_parser.add_argument("json_dir", type=str, nargs="?", default=None,
+                                  help="Directory containing the .json exports. Default is the output directory.")
+
+        serve_parser = subparsers.add_parser("serve", help="Run a local HTTP conversion service.")
+        serve_parser.add_argument("--host", type=str, default="127.0.0.1",
+                                  help="Address to listen on. Default is 127.0.0.1 (this machine only).")
+        serve_parser.add_argument("--port", type=int, default=8765, help="Port to listen on. Default is 8765.")
+        serve_parser.add_argument("--max_concurrent", type=int, default=None,
+                                  help="Conversions allowed in flight at once. Default is twice the number of cores.")
+        serve_parser.add_argument("--queue_timeout", type=float, default=30,
+                                  help="Seconds a request waits for a free slot before a 503. Default is 30.")
+
+        analytics_parser = subparsers.add_parser("analytics",
+                                                 help="Report question difficulty and quiz score distributions from "
+                                                      "the points recorded with -sc. Needs NumPy.")
+        analytics_parser.add_argument("-n", "--top", type=int, default=20,
+                                      help="How many of the most missed questions to list. Default is 20.")
+        analytics_parser.add_argument("--report", type=str, nargs="+", default=["json"], choices=REPORT_FORMATS,
+                                      help="Report formats written to the output directory: score_report.json, or "
+                                           "score_report_questions.csv and score_report_quizzes.csv. "
+                                           "Default is json.")
+
+        benchmark_parser = subparsers.add_parser("benchmark",
+                                                 help="Measure how processing scales with cores and input size.")
+        benchmark_parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100],
+                                      help="Corpus sizes to run, in files. Default is 20 100.")
+        benchmark_parser.add_argument("--core_counts", type=int, nargs="+", default=None,
+                                      help="Worker counts to run with. 1 is always included. Default is 1, 2, 4 "
+                                           "and all cores, up to the available cores.")
+        benchmark_parser.add_argument("--modes", type=str, nargs="+", default=list(BENCHMARK_MODES),
+                                      choices=list(BENCHMARK_MODES),
+                                      help="Modes to run: default, combine (-cb), search_json (-sj -cb). "
+                                           "Default is all.")
+        benchmark_parser.add_argument("--formats", type=str, nargs="+", default=None,
+                                      help="Output file type combinations to run, each comma-separated, e.g. "
+                                           "qz.txt txt,json. Default is each file type alone and all together.")
+        benchmark_parser.add_argument("--questions", type=int, default=50,
+                                      help="Questions per generated quiz page. Default is 50.")
+        benchmark_parser.add_argument("--baseline", type=str, default=None,
+                                      help="Baseline file to compare with. Default is benchmark_baseline.json in "
+                                           "the state directory.")
+        benchmark_parser.add_argument("--save_baseline", action="store_true",
+                                      help="Store these results as the new baseline.")
+        benchmark_parser.add_argument("--tolerance", type=float, default=0.1,
+                                      help="Relative drop in throughput or efficiency flagged as a regression. "
+                                           "Default is 0.1.")
+
+        self.args = self.parser.parse_args(argv)
+
+        if self.args.distributed and (self.args.dont_move or self.args.combine or self.args.search_json):
+            # Files must leave the shared queue once processed, and a combined quiz needs every file on one host
+            self.parser.error("-dq cannot be used with -dm, -cb or -sj")
 
-        # Ensure the number of cores is between 1 and the total number of cores
-        self.args.cores = max(min(self.args.cores, os.cpu_count()), 1)
+        if self.args.resume and (self.args.combine or self.args.search_json or self.args.distributed):
+            # A combined quiz needs every file again, and distributed runs recover through their leases
+            self.parser.error("--resume cannot be used with -cb, -sj or -dq")
+
+        if self.args.shard_questions is not None or self.args.shard_bytes is not None:
+            if not self.args.combine:
+                self.parser.error("--shard_questions and --shard_bytes need -cb")
+            if min(limit for limit in (self.args.shard_questions, self.args.shard_bytes) if limit is not None) < 1:
+                self.parser.error("--shard_questions and --shard_bytes must be at least 1")
+
+        if self.args.metrics_interval <= 0:
+            self.parser.error("--metrics_interval must be greater than 0")
+
+        # Ensure the number of cores is between 1 and the total number of cores. None lets the planner decide.
+        if self.args.cores is not None:
+            self.args.cores = max(min(self.args.cores, os.cpu_count()), 1)
 
         self.directories = self.load_directory_paths()
 
         self.create_output_directories()
 
+        log_config.setup_logging(self.directories["logs"])
+
     def load_directory_paths(self) -> Dict[str, str]:
-        with open("configurations.yaml", "r") as f:
+        with open(self.args.config, "r") as f:
             paths = yaml.safe_load(f)
         return paths["directory_paths"]
 
@@ -53,8 +202,83 @@ class QuizProcessorMain:
                 os.makedirs(path)
 
     def main(self):
-        quiz_processor = QuizProcessor(self.args, self.directories)
-        quiz_processor.process_files()
+        if self.args.command == "search":
+            self.search()
+        elif self.args.command == "index":
+            self.index()
+        elif self.args.command == "benchmark":
+            self.benchmark()
+        elif self.args.command == "analytics":
+            self.analytics()
+        elif self.args.command == "serve":
+            # A service has no input set to plan from
+            cores = self.args.cores or max(os.cpu_count() // 2, 1)
+            serve(self.args.host, self.args.port, cores, self.args.max_concurrent or cores * 2,
+                  self.args.queue_timeout, self.args.timeout, self.args.start_method, self.directories["logs"])
+        else:
+            quiz_processor = QuizProcessor(self.args, self.directories)
+            quiz_processor.process_files()
+
+    def search(self) -> None:
+        start = time.perf_counter()
+        with SearchIndex(Path(self.directories["state"]) / SEARCH_INDEX_FILE) as index:
+            results = index.search(self.args.query, self.args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        for rank, result in enumerate(results, start=1):
+            print(f"{rank}. [{result.score:.2f}] {result.title} ({result.question_type})\n"
+                  f"   Question: {result.question}\n   Answer: {result.answer}")
+        print(f"{len(results)} result(s) in {elapsed_ms:.1f} ms")
+
+    def index(self) -> None:
+        json_dir = Path(self.args.json_dir or self.directories["output"])
+        with SearchIndex(Path(self.directories["state"]) / SEARCH_INDEX_FILE) as index:
+            indexed, skipped = index.add_json_files(json_dir)
+        print(f"Indexed {indexed} JSON file(s) from {json_dir}, skipped {skipped} unchanged file(s)")
+
+    def analytics(self) -> None:
+        start = time.perf_counter()
+        report = analyze_scores(Path(self.directories["state"]) / SCORE_STORE_DIR, self.args.top)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        for line in format_score_report(report):
+            print(line)
+        for report_format in self.args.report:
+            for path in write_score_report(report, Path(self.directories["output"]) / SCORE_REPORT_FILE, report_format):
+                print(f"Wrote {path}")
+        print(f"Analyzed in {elapsed_ms:.1f} ms")
+
+    def benchmark(self) -> None:
+        if self.args.formats:
+            format_sets = [value.split(",") for value in self.args.formats]
+        else:
+            format_sets = [[file_type] for file_type in self.file_choices] + [self.file_choices]
+        unsupported = {file_type for file_types in format_sets for file_type in file_types} - set(self.file_choices)
+        if unsupported:
+            self.parser.error(f"Unsupported file type(s): {', '.join(sorted(unsupported))}")
+
+        # More workers than cores would only measure contention, and main.py clamps them anyway
+        core_counts = self.args.core_counts or [1, 2, 4, os.cpu_count()]
+        core_counts = sorted({cores for cores in core_counts if 1 <= cores <= os.cpu_count()})
+
+        print(BENCHMARK_HEADER)
+        results = run_benchmark(self.args.sizes, core_counts, self.args.modes, format_sets, self.args.questions,
+                                work_dir=Path(self.directories["state"]))
+
+        baseline_path = Path(self.args.baseline or Path(self.directories["state"]) / BENCHMARK_BASELINE_FILE)
+        regressions = []
+        if baseline_path.exists():
+            regressions = compare_with_baseline(results, load_baseline(baseline_path), self.args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            print(f"{len(regressions)} regression(s) against {baseline_path}")
+
+        if self.args.save_baseline:
+            save_baseline(baseline_path, results)
+            print(f"Saved {len(results)} result(s) as the baseline in {baseline_path}")
+
+        if regressions:
+            raise SystemExit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+import logging
+import random
+from pathlib import Path
+from typing import List
+
+import pytest
+import yaml
+
+from main import QuizProcessorMain
+from utils.benchmark import generate_question
+from utils.quiz_processor import QuizProcessor
+
+DIRECTORIES = ["parsed_html", "raw_html", "quarantine", "rejected", "output", "logs", "state"]
+
+
+def quiz_page(title: str, questions: int = 3, mixed: bool = False) -> str:
+    """
+    A minimal Canvas quiz results page with ``questions`` answered multiple choice questions. With ``mixed``, the
+    questions cycle through every question type instead, like the benchmark corpus.
+    """
+    if mixed:
+        rng = random.Random(title)
+        items = "".join(generate_question(number, rng) for number in range(questions))
+        return f"<html><head><title>{title}: Quiz</title></head><body>{items}</body></html>"
+
+    items = []
+    for number in range(questions):
+        items.append(
+            f'<div aria-label="Question"><div class="display_question question multiple_choice_question">'
+            f'<div class="user_points">1 / 1 pts</div>'
+            f'<textarea name="question_text">&lt;p&gt;{title} question {number}?&lt;/p&gt;</textarea>'
+            f'<div class="answer correct_answer"><div class="answer_text">Right {number}</div></div>'
+            f'<div class="answer"><div class="answer_text">Wrong {number}</div></div>'
+            f'</div></div>')
+    return f"<html><head><title>{title}: Quiz</title></head><body>{''.join(items)}</body></html>"
+
+
+class Workspace:
+    """
+    A configuration file and the directories it points to, all under a temporary directory.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.directories = {name: str(root / name) for name in DIRECTORIES}
+        self.config = root / "configurations.yaml"
+        self.config.write_text(yaml.safe_dump({"directory_paths": self.directories}), encoding="utf-8")
+
+    def path(self, name: str) -> Path:
+        return Path(self.directories[name])
+
+    def add_pages(self, count: int, questions: int = 3, prefix: str = "page") -> List[Path]:
+        raw_html = self.path("raw_html")
+        raw_html.mkdir(parents=True, exist_ok=True)
+        pages = []
+        for number in range(count):
+            page = raw_html / f"{prefix}{number:03}.html"
+            page.write_text(quiz_page(f"{prefix.title()} {number}", questions), encoding="utf-8")
+            pages.append(page)
+        return pages
+
+    def processor(self, *argv: str) -> QuizProcessor:
+        main = QuizProcessorMain(["--config", str(self.config), *argv])
+        return QuizProcessor(main.args, main.directories)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    yield Workspace(tmp_path)
+    # QuizProcessorMain sets up logging into the temporary directory every time
+    for handler in root_logger.handlers[len(handlers):]:
+        handler.close()
+    root_logger.handlers[:] = handlers
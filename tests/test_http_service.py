@@ -0,0 +1,67 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import utils.http_service
+from utils.http_service import ConversionService
+from utils.worker_pool import FileTimeoutError, WorkerPool
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGALRM"), reason="needs POSIX signals and fork")
+
+
+def fake_convert(html_content, file_types):
+    seconds, _, action = html_content.partition(":")
+    time.sleep(float(seconds))
+    if action == "crash":
+        os._exit(1)
+    return {"title": html_content, "outputs": {}}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(utils.http_service, "convert_html", fake_convert)
+    with WorkerPool(2, "fork") as pool:
+        yield ConversionService(pool, max_concurrent=2, queue_timeout=1, timeout=1)
+
+
+def convert_in_thread(service, html_content, outcomes):
+    def run():
+        try:
+            outcomes[html_content] = service.convert(html_content, ["txt"])
+        except Exception as ex:
+            outcomes[html_content] = ex
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_a_request_timing_out_leaves_the_others_running(service):
+    outcomes = {}
+    slow = convert_in_thread(service, "10", outcomes)
+    time.sleep(0.6)
+    in_flight = convert_in_thread(service, "0.8", outcomes)
+    slow.join()
+    in_flight.join()
+
+    assert isinstance(outcomes["10"], FileTimeoutError)
+    assert outcomes["0.8"] == {"title": "0.8", "outputs": {}}
+    assert service.pool.generation == 0
+
+
+def test_a_broken_pool_is_recycled_once(service):
+    outcomes = {}
+    bystander = convert_in_thread(service, "0.8", outcomes)
+    time.sleep(0.2)
+    crash = convert_in_thread(service, "0:crash", outcomes)
+    bystander.join()
+    crash.join()
+
+    assert isinstance(outcomes["0:crash"], BrokenProcessPool)
+    assert isinstance(outcomes["0.8"], BrokenProcessPool)
+    assert service.pool.generation == 1
+    assert service.convert("0", ["txt"]) == {"title": "0", "outputs": {}}
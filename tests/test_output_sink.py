@@ -0,0 +1,52 @@
+import json
+import zipfile
+
+import pytest
+
+from utils.output_sink import ZipSink
+
+
+def journal_states(workspace):
+    with open(workspace.path("state") / "run_journal.jsonl", encoding="utf-8") as journal:
+        return [json.loads(line)["state"] for line in journal]
+
+
+def test_pages_are_archived_once_the_bundle_is_closed(workspace):
+    workspace.add_pages(3)
+    workspace.processor("-o", "zip", "-f", "json").process_files()
+
+    bundles = list(workspace.path("output").glob("bundle_*_json.zip"))
+    assert len(bundles) == 1
+    with zipfile.ZipFile(bundles[0]) as bundle:
+        assert len(bundle.namelist()) == 3
+    assert not list(workspace.path("raw_html").iterdir())
+    assert len(list(workspace.path("parsed_html").iterdir())) == 3
+    assert journal_states(workspace).count("moved") == 3
+
+
+def test_interrupted_bundle_leaves_pages_for_the_next_run(workspace, monkeypatch):
+    pages = workspace.add_pages(3)
+
+    def crash(sink):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ZipSink, "close", crash)
+        with pytest.raises(OSError):
+            workspace.processor("-o", "zip", "-f", "json").process_files()
+
+    assert all(page.exists() for page in pages)
+    assert "moved" not in journal_states(workspace)
+
+    processor = workspace.processor("-o", "zip", "-f", "json", "--resume")
+    processor.process_files()
+    assert processor.report.processed == 3
+    assert not list(workspace.path("raw_html").iterdir())
+
+
+def test_bundles_started_in_the_same_second_get_different_names(tmp_path):
+    first = ZipSink(tmp_path, ["json"])
+    second = ZipSink(tmp_path, ["json"])
+    first.close()
+    second.close()
+    assert first.bundle_name != second.bundle_name
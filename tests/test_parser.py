@@ -0,0 +1,49 @@
+from itertools import combinations
+
+import pytest
+
+from tests.conftest import quiz_page
+from utils.parser import assemble_quiz, filter_fragments, parse_fragments, process_html, question_type_filter, \
+    split_html, TYPE_FILTERS
+from utils.quiz import QUIZ_SECTIONS
+
+PAGE = quiz_page("Mixed", 24, mixed=True)
+TYPE_NAMES = sorted(TYPE_FILTERS)
+
+
+def sections(quiz):
+    return {attribute: [question.to_dict() for question in getattr(quiz, attribute)]
+            for _, attribute, _ in QUIZ_SECTIONS}
+
+
+def expected_sections(full, type_names):
+    kept = {TYPE_FILTERS[name][0] for name in type_names}
+    return {attribute: questions if attribute in kept else [] for attribute, questions in sections(full).items()}
+
+
+def test_the_page_has_every_question_type():
+    full = process_html(PAGE)
+    assert all(sections(full)[TYPE_FILTERS[name][0]] for name in TYPE_NAMES)
+
+
+@pytest.mark.parametrize("type_names", [[name] for name in TYPE_NAMES] + [list(pair) for pair in
+                                                                          combinations(TYPE_NAMES, 2)])
+def test_a_filtered_parse_keeps_exactly_the_sections_of_a_full_parse(type_names):
+    full = process_html(PAGE)
+    filtered = process_html(PAGE, question_type_filter(type_names))
+
+    assert filtered.title == full.title
+    assert sections(filtered) == expected_sections(full, type_names)
+    assert filtered.number_of_questions == sum(len(questions) for questions in sections(filtered).values())
+    assert filtered.number_of_questions < full.number_of_questions
+
+
+@pytest.mark.parametrize("type_names", [["multiple_choice"], ["matching", "short_answer"]])
+def test_split_pages_are_filtered_the_same_way(type_names):
+    question_types = question_type_filter(type_names)
+    title, fragments = split_html(PAGE)
+    kept = filter_fragments(fragments, question_types)
+    quiz = assemble_quiz(title, kept, parse_fragments(kept, question_types), question_types)
+
+    assert sections(quiz) == sections(process_html(PAGE, question_types))
+    assert quiz.number_of_questions == process_html(PAGE, question_types).number_of_questions
@@ -0,0 +1,63 @@
+import gzip
+
+from tests.conftest import quiz_page
+
+
+def add_misfits(workspace):
+    raw_html = workspace.path("raw_html")
+    raw_html.mkdir(parents=True, exist_ok=True)
+    login_page = raw_html / "login.html"
+    login_page.write_text("<html><head><title>Log in</title></head><body><form></form></body></html>",
+                          encoding="utf-8")
+    truncated = raw_html / "truncated.html.gz"
+    truncated.write_bytes(gzip.compress(quiz_page("Truncated", 20).encode("utf-8"))[:200])
+    return [login_page, truncated]
+
+
+def rejected_names(workspace):
+    return sorted(path.name for path in workspace.path("rejected").iterdir())
+
+
+def test_pages_that_are_not_quizzes_are_rejected_without_parsing(workspace):
+    pages = workspace.add_pages(2)
+    misfits = add_misfits(workspace)
+    processor = workspace.processor("-f", "json")
+    processor.process_files()
+
+    assert processor.report.processed == len(pages)
+    assert not processor.report.failed
+    assert sorted(rejected.source for rejected in processor.report.rejected) == misfits
+    assert rejected_names(workspace) == ["login.html", "truncated.html.gz"]
+    assert not list(workspace.path("quarantine").glob("*"))
+
+
+def test_no_prefilter_hands_every_page_to_the_parser(workspace):
+    workspace.add_pages(2)
+    add_misfits(workspace)
+    processor = workspace.processor("-f", "json", "--no_prefilter")
+    processor.process_files()
+
+    assert not processor.report.rejected
+    assert not workspace.path("rejected").exists() or not rejected_names(workspace)
+    # The truncated page can't even be read, so the parser fails on it
+    assert [failed.source.name for failed in processor.report.failed] == ["truncated.html.gz"]
+
+
+def test_dry_run_only_counts_rejected_pages(workspace, capsys):
+    workspace.add_pages(2)
+    misfits = add_misfits(workspace)
+    workspace.processor("--dry_run").process_files()
+
+    assert "2 file(s) do not look like quiz pages" in capsys.readouterr().out
+    assert all(misfit.exists() for misfit in misfits)
+    assert not workspace.path("rejected").exists() or not rejected_names(workspace)
+
+
+def test_rejected_pages_are_copied_once_with_dont_move(workspace):
+    workspace.add_pages(1)
+    misfits = add_misfits(workspace)
+    for _ in range(3):
+        workspace.processor("-f", "json", "-dm").process_files()
+
+    assert all(misfit.exists() for misfit in misfits)
+    assert rejected_names(workspace) == ["login.html", "truncated.html.gz"]
@@ -0,0 +1,66 @@
+import json
+
+from utils.quiz import LazyQuiz, Quiz, QUIZ_SECTIONS
+
+
+def export_with_extra_keys():
+    return {
+        "title": "Quiz",
+        "number_of_questions": 2,
+        "exported_by": "a newer version",
+        "multiple_choice_questions": [
+            {"question": "Which?", "answer": "A", "choices": ["A", "B"], "points": [1, 1]},
+        ],
+        "matching_questions": [],
+        "multiple_answers_questions": [],
+        "multiple_short_answer_questions": [],
+        "short_answer_questions": [{"question": "Why?", "answer": "Because", "feedback": "Well done"}],
+    }
+
+
+def test_unknown_question_keys_are_ignored():
+    quiz = Quiz.from_json(export_with_extra_keys())
+    lazy_quiz = LazyQuiz(export_with_extra_keys())
+
+    assert quiz.multiple_choice_questions[0].answer == "A"
+    assert lazy_quiz.materialize().to_dict() == quiz.to_dict()
+    assert [question.answer for question in lazy_quiz.short_answer_questions] == ["Because"]
+    assert lazy_quiz.multiple_choice_questions[:1] == quiz.multiple_choice_questions
+
+
+def export_text(indent=4):
+    quiz = Quiz.from_json(export_with_extra_keys())
+    # Text that looks like a top-level member once the newline is escaped
+    quiz.short_answer_questions[0].question = 'Why?\n    "title": "Not the title",'
+    return json.dumps(quiz.to_dict(), ensure_ascii=False, indent=indent)
+
+
+def test_sections_are_decoded_on_first_use():
+    lazy_quiz = LazyQuiz.from_text(export_text())
+
+    assert lazy_quiz.title == "Quiz"
+    assert lazy_quiz.number_of_questions == 2
+    assert all(isinstance(getattr(lazy_quiz, attribute)._entries, str) for _, attribute, _ in QUIZ_SECTIONS)
+    assert lazy_quiz.materialize().to_dict() == json.loads(export_text())
+
+
+def test_sections_that_are_not_kept_are_never_decoded():
+    lazy_quiz = LazyQuiz.from_text(export_text(), sections=["short_answer_questions"])
+
+    assert lazy_quiz.number_of_questions == 1
+    assert lazy_quiz.multiple_choice_questions._entries == []
+    assert lazy_quiz.short_answer_questions[0].question.startswith("Why?\n")
+
+
+def test_exports_in_another_layout_are_decoded_whole():
+    for indent in (None, 2):
+        assert LazyQuiz.from_text(export_text(indent)).materialize().to_dict() == json.loads(export_text())
+
+
+def test_members_are_found_in_any_order_and_unknown_members_are_skipped():
+    export = json.loads(export_text())
+    reordered = {"exported_by": {"version": 2}, **dict(reversed(list(export.items()))), "notes": ["a", "b"]}
+
+    lazy_quiz = LazyQuiz.from_text(json.dumps(reordered, indent=4))
+
+    assert lazy_quiz.materialize().to_dict() == export
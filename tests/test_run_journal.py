@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import utils.quiz_processor
+from utils.quiz_processor import QuizProcessor
+from utils.run_journal import RunJournal
+
+
+def journal_entries(workspace):
+    with open(workspace.path("state") / "run_journal.jsonl", encoding="utf-8") as journal:
+        return [json.loads(line) for line in journal]
+
+
+@pytest.mark.parametrize("archive_flags", [[], ["-ca"]])
+def test_a_run_killed_before_archiving_is_resumed_by_archiving_only(workspace, monkeypatch, capsys, archive_flags):
+    pages = workspace.add_pages(3)
+    archive_html_file = QuizProcessor.archive_html_file
+
+    def killed_on_second_page(processor, raw_html_file, *args):
+        if raw_html_file == pages[1]:
+            raise KeyboardInterrupt
+        archive_html_file(processor, raw_html_file, *args)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(QuizProcessor, "archive_html_file", killed_on_second_page)
+        with pytest.raises(KeyboardInterrupt):
+            workspace.processor("-f", "json", "txt", *archive_flags).process_files()
+
+    states = [entry["state"] for entry in journal_entries(workspace) if entry["file"] == pages[1].name]
+    assert states == ["discovered", "parsed", "written:json", "written:txt"]
+    assert pages[1].exists()
+
+    process_html = utils.quiz_processor.process_html
+    parsed = []
+
+    def record_parse(html_content, question_types=None):
+        parsed.append(html_content)
+        return process_html(html_content, question_types)
+
+    monkeypatch.setattr(utils.quiz_processor, "process_html", record_parse)
+    processor = workspace.processor("-f", "json", "txt", "--resume", *archive_flags)
+    processor.process_files()
+
+    assert "1 of which only needed archiving" in capsys.readouterr().out
+    assert not any("Page 1:" in html_content for html_content in parsed)
+    assert not list(workspace.path("raw_html").iterdir())
+    assert len(list(workspace.path("parsed_html").iterdir())) == 3
+    assert journal_entries(workspace)[-1]["state"] == "moved"
+
+
+def test_attempts_of_the_same_quiz_are_archived_separately(workspace):
+    pages = workspace.add_pages(2)
+    pages[1].write_text(pages[0].read_text(encoding="utf-8"), encoding="utf-8")
+    processor = workspace.processor("-ca", "-f", "json")
+    parsed_html = workspace.path("parsed_html")
+
+    with RunJournal(workspace.path("state") / "run_journal.jsonl", resume=False) as processor.journal:
+        results = [processor.process_single_file(page, workspace.path("output"), parsed_html) for page in pages]
+        for result in results:
+            processor.finish_result(result)
+
+    assert not processor.report.failed
+    assert not any(page.exists() for page in pages)
+    assert [path.name for path in parsed_html.iterdir()] == ["Page-0-Quiz.html.gz"]
+
+
+def test_a_page_that_cannot_be_archived_fails_alone(workspace, monkeypatch):
+    pages = workspace.add_pages(3)
+    archive_html_file = QuizProcessor.archive_html_file
+
+    def read_only_second_page(processor, raw_html_file, *args):
+        if raw_html_file == pages[1]:
+            raise PermissionError("read-only")
+        archive_html_file(processor, raw_html_file, *args)
+
+    monkeypatch.setattr(QuizProcessor, "archive_html_file", read_only_second_page)
+    processor = workspace.processor("-f", "json")
+    processor.process_files()
+
+    assert processor.report.processed == 2
+    assert [failed.source for failed in processor.report.failed] == [pages[1]]
+    assert [entry["state"] for entry in journal_entries(workspace) if entry["file"] == pages[1].name][-1] == "failed"
@@ -0,0 +1,54 @@
+import re
+from collections import Counter
+
+import utils.run_metrics
+from utils.run_metrics import LatencyHistogram, RunMetrics
+from utils.run_report import RunReport
+
+SAMPLE_PATTERN = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+LABEL_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+def parse_exposition(text):
+    """
+    Reads the text exposition format back into {(name, labels): value}, checking every sample belongs to a family
+    declared before it.
+    """
+    assert text.endswith("\n")
+    families, samples = set(), {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            families.add(line.split()[2])
+            continue
+        if line.startswith("#"):
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        assert match, line
+        name = match["name"]
+        assert name in families or re.sub(r"_(bucket|sum|count)$", "", name) in families, line
+        labels = tuple(LABEL_PATTERN.findall(match["labels"] or ""))
+        samples[(name, labels)] = float(match["value"])
+    return samples
+
+
+def test_large_counters_keep_every_digit(monkeypatch):
+    # Only the reported worker, not what earlier tests measured in this process
+    monkeypatch.setattr(utils.run_metrics, "_stage_latency", {})
+    monkeypatch.setattr(utils.run_metrics, "_questions", Counter())
+    report = RunReport()
+    report.processed = 1234567
+    histogram = LatencyHistogram()
+    for _ in range(3):
+        histogram.observe(1234567.891)
+    metrics = RunMetrics(report)
+    metrics.start_run(4)
+    metrics.record_worker(1, {"stages": {"parse": histogram.to_dict()}, "questions": {"matching": 987654321},
+                              "normalization": {}})
+
+    samples = parse_exposition(metrics.render())
+
+    assert samples[("quiz_files_processed_total", ())] == 1234567
+    assert samples[("quiz_questions_total", (("type", "matching"),))] == 987654321
+    assert samples[("quiz_stage_duration_seconds_sum", (("stage", "parse"),))] == 3703.703673
+    assert samples[("quiz_stage_duration_seconds_bucket", (("stage", "parse"), ("le", "+Inf")))] == 3
+    assert samples[("quiz_workers", ())] == 4
@@ -0,0 +1,58 @@
+import os
+from array import array
+
+from utils.questions import MultipleChoiceQuestion
+from utils.quiz import Quiz
+from utils.score_store import column_path, ROW_COLUMNS, ScoreStore
+
+
+def scored_quiz(title, scores):
+    quiz = Quiz(title=title, number_of_questions=len(scores))
+    for number, (earned, possible) in enumerate(scores):
+        question = MultipleChoiceQuestion(question=f"Question {number}?", answer="A", choices=["A", "B"])
+        # Set the way the parser sets it for a scored attempt
+        question._points = (earned, possible)
+        quiz.add_question(question)
+    return quiz
+
+
+def read_rows(store_dir):
+    columns = {}
+    for name, typecode in ROW_COLUMNS.items():
+        columns[name] = array(typecode)
+        with open(column_path(store_dir, name), "rb") as column_file:
+            columns[name].frombytes(column_file.read())
+    assert len({len(values) for values in columns.values()}) == 1
+    return list(zip(*(columns[name] for name in ROW_COLUMNS)))
+
+
+def cut_last_value(store_dir, name, typecode):
+    path = column_path(store_dir, name)
+    os.truncate(path, path.stat().st_size - array(typecode).itemsize)
+
+
+def test_uneven_columns_are_trimmed_before_appending(tmp_path):
+    with ScoreStore(tmp_path) as store:
+        store.record_quiz(scored_quiz("First", [(1, 2), (3, 4)]))
+        store.record_quiz(scored_quiz("Second", [(5, 6), (7, 8)]))
+    cut_last_value(tmp_path, "earned", "f")
+
+    with ScoreStore(tmp_path) as store:
+        store.record_quiz(scored_quiz("Third", [(9, 10)]))
+
+    assert read_rows(tmp_path) == [(0, 0, 1, 2), (1, 0, 3, 4), (0, 1, 5, 6), (0, 2, 9, 10)]
+
+
+def test_rows_of_an_attempt_that_was_never_written_are_dropped(tmp_path):
+    with ScoreStore(tmp_path) as store:
+        store.record_quiz(scored_quiz("First", [(1, 2)]))
+        store.record_quiz(scored_quiz("Second", [(3, 4), (5, 6)]))
+    # Interrupted after the rows of the second attempt, before its quiz
+    cut_last_value(tmp_path, "attempt_quiz", "I")
+
+    with ScoreStore(tmp_path) as store:
+        assert store.attempt_count == 1
+        store.record_quiz(scored_quiz("Third", [(7, 8)]))
+
+    assert read_rows(tmp_path) == [(0, 0, 1, 2), (0, 1, 7, 8)]
+    assert column_path(tmp_path, "attempt_quiz").stat().st_size == 2 * array("I").itemsize
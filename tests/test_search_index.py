@@ -0,0 +1,36 @@
+import json
+import os
+
+from utils.constants import NO_ANSWER
+from utils.questions import MultipleChoiceQuestion, ShortAnswerQuestion
+from utils.quiz import Quiz
+from utils.search_index import SearchIndex
+
+
+def write_export(json_file, answer, mtime_ns):
+    quiz = Quiz(title="Numbers", number_of_questions=2)
+    quiz.add_question(ShortAnswerQuestion(question="Name the first two primes", answer=answer))
+    quiz.add_question(MultipleChoiceQuestion(question="Is one prime?", answer="No", choices=["Yes", "No"]))
+    json_file.write_text(json.dumps(quiz.to_dict()), encoding="utf-8")
+    os.utime(json_file, ns=(mtime_ns, mtime_ns))
+
+
+def test_a_changed_export_replaces_its_old_documents(tmp_path):
+    exports = tmp_path / "output"
+    exports.mkdir()
+    write_export(exports / "Numbers.json", NO_ANSWER, 1_000_000_000)
+    (exports / "Copy.json").write_text((exports / "Numbers.json").read_text(encoding="utf-8"), encoding="utf-8")
+
+    with SearchIndex(tmp_path / "index.sqlite3") as index:
+        assert index.add_json_files(exports) == (2, 0)
+        write_export(exports / "Numbers.json", "2, 3", 2_000_000_000)
+        assert index.add_json_files(exports) == (1, 1)
+
+        assert sorted(result.answer for result in index.search("primes")) == ["2, 3", NO_ANSWER]
+        assert len(index.search("one prime")) == 1
+
+        (exports / "Copy.json").unlink()
+        write_export(exports / "Copy.json", "2, 3", 3_000_000_000)
+        assert index.add_json_files(exports) == (1, 1)
+        assert [result.answer for result in index.search("primes")] == ["2, 3"]
+        assert len(index.search("one prime")) == 1
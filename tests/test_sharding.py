@@ -0,0 +1,79 @@
+import json
+import time
+
+from utils.questions import MultipleChoiceQuestion
+from utils.quiz import Quiz
+from utils.quiz_processor import QuizProcessor
+from utils.sharding import SHARD_DIR, SHARD_INDEX_FILE, shard_quiz
+
+
+def numbered_quiz(numbers):
+    quiz = Quiz(title="Combined Quiz")
+    for number in numbers:
+        quiz.add_question(MultipleChoiceQuestion(question=f"Question {number}?", answer="A", choices=["A", "B"]))
+    return quiz
+
+
+def shard_contents(quiz, max_questions):
+    return {(shard.key, tuple(question.question for question in shard.quiz.multiple_choice_questions))
+            for shard in shard_quiz(quiz, max_questions)}
+
+
+def test_adding_questions_only_changes_the_shards_they_land_in():
+    before = shard_contents(numbered_quiz(range(400)), 20)
+    after = shard_contents(numbered_quiz(list(range(400)) + [1000, 2500, 7777]), 20)
+
+    assert all(len(questions) <= 20 for _, questions in after)
+    changed = after - before
+    # A new question can also move where its shard ends, and with it where the next one starts
+    assert 1 <= len(changed) <= 6
+    assert len(before & after) >= len(before) - 6
+    added = {"Question 1000?", "Question 2500?", "Question 7777?"}
+    assert added <= {question for _, questions in changed for question in questions}
+
+
+def shard_files(workspace):
+    return sorted(path.name for path in (workspace.path("output") / SHARD_DIR).glob("shard_*"))
+
+
+def read_index(workspace):
+    with open(workspace.path("output") / SHARD_DIR / SHARD_INDEX_FILE, encoding="utf-8") as index_file:
+        return json.load(index_file)
+
+
+def test_shards_of_questions_that_are_gone_are_removed(workspace):
+    pages = workspace.add_pages(12, questions=5)
+    workspace.processor("-cb", "-dm", "--shard_questions", "8", "-f", "json").process_files()
+    first_files = shard_files(workspace)
+
+    for page in pages[6:]:
+        page.unlink()
+    workspace.processor("-cb", "-dm", "--shard_questions", "8", "-f", "json").process_files()
+
+    index = read_index(workspace)
+    listed = sorted(name for shard in index["shards"] for name in shard["files"])
+    assert shard_files(workspace) == listed
+    assert index["questions"] == 30
+    assert set(first_files) - set(listed)
+
+
+def test_a_hung_shard_fails_without_stalling_the_run(workspace, monkeypatch):
+    workspace.add_pages(6, questions=5)
+    write_shard = QuizProcessor.write_shard
+    calls = []
+
+    def hang_on_first_shard(processor, task):
+        calls.append(task)
+        if len(calls) == 1:
+            time.sleep(30)
+        return write_shard(processor, task)
+
+    monkeypatch.setattr(QuizProcessor, "write_shard", hang_on_first_shard)
+    processor = workspace.processor("-cb", "-dm", "--shard_questions", "8", "-f", "json", "-t", "1")
+    start = time.monotonic()
+    processor.process_files()
+
+    assert time.monotonic() - start < 10
+    assert [failed.source for failed in processor.report.failed] == [calls[0].output_file]
+    assert "FileTimeoutError" in processor.report.failed[0].error
+    assert not (workspace.path("output") / SHARD_DIR / SHARD_INDEX_FILE).exists()
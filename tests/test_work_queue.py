@@ -0,0 +1,107 @@
+import threading
+import time
+
+import utils.quiz_processor
+from utils.work_queue import CLAIMS_DIR_NAME, LEASE_SUFFIX, WorkQueue
+
+
+def make_files(queue_dir, count):
+    queue_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for number in range(count):
+        file = queue_dir / f"page{number:03}.html"
+        file.write_text("<html></html>", encoding="utf-8")
+        files.append(file)
+    return files
+
+
+def leases(queue_dir):
+    return list((queue_dir / CLAIMS_DIR_NAME).glob(f"*/*{LEASE_SUFFIX}"))
+
+
+def test_two_workers_never_claim_the_same_file(tmp_path):
+    files = make_files(tmp_path, 200)
+    queues = [WorkQueue(tmp_path, ["*.html"], worker_id, lease_seconds=60) for worker_id in ("a", "b")]
+    claimed = {queue.worker_id: [] for queue in queues}
+
+    def claim_all(queue):
+        while True:
+            batch = queue.claim(7)
+            if not batch:
+                return
+            claimed[queue.worker_id].extend(batch)
+
+    threads = [threading.Thread(target=claim_all, args=(queue,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    names = [file.name for batch in claimed.values() for file in batch]
+    assert sorted(names) == [file.name for file in files]
+    assert not list(tmp_path.glob("*.html"))
+    # Every claimed file has exactly one lease, and a lost race leaves none behind
+    assert len(leases(tmp_path)) == len(files)
+
+
+def test_expired_leases_are_returned_to_the_queue(tmp_path):
+    make_files(tmp_path, 3)
+    crashed = WorkQueue(tmp_path, ["*.html"], "crashed", lease_seconds=0.05)
+    assert len(crashed.claim(2)) == 2
+    survivor = WorkQueue(tmp_path, ["*.html"], "survivor", lease_seconds=60)
+
+    time.sleep(0.1)
+    assert survivor.recover_expired_leases() == 2
+    assert len(list(tmp_path.glob("*.html"))) == 3
+    assert not leases(tmp_path)
+    assert len(survivor.claim(10)) == 3
+
+
+def test_live_leases_are_kept(tmp_path):
+    make_files(tmp_path, 2)
+    worker = WorkQueue(tmp_path, ["*.html"], "worker", lease_seconds=0.3)
+    other = WorkQueue(tmp_path, ["*.html"], "other", lease_seconds=60)
+    batch = worker.claim(2)
+
+    with worker.keep_alive(batch):
+        time.sleep(0.6)
+        # Renewed in the background, so the leases never expire while the batch is being processed
+        assert other.recover_expired_leases() == 0
+    assert all(file.exists() for file in batch)
+
+
+def test_release_after_a_failure_drops_the_lease_and_leaves_the_file(tmp_path):
+    make_files(tmp_path, 2)
+    worker = WorkQueue(tmp_path, ["*.html"], "worker", lease_seconds=60)
+    published, stuck = worker.claim(2)
+    published.rename(tmp_path / "done.html.out")
+
+    worker.release([published, stuck])
+    worker.close()
+
+    assert not leases(tmp_path)
+    # Neither published nor quarantined: kept for inspection instead of being handed to another worker
+    assert stuck.exists()
+    assert worker.recover_expired_leases() == 0
+
+
+def test_distributed_run_quarantines_a_failed_file_and_releases_every_lease(workspace, monkeypatch):
+    pages = workspace.add_pages(3)
+    process_html = utils.quiz_processor.process_html
+
+    def fail_on_second_page(html_content, question_types=None):
+        if "Page 1" in html_content:
+            raise ValueError("unparseable page")
+        return process_html(html_content, question_types)
+
+    monkeypatch.setattr(utils.quiz_processor, "process_html", fail_on_second_page)
+    processor = workspace.processor("-dq", "--worker_id", "host-1")
+    processor.process_files()
+
+    raw_html = workspace.path("raw_html")
+    assert processor.report.processed == 2
+    assert [failed.source.name for failed in processor.report.failed] == [pages[1].name]
+    assert [path.name for path in workspace.path("quarantine").glob("*.html")] == [pages[1].name]
+    assert not leases(raw_html)
+    assert not list(raw_html.glob("*.html"))
+    assert not (raw_html / CLAIMS_DIR_NAME / "host-1").exists()
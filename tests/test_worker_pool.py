@@ -0,0 +1,90 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+import utils.quiz_processor
+from utils.planner import Planner
+from utils.worker_pool import FileTimeoutError, terminate_workers, WorkerPool
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "pthread_sigmask"), reason="needs POSIX signals and fork")
+
+
+def convert_or_misbehave(file):
+    if file.name.startswith("hung"):
+        # Stuck where the per-file SIGALRM can't reach, so only the watchdog can recover
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+        time.sleep(60)
+    if file.name.startswith("crash"):
+        os._exit(1)
+    time.sleep(0.01)
+    return file.name
+
+
+def map_all(workspace, monkeypatch, bad_prefix, bad_count):
+    monkeypatch.setattr(utils.quiz_processor, "WATCHDOG_GRACE_SECONDS", 1)
+    healthy = workspace.add_pages(20)
+    bad = workspace.add_pages(bad_count, prefix=bad_prefix)
+    processor = workspace.processor("-t", "1", "-c", "2", "-sm", "fork")
+    processor.pool = WorkerPool(2, "fork", context={"processor": processor})
+    with processor.pool:
+        results = dict(processor.map_files(convert_or_misbehave, sorted(healthy + bad)))
+    return processor, healthy, bad, results
+
+
+def test_hung_workers_are_recycled_and_only_the_hung_files_quarantined(workspace, monkeypatch):
+    start = time.monotonic()
+    processor, healthy, hung, results = map_all(workspace, monkeypatch, "hung", 2)
+
+    assert time.monotonic() - start < 30
+    assert sorted(results) == healthy
+    assert sorted(failed.source for failed in processor.report.failed) == hung
+    assert sorted(path.name for path in workspace.path("quarantine").glob("*.html")) == [file.name for file in hung]
+    assert all(file.exists() for file in healthy)
+
+
+def test_a_file_that_kills_its_worker_is_quarantined_alone(workspace, monkeypatch):
+    processor, healthy, crashing, results = map_all(workspace, monkeypatch, "crash", 1)
+
+    assert sorted(results) == healthy
+    assert [failed.source for failed in processor.report.failed] == crashing
+    assert "BrokenProcessPool" in processor.report.failed[0].error
+
+
+def test_recycle_only_replaces_the_generation_it_was_given(workspace):
+    with WorkerPool(1, "fork") as pool:
+        pool.executor.submit(int).result()
+        generation = pool.generation
+        assert pool.recycle(generation)
+        pool.executor.submit(int).result()
+        assert not pool.recycle(generation)
+        assert pool.generation == generation + 1
+
+
+def test_tracked_workers_are_terminated_without_the_private_process_list(caplog):
+    worker = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    with caplog.at_level(logging.WARNING):
+        terminate_workers(object(), [worker.pid])
+
+    assert worker.wait(timeout=10) == -signal.SIGTERM
+    assert "does not list its workers" in caplog.text
+
+
+def time_out_every_fragment(fragments, question_types=None):
+    raise FileTimeoutError("fragment took too long")
+
+
+def test_a_task_timing_out_by_itself_does_not_recycle_the_pool(workspace, monkeypatch):
+    monkeypatch.setattr(utils.quiz_processor, "parse_fragments", time_out_every_fragment)
+    page, = workspace.add_pages(1, questions=8)
+    processor = workspace.processor("-t", "5", "-c", "2", "-sm", "fork")
+    processor.plan = Planner(workspace.path("state") / "profile.json").plan([page], 2)
+    processor.pool = WorkerPool(2, "fork")
+    with processor.pool:
+        with pytest.raises(FileTimeoutError):
+            processor.parse_split_file(page)
+        assert processor.pool.generation == 0
@@ -0,0 +1,149 @@
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Optional
+
+from utils.constants import NO_ANSWER
+from utils.questions import MultipleAnswersQuestion, MultipleChoiceQuestion, MultipleShortAnswerQuestion, Question, \
+    ShortAnswerQuestion
+from utils.quiz import Quiz, QUIZ_SECTIONS
+
+ANSWER_KB_FILE = "answer_kb.sqlite3"
+
+# Single-answer types keep their answer in ``answer``, the others in the ``answers`` list
+SINGLE_ANSWER_TYPES = (MultipleChoiceQuestion, ShortAnswerQuestion)
+MULTIPLE_ANSWER_TYPES = (MultipleAnswersQuestion, MultipleShortAnswerQuestion)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS correct_answers (
+    answer_key TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (answer_key, answer)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS wrong_choices (
+    answer_key TEXT NOT NULL,
+    choice TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (answer_key, choice)
+) WITHOUT ROWID;
+"""
+
+
+def known_answer(question: Question) -> Optional[Any]:
+    """
+    Returns the answer a parsed question carries, or None if it has none (``NO_ANSWER``) or its type isn't reconciled.
+    """
+    if isinstance(question, SINGLE_ANSWER_TYPES):
+        return question.answer if question.answer and question.answer != NO_ANSWER else None
+    if isinstance(question, MULTIPLE_ANSWER_TYPES):
+        return list(question.answers) if question.answers and NO_ANSWER not in question.answers else None
+    return None
+
+
+def set_answer(question: Question, answer: Any) -> None:
+    if isinstance(question, SINGLE_ANSWER_TYPES):
+        question.answer = answer
+    else:
+        question.answers = list(answer)
+
+
+class AnswerKnowledgeBase:
+    """
+    A persistent, SQLite-backed record of what every attempt revealed about each question: the correct answers seen,
+    and the choices proven wrong by attempts that scored 0 points.
+
+    Questions are keyed by ``Question.answer_key()``, which is the same for every attempt of a question whatever was
+    answered, so recording an attempt and resolving a question are single indexed lookups and never compare attempts
+    with each other.
+
+    :param db_path: The path of the SQLite database file. Created if it does not exist.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'AnswerKnowledgeBase':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record_quiz(self, quiz: Quiz) -> int:
+        """
+        Records what one attempt reveals about each of its questions.
+
+        :param quiz: A parsed quiz.
+        :return: The number of answers and wrong choices recorded.
+        """
+        recorded = 0
+        with self.connection:
+            for _, attribute, _ in QUIZ_SECTIONS:
+                for question in getattr(quiz, attribute):
+                    recorded += self._record_question(question)
+        return recorded
+
+    def _record_question(self, question: Question) -> int:
+        answer = known_answer(question)
+        key = question.answer_key()
+        if answer is not None:
+            self.connection.execute(
+                "INSERT INTO correct_answers (answer_key, answer, seen) VALUES (?, ?, 1) "
+                "ON CONFLICT (answer_key, answer) DO UPDATE SET seen = seen + 1",
+                (key, json.dumps(answer, ensure_ascii=False)))
+            return 1
+
+        if question.points is None or question.points[0] != 0:
+            return 0
+
+        # Only a zero score proves the selection wrong; partial credit could still include correct choices
+        selected = question.selected_choices
+        for choice in selected:
+            self.connection.execute(
+                "INSERT INTO wrong_choices (answer_key, choice, seen) VALUES (?, ?, 1) "
+                "ON CONFLICT (answer_key, choice) DO UPDATE SET seen = seen + 1",
+                (key, choice))
+        return len(selected)
+
+    def resolve(self, question: Question) -> bool:
+        """
+        Fills in the answer of a question parsed without one, from the answer seen most often in other attempts or,
+        for a multiple choice question, from the only choice no attempt proved wrong.
+
+        :param question: The question to resolve. Updated in place.
+        :return: True if an answer was filled in.
+        """
+        if known_answer(question) is not None or not isinstance(question, SINGLE_ANSWER_TYPES + MULTIPLE_ANSWER_TYPES):
+            return False
+
+        key = question.answer_key()
+        row = self.connection.execute(
+            "SELECT answer FROM correct_answers WHERE answer_key = ? ORDER BY seen DESC, answer LIMIT 1",
+            (key,)).fetchone()
+        if row is not None:
+            set_answer(question, json.loads(row[0]))
+            return True
+
+        if isinstance(question, MultipleChoiceQuestion):
+            wrong = {choice for (choice,) in self.connection.execute(
+                "SELECT choice FROM wrong_choices WHERE answer_key = ?", (key,))}
+            remaining = [choice for choice in question.choices if choice not in wrong]
+            if wrong and len(remaining) == 1:
+                question.answer = remaining[0]
+                return True
+        return False
+
+    def resolve_quiz(self, quiz: Quiz) -> int:
+        """
+        Resolves every unanswered question of the quiz.
+
+        :return: The number of questions that got an answer.
+        """
+        return sum(self.resolve(question)
+                   for _, attribute, _ in QUIZ_SECTIONS
+                   for question in getattr(quiz, attribute))
@@ -0,0 +1,83 @@
+"""
+In-memory API for embedding the converter in other programs.
+
+Nothing here reads ``configurations.yaml``, sets up logging or touches the filesystem::
+
+    from utils.api import parse, render
+
+    quiz = parse(html_bytes)
+    quizlet_text = render(quiz, "qz.txt")
+"""
+from collections import deque
+from typing import Iterable, Iterator, Optional, TextIO, Union
+
+from utils.parser import process_html
+from utils.quiz import Quiz
+from utils.quiz_writer import FILE_WRITERS
+from utils.worker_pool import WorkerPool
+
+HtmlInput = Union[bytes, str]
+
+
+def parse(html: HtmlInput) -> Quiz:
+    """
+    Parses a Canvas quiz page.
+
+    :param html: The page as text, or as bytes in which case the encoding is detected from the page.
+    :return: The parsed Quiz object.
+    """
+    return process_html(html)
+
+
+def write(quiz: Quiz, file_type: str, stream: TextIO) -> None:
+    """
+    Writes the quiz in the given format to any text stream, e.g. ``sys.stdout`` or an ``io.StringIO``.
+
+    :param quiz: The quiz to write.
+    :param file_type: One of ``txt``, ``md``, ``json``, ``yaml`` or ``qz.txt``.
+    :param stream: The text stream to write to.
+    """
+    writer_class = FILE_WRITERS.get(file_type)
+    if writer_class is None:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    writer_class(quiz).write_to(stream)
+
+
+def render(quiz: Quiz, file_type: str, encoding: Optional[str] = None) -> Union[str, bytes]:
+    """
+    Renders the quiz in the given format.
+
+    :param quiz: The quiz to render.
+    :param file_type: One of ``txt``, ``md``, ``json``, ``yaml`` or ``qz.txt``.
+    :param encoding: If given, the output is encoded and returned as bytes.
+    :return: The rendered quiz.
+    """
+    writer_class = FILE_WRITERS.get(file_type)
+    if writer_class is None:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    rendered = writer_class(quiz).render()
+    return rendered.encode(encoding) if encoding else rendered
+
+
+def parse_many(pages: Iterable[HtmlInput], cores: int, start_method: Optional[str] = None) -> Iterator[Quiz]:
+    """
+    Parses many quiz pages on a pool of worker processes.
+
+    Quizzes are yielded in the same order as the pages. Only a few pages per worker are in flight at a time, so
+    ``pages`` can be a lazy iterable of any length.
+
+    :param pages: The pages, as text or bytes.
+    :param cores: The number of worker processes.
+    :param start_method: "fork", "forkserver" or "spawn". None uses the platform default.
+    :return: An iterator of parsed Quiz objects.
+    """
+    max_in_flight = cores * 4
+    with WorkerPool(cores, start_method) as pool:
+        in_flight = deque()
+        for page in pages:
+            in_flight.append(pool.executor.submit(process_html, page))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+
+        while in_flight:
+            yield in_flight.popleft().result()
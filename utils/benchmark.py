@@ -0,0 +1,266 @@
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from utils.api import parse, render
+
+BENCHMARK_BASELINE_FILE = "benchmark_baseline.json"
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+# Benchmark mode name -> main.py flags
+BENCHMARK_MODES = {
+    "default": [],
+    "combine": ["-cb"],
+    "search_json": ["-sj", "-cb"],
+}
+RUN_SUMMARY_PATTERN = re.compile(r"Run summary: (\d+) file\(s\) processed, (\d+) failed")
+
+
+def generate_question(index: int, rng: random.Random) -> str:
+    """
+    Returns the markup of one question of a Canvas quiz results page, cycling through every supported question type.
+    """
+    points = "1 / 1 pts" if rng.random() > 0.3 else "0 / 1 pts"
+    kind = index % 6
+
+    if kind == 0:
+        choices = "".join(
+            f'<div class="answer{" correct_answer" if choice == 1 else ""}">'
+            f'<div class="answer_text">Choice {index}-{choice} for this question.</div></div>'
+            for choice in range(4))
+        return _question_markup("multiple_choice_question", points,
+                                f"What is the value of item {index}? It matters (see e.g. the notes).", choices)
+    if kind == 1:
+        choices = '<div class="answer selected_answer"><div class="answer_text">True</div></div>' \
+                  '<div class="answer"><div class="answer_text">False</div></div>'
+        return _question_markup("true_false_question", "0 / 1 pts", f"Statement {index} is true.", choices)
+    if kind == 2:
+        choices = f'<div class="select_answer">Option A {index}</div><div class="select_answer">Option B {index}</div>' \
+                  f'<div class="correct_answer"><div class="answer_text">Option A {index}</div></div>'
+        return _question_markup("multiple_answers_question", points, f"Pick every option for {index}.", choices)
+    if kind == 3:
+        pairs = "".join(
+            f'<div class="answer"><div class="answer_match_left">Left {pair} {index}</div>'
+            f'<div class="answer_match_right">Right {pair} {index}</div></div>'
+            for pair in range(3))
+        return _question_markup("matching_question", "1 / 1 pts", f"Match the pairs of {index}.", pairs)
+    if kind == 4:
+        return _question_markup("short_answer_question", "1 / 1 pts", f"Name item {index}. Briefly.",
+                                f'<input class="question_input" name="question_input" value="Answer {index}">')
+    return _question_markup("fill_in_multiple_blanks_question", "1 / 1 pts", f"Fill in {index} and the rest.",
+                            f'<div class="answer_group"><div class="answer_text">Blank {index}</div></div>')
+
+
+def _question_markup(question_type: str, points: str, text: str, body: str) -> str:
+    return f'<div aria-label="Question"><div class="display_question question {question_type}">' \
+           f'<div class="user_points">{points}</div>' \
+           f'<textarea name="question_text">&lt;p&gt;{text}&lt;/p&gt;</textarea>{body}</div></div>'
+
+
+def generate_page(title: str, questions: int, seed: int) -> str:
+    """
+    Returns a synthetic Canvas quiz results page. The same arguments always give the same page.
+    """
+    rng = random.Random(seed)
+    body = "".join(generate_question(index, rng) for index in range(questions))
+    return f"<html><head><title>{title}: Quiz</title></head><body><nav>Course menu</nav>{body}</body></html>"
+
+
+def generate_corpus(corpus_dir: Path, files: int, questions: int) -> None:
+    """
+    Writes ``files`` quiz pages to ``corpus_dir/html`` and their JSON exports, for -sj runs, to ``corpus_dir/json``.
+    """
+    for kind in ("html", "json"):
+        (corpus_dir / kind).mkdir(parents=True, exist_ok=True)
+
+    for number in range(files):
+        page = generate_page(f"Benchmark Quiz {number}", questions, seed=number)
+        (corpus_dir / "html" / f"quiz_{number}.html").write_text(page, encoding="utf-8")
+        (corpus_dir / "json" / f"quiz_{number}.json").write_text(render(parse(page), "json"), encoding="utf-8")
+
+
+class BenchmarkResult:
+    """
+    The measurements of one end-to-end run.
+
+    :param mode: The benchmark mode, see BENCHMARK_MODES.
+    :param file_types: The output file types.
+    :param files: The number of input files.
+    :param cores: The number of worker processes.
+    :param seconds: The wall time of the run, including interpreter start-up.
+    :param peak_rss_mb: The peak memory of the largest process of the run, if it could be measured.
+    """
+
+    def __init__(self, mode: str, file_types: List[str], files: int, cores: int, seconds: float,
+                 peak_rss_mb: Optional[float]):
+        self.mode = mode
+        self.file_types = file_types
+        self.files = files
+        self.cores = cores
+        self.seconds = seconds
+        self.peak_rss_mb = peak_rss_mb
+        self.speedup = 1.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.mode}|{','.join(self.file_types)}|{self.files}|{self.cores}"
+
+    @property
+    def throughput(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def efficiency(self) -> float:
+        return self.speedup / self.cores
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "file_types": self.file_types,
+            "files": self.files,
+            "cores": self.cores,
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.throughput, 3),
+            "speedup": round(self.speedup, 3),
+            "efficiency": round(self.efficiency, 3),
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+        }
+
+
+def run_once(corpus_dir: Path, mode: str, file_types: List[str], cores: int) -> BenchmarkResult:
+    """
+    Runs main.py once on a fresh copy of the corpus, in its own directories, and measures it.
+    """
+    flags = BENCHMARK_MODES[mode]
+    source_dir = corpus_dir / ("json" if "-sj" in flags else "html")
+
+    with tempfile.TemporaryDirectory(prefix="quiz_benchmark_") as run_dir:
+        run_dir = Path(run_dir)
+        directories = {name: str(run_dir / name) for name in
+                       ("parsed_html", "raw_html", "quarantine", "rejected", "output", "logs", "state")}
+        config_path = run_dir / "configurations.yaml"
+        with open(config_path, "w") as config_file:
+            yaml.safe_dump({"directory_paths": directories}, config_file)
+        shutil.copytree(source_dir, directories["raw_html"])
+        files = len(os.listdir(directories["raw_html"]))
+
+        command = [sys.executable, str(MAIN_SCRIPT), "--config", str(config_path), "-c", str(cores),
+                   "-f", *file_types, *flags]
+        stdout_path = run_dir / "stdout.txt"
+        with open(stdout_path, "w+") as stdout:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, stdout=stdout, stderr=subprocess.STDOUT, cwd=run_dir)
+            peak_rss_mb = None
+            if hasattr(os, "wait4"):
+                # The child's own usage, which also covers the worker processes it waited for
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                peak_rss_mb = usage.ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+            else:
+                process.wait()
+            seconds = time.perf_counter() - start
+
+            stdout.seek(0)
+            output = stdout.read()
+
+        summary = RUN_SUMMARY_PATTERN.search(output)
+        if process.returncode != 0 or summary is None or int(summary.group(2)):
+            raise RuntimeError(f"Benchmark run failed: {' '.join(command)}\n{output[-2000:]}")
+
+    return BenchmarkResult(mode, file_types, files, cores, seconds, peak_rss_mb)
+
+
+def run_benchmark(sizes: List[int], core_counts: List[int], modes: List[str], format_sets: List[List[str]],
+                  questions: int, work_dir: Optional[Path] = None) -> List[BenchmarkResult]:
+    """
+    Runs every combination of mode, output formats, corpus size and core count.
+
+    Speedup and efficiency are relative to the single-core run of the same mode, formats and size, which is always
+    included.
+
+    :param sizes: The corpus sizes, in files.
+    :param core_counts: The worker counts to run with.
+    :param modes: The modes to run, see BENCHMARK_MODES.
+    :param format_sets: The output file type combinations to run.
+    :param questions: The number of questions per generated page.
+    :param work_dir: Where the corpora are generated. Default is a temporary directory.
+    :return: The results, in run order.
+    """
+    core_counts = sorted(set([1] + core_counts))
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="quiz_corpus_", dir=work_dir) as corpus_root:
+        for size in sizes:
+            corpus_dir = Path(corpus_root) / str(size)
+            generate_corpus(corpus_dir, size, questions)
+
+            for mode in modes:
+                for file_types in format_sets:
+                    single_core = None
+                    for cores in core_counts:
+                        result = run_once(corpus_dir, mode, file_types, cores)
+                        single_core = single_core or result
+                        result.speedup = single_core.seconds / result.seconds if result.seconds else 0.0
+                        print(format_result(result))
+                        results.append(result)
+    return results
+
+
+def format_result(result: BenchmarkResult, note: str = "") -> str:
+    rss = f"{result.peak_rss_mb:8.1f}" if result.peak_rss_mb is not None else f"{'n/a':>8}"
+    return f"{result.mode:<12} {','.join(result.file_types):<24} {result.files:>6} {result.cores:>5} " \
+           f"{result.seconds:>8.2f} {result.throughput:>9.1f} {result.speedup:>7.2f} {result.efficiency:>6.0%} " \
+           f"{rss} {note}".rstrip()
+
+
+BENCHMARK_HEADER = f"{'mode':<12} {'formats':<24} {'files':>6} {'cores':>5} {'seconds':>8} {'files/s':>9} " \
+                   f"{'speedup':>7} {'eff':>6} {'rss MB':>8}"
+
+
+def compare_with_baseline(results: List[BenchmarkResult], baseline: Dict[str, dict],
+                          tolerance: float) -> List[str]:
+    """
+    Flags runs whose throughput or parallel efficiency dropped by more than ``tolerance`` against the baseline.
+
+    :param results: The current results.
+    :param baseline: The stored results, keyed like ``BenchmarkResult.key``.
+    :param tolerance: The allowed relative drop, e.g. 0.1 for 10%.
+    :return: A description of every regression.
+    """
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.key)
+        if previous is None:
+            continue
+        for metric in ("throughput", "efficiency"):
+            before, now = previous[metric], getattr(result, metric)
+            if before and now < before * (1 - tolerance):
+                regressions.append(f"{result.key}: {metric} {before:.3f} -> {now:.3f} "
+                                   f"({now / before - 1:+.0%})")
+    return regressions
+
+
+def load_baseline(baseline_path: Path) -> Dict[str, dict]:
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)["results"]
+
+
+def save_baseline(baseline_path: Path, results: List[BenchmarkResult]) -> None:
+    baseline = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "results": {result.key: result.to_dict() for result in results},
+    }
+    with open(baseline_path, "w", encoding="utf-8") as baseline_file:
+        json.dump(baseline, baseline_file, indent=4)
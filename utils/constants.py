@@ -1,5 +1,8 @@
 NO_ANSWER = "CANNOT DETERMINE ANSWER. PLEASE CHECK MANUALLY."
 
+# Maximum number of distinct strings memoized by each text normalization function
+NORMALIZATION_CACHE_SIZE = 8192
+
 """############## Quiz Writer ##############"""
 QUIZLET_TERM_DEFINITION_DELIMITER = "\\btd"
 QUIZLET_CARDS_DELIMITER = "\\bc"
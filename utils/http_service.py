@@ -0,0 +1,165 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Union
+from urllib.parse import parse_qs, urlparse
+
+from utils.parser import process_html
+from utils.quiz_writer import FILE_WRITERS, QuizWriter
+from utils.run_metrics import LatencyHistogram
+from utils.worker_pool import FileTimeoutError, WorkerPool, run_with_time_limit
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+def convert_html(html_content: str, file_types: List[str]) -> Dict[str, Union[str, Dict[str, str]]]:
+    """
+    Parses one quiz page and renders it in every requested format. Runs in a worker process.
+
+    :param html_content: The quiz page.
+    :param file_types: The file types to render.
+    :return: A dictionary with the quiz title and the rendered outputs keyed by file type.
+    """
+    quiz = process_html(html_content)
+    return {"title": quiz.title, "outputs": QuizWriter(quiz).render(file_types)}
+
+
+class ConversionService:
+    """
+    Converts quiz pages posted over HTTP, using a warm pool of parser workers that lives as long as the server.
+
+    :param pool: The worker pool the conversions run on.
+    :param max_concurrent: How many conversions may be in flight at once.
+    :param queue_timeout: Seconds a request may wait for a free slot before it is rejected with 503.
+    :param timeout: Seconds a single conversion may take. None or 0 disables the limit.
+    """
+
+    def __init__(self, pool: WorkerPool, max_concurrent: int, queue_timeout: float, timeout: Optional[float]):
+        self.pool = pool
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.latency = LatencyHistogram()
+        self.pool_lock = threading.Lock()
+
+    def convert(self, html_content: str, file_types: List[str]) -> Dict[str, Union[str, Dict[str, str]]]:
+        task = partial(convert_html, file_types=file_types)
+        with self.pool_lock:
+            generation = self.pool.generation
+            executor = self.pool.executor
+        # The worker enforces the timeout itself; the extra margin covers queueing in the pool
+        wait_seconds = self.timeout * 2 if self.timeout else None
+        try:
+            future = executor.submit(run_with_time_limit, task, html_content, self.timeout)
+            return future.result(timeout=wait_seconds)
+        except FileTimeoutError:
+            # The worker gave up on this page by itself and is free again; the other requests are unaffected.
+            # Caught first, since it is also a TimeoutError.
+            raise
+        except (BrokenProcessPool, FutureTimeoutError):
+            # Every request in flight on a broken pool fails; only the first one replaces it
+            with self.pool_lock:
+                self.pool.recycle(generation)
+            raise
+
+
+def make_handler(service: ConversionService):
+    class ConversionRequestHandler(BaseHTTPRequestHandler):
+        server_version = "QuizConverter/1.0"
+
+        def send_json(self, status: HTTPStatus, payload: dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/health":
+                self.send_json(HTTPStatus.OK, {"status": "ok"})
+            elif path == "/metrics/latency":
+                self.send_json(HTTPStatus.OK, service.latency.to_dict())
+            else:
+                self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/convert":
+                self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+                return
+
+            file_types = [file_type for value in parse_qs(url.query).get("formats", ["qz.txt"])
+                          for file_type in value.split(",") if file_type]
+            unsupported = [file_type for file_type in file_types if file_type not in FILE_WRITERS]
+            if not file_types or unsupported:
+                self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"Unsupported file type(s): {unsupported}",
+                                                        "supported": list(FILE_WRITERS)})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0 or length > MAX_BODY_BYTES:
+                self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE if length > 0 else HTTPStatus.LENGTH_REQUIRED,
+                               {"error": f"Send the HTML page as a body of 1 to {MAX_BODY_BYTES} bytes"})
+                return
+            html_content = self.rfile.read(length).decode("utf-8", errors="replace")
+
+            if not service.slots.acquire(timeout=service.queue_timeout):
+                self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Too many concurrent conversions"})
+                return
+
+            start = time.perf_counter()
+            try:
+                result = service.convert(html_content, file_types)
+            except (FileTimeoutError, FutureTimeoutError):
+                self.send_json(HTTPStatus.GATEWAY_TIMEOUT, {"error": "Conversion timed out"})
+            except BrokenProcessPool:
+                self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Worker process died"})
+            except Exception as ex:
+                logging.exception(ex)
+                self.send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {"error": f"{type(ex).__name__}: {ex}"})
+            else:
+                self.send_json(HTTPStatus.OK, result)
+            finally:
+                service.slots.release()
+                service.latency.observe((time.perf_counter() - start) * 1000)
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+    return ConversionRequestHandler
+
+
+def serve(host: str, port: int, cores: int, max_concurrent: int, queue_timeout: float,
+          timeout: Optional[float], start_method: Optional[str] = None, log_path: Optional[str] = None) -> None:
+    """
+    Runs the conversion server until interrupted.
+
+    Endpoints:
+
+    - ``POST /convert?formats=txt,json`` with the quiz page as the body returns
+      ``{"title": ..., "outputs": {"txt": ..., "json": ...}}``.
+    - ``GET /metrics/latency`` returns the request latency histogram.
+    - ``GET /health`` returns ``{"status": "ok"}``.
+    """
+    with WorkerPool(cores, start_method, context={"log_path": log_path} if log_path else None) as pool:
+        service = ConversionService(pool, max_concurrent, queue_timeout, timeout)
+        # Start the pool now, so the first request doesn't pay for it
+        pool.executor.submit(int).result()
+
+        server = ThreadingHTTPServer((host, port), make_handler(service))
+        server.daemon_threads = True
+        print(f"Serving quiz conversions on http://{host}:{server.server_address[1]} with {cores} worker(s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -4,11 +4,6 @@ import sys
 import json
 from datetime import date
 
-import yaml
-
-with open("configurations.yaml", "r") as f:
-    paths = yaml.safe_load(f)
-
 
 class CustomFileHandler(logging.FileHandler):
     def __init__(self, filename, max_lines=1500, mode='a', encoding=None, delay=False):
@@ -41,8 +36,13 @@ class JsonFormatter(logging.Formatter):
         return json.dumps(log_entry)
 
 
-def setup_logging():
-    log_path = paths["directory_paths"]['logs']
+def setup_logging(log_path: str):
+    """
+    Sends debug and info records to stdout and warnings and errors to ``<log_path>/logfile.log``, both as JSON.
+    Called once by the command-line entry point; importing this module has no side effects.
+
+    :param log_path: The directory the log file is written to.
+    """
     # Create a logs directory if it doesn't exist
     if not os.path.exists(log_path):
         os.makedirs(log_path)
@@ -68,6 +68,3 @@ def setup_logging():
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
-
-# Set up logging when the module is imported
-setup_logging()
@@ -0,0 +1,123 @@
+import functools
+import logging
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.utils import peak_rss_mb
+
+# Allocation sites kept per stage, largest first
+TOP_SITES = 10
+
+_enabled = False
+# Stages share one tracemalloc peak counter, so stages running in threads at the same time are measured one at a time
+_stage_lock = threading.RLock()
+_stages: Dict[str, dict] = {}
+
+
+def enable_memory_profiling() -> None:
+    """
+    Starts tracing allocations in this process. Until this is called, ``memory_stage`` costs nothing.
+    """
+    global _enabled
+    _enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def memory_profiling_enabled() -> bool:
+    return _enabled
+
+
+def _site(statistic: tracemalloc.StatisticDiff) -> str:
+    frame = statistic.traceback[0]
+    return f"{Path(frame.filename).parent.name}/{Path(frame.filename).name}:{frame.lineno}"
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+@contextmanager
+def memory_stage(name: str) -> Iterator[None]:
+    """
+    Measures the allocations of a block of code when memory profiling is enabled: the peak traced memory reached
+    inside it, what it left allocated, and the source lines that allocated the most.
+
+    :param name: The stage the measurements are added to, e.g. ``process_html``.
+    """
+    if not _enabled:
+        yield
+        return
+
+    with _stage_lock:
+        before = _snapshot()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            top = _snapshot().compare_to(before, "lineno")[:TOP_SITES]
+
+            stage = _stages.setdefault(name, {"calls": 0, "peak_bytes": 0, "retained_bytes": 0, "top_sites": {}})
+            stage["calls"] += 1
+            stage["peak_bytes"] = max(stage["peak_bytes"], peak_bytes - start_bytes)
+            stage["retained_bytes"] += end_bytes - start_bytes
+            for statistic in top:
+                if statistic.size_diff > 0:
+                    site = _site(statistic)
+                    stage["top_sites"][site] = max(stage["top_sites"].get(site, 0), statistic.size_diff)
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator running every call of the function as a ``memory_stage``.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with memory_stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def memory_profile() -> Optional[dict]:
+    """
+    Returns this process's cumulative stage measurements and its peak RSS, or None when profiling is disabled.
+    """
+    if not _enabled:
+        return None
+    with _stage_lock:
+        stages = {name: dict(stage, top_sites=dict(stage["top_sites"])) for name, stage in _stages.items()}
+    return {"peak_rss_mb": peak_rss_mb(), "stages": stages}
+
+
+def merge_memory_profiles(profiles: List[dict]) -> Dict[str, dict]:
+    """
+    Merges the stage measurements of several processes: call counts and retained memory add up, peaks and allocation
+    sites keep the largest value seen in any process.
+    """
+    merged = defaultdict(lambda: {"calls": 0, "peak_bytes": 0, "retained_bytes": 0, "top_sites": {}})
+    for profile in profiles:
+        for name, stage in profile["stages"].items():
+            total = merged[name]
+            total["calls"] += stage["calls"]
+            total["peak_bytes"] = max(total["peak_bytes"], stage["peak_bytes"])
+            total["retained_bytes"] += stage["retained_bytes"]
+            for site, size in stage["top_sites"].items():
+                total["top_sites"][site] = max(total["top_sites"].get(site, 0), size)
+
+    for stage in merged.values():
+        stage["top_sites"] = dict(sorted(stage["top_sites"].items(), key=lambda item: -item[1])[:TOP_SITES])
+    return dict(merged)
+
+
+def log_memory_profile(stages: Dict[str, dict]) -> None:
+    for name, stage in stages.items():
+        for site, size in stage["top_sites"].items():
+            logging.info(f"Memory stage '{name}': {size / 1e6:.2f} MB allocated at {site}")
@@ -0,0 +1,152 @@
+import io
+import json
+import tarfile
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+OUTPUT_SINKS = ["files", "jsonl", "zip", "tar"]
+
+
+class OutputSink(ABC):
+    """
+    A single appending destination for the rendered output of many quizzes.
+
+    Only the main process writes to a sink; workers send their rendered output back over the result channel.
+
+    :param output_dir: The directory the bundle(s) are created in.
+    :param file_types: The file types that will be written.
+    """
+
+    def __init__(self, output_dir: Path, file_types: List[str]):
+        self.output_dir = Path(output_dir)
+        self.file_types = file_types
+        # A new bundle every time, so re-runs never append duplicates to an earlier bundle
+        self.bundle_name = self.new_bundle_name(f"bundle_{time.strftime('%Y%m%d-%H%M%S')}")
+        self.names_seen = Counter()
+
+    def __enter__(self) -> 'OutputSink':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def new_bundle_name(self, name: str) -> str:
+        """
+        Returns the name, suffixed with a counter if a bundle was already started under it, e.g. by an earlier batch
+        within the same second.
+        """
+        candidate, count = name, 1
+        while any(self.output_dir.glob(f"{candidate}.*")) or any(self.output_dir.glob(f"{candidate}_*")):
+            count += 1
+            candidate = f"{name}-{count}"
+        return candidate
+
+    def unique_name(self, title: str) -> str:
+        """
+        Returns the title, suffixed with a counter if the same title was already written to this bundle.
+        """
+        self.names_seen[title] += 1
+        count = self.names_seen[title]
+        return title if count == 1 else f"{title}_{count}"
+
+    @abstractmethod
+    def write_quiz(self, title: str, rendered: Dict[str, str]) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink(OutputSink):
+    """
+    Streams every quiz into one JSON Lines file, one ``{"title": ..., "outputs": {file_type: content}}`` per line.
+    """
+
+    def __init__(self, output_dir: Path, file_types: List[str]):
+        super().__init__(output_dir, file_types)
+        self.path = self.output_dir / f"{self.bundle_name}.jsonl"
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def write_quiz(self, title: str, rendered: Dict[str, str]) -> None:
+        self.file.write(json.dumps({"title": self.unique_name(title), "outputs": rendered}, ensure_ascii=False))
+        self.file.write("\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ZipSink(OutputSink):
+    """
+    Writes one zip archive per file type, holding a ``<title>.<ext>`` entry for every quiz.
+    """
+
+    def __init__(self, output_dir: Path, file_types: List[str]):
+        super().__init__(output_dir, file_types)
+        self.archives = {
+            file_type: zipfile.ZipFile(self.output_dir / f"{self.bundle_name}_{file_type}.zip", 'w',
+                                       compression=zipfile.ZIP_DEFLATED)
+            for file_type in file_types
+        }
+
+    def write_quiz(self, title: str, rendered: Dict[str, str]) -> None:
+        name = self.unique_name(title)
+        for file_type, content in rendered.items():
+            self.archives[file_type].writestr(f"{name}.{file_type}", content)
+
+    def close(self) -> None:
+        for archive in self.archives.values():
+            archive.close()
+
+
+class TarSink(OutputSink):
+    """
+    Writes one gzip-compressed tar archive per file type, holding a ``<title>.<ext>`` member for every quiz.
+    """
+
+    def __init__(self, output_dir: Path, file_types: List[str]):
+        super().__init__(output_dir, file_types)
+        self.archives = {
+            file_type: tarfile.open(self.output_dir / f"{self.bundle_name}_{file_type}.tar.gz", 'w:gz')
+            for file_type in file_types
+        }
+
+    def write_quiz(self, title: str, rendered: Dict[str, str]) -> None:
+        name = self.unique_name(title)
+        for file_type, content in rendered.items():
+            data = content.encode('utf-8')
+            member = tarfile.TarInfo(f"{name}.{file_type}")
+            member.size = len(data)
+            member.mtime = int(time.time())
+            member.mode = 0o644
+            self.archives[file_type].addfile(member, io.BytesIO(data))
+
+    def close(self) -> None:
+        for archive in self.archives.values():
+            archive.close()
+
+
+def open_output_sink(sink_type: str, output_dir: Path, file_types: List[str]) -> Optional[OutputSink]:
+    """
+    Creates the output sink for the given type.
+
+    :param sink_type: One of ``OUTPUT_SINKS``.
+    :param output_dir: The directory the bundle(s) are created in.
+    :param file_types: The file types that will be written.
+    :return: The sink, or None for the default layout of one file per quiz and file type.
+    """
+    sinks = {
+        "jsonl": JsonLinesSink,
+        "zip": ZipSink,
+        "tar": TarSink,
+    }
+
+    if sink_type == "files":
+        return None
+    if sink_type not in sinks:
+        raise ValueError(f"Unsupported output sink: {sink_type}")
+    return sinks[sink_type](output_dir, file_types)
@@ -1,10 +1,12 @@
 import logging
+import re
 from enum import Enum
-from typing import Dict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 from bs4 import BeautifulSoup
 
 from utils.constants import NO_ANSWER
-from utils.questions import ShortAnswerQuestion
+from utils.memory_profile import profiled
+from utils.questions import Question, ShortAnswerQuestion
 from utils.utils import clean_input, get_all_questions, extract_points, get_question_text, text_by_filter, \
     find_elements_by_class, get_text_from_input, get_title_text, get_class_names, clean_filename
 from utils.quiz import (
@@ -25,6 +27,44 @@ class QuestionTypes(Enum):
     Essay = 'essay_question'
 
 
+QUESTION_TYPE_VALUES = {question_type.value for question_type in QuestionTypes}
+
+# The names accepted by --types, with the Quiz section each one fills and the Canvas question types parsed into it
+TYPE_FILTERS = {
+    "multiple_choice": ("multiple_choice_questions", (QuestionTypes.MultipleChoice, QuestionTypes.TrueFalse)),
+    "matching": ("matching_questions", (QuestionTypes.Matching,)),
+    "multiple_answers": ("multiple_answer_questions", (QuestionTypes.MultipleAnswers,)),
+    "multiple_short_answer": ("multiple_short_answer_questions", (QuestionTypes.MultipleShortAnswer,)),
+    "short_answer": ("short_answer_questions", (QuestionTypes.ShortAnswer,)),
+}
+
+# The opening tag of a question container, and any div tag, for splitting a page without parsing all of it
+TITLE_PATTERN = re.compile(r'<title\b[^>]*>.*?</title\s*>', re.IGNORECASE | re.DOTALL)
+QUESTION_START_PATTERN = re.compile(r'<div\b[^>]*\baria-label="Question"[^>]*>', re.IGNORECASE)
+DIV_TAG_PATTERN = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+# The class attribute of the element naming the question type, e.g. "display_question question matching_question"
+DISPLAY_QUESTION_CLASS_PATTERN = re.compile(
+    r'<div\b[^>]*\bclass\s*=\s*["\']([^"\']*\bdisplay_question\b[^"\']*)["\']', re.IGNORECASE)
+
+
+def question_type_filter(type_names: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """
+    Returns the Canvas question types to parse for the given ``TYPE_FILTERS`` names, or None to parse every type.
+    """
+    if not type_names:
+        return None
+    return frozenset(question_type.value for name in type_names for question_type in TYPE_FILTERS[name][1])
+
+
+def section_filter(type_names: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """
+    Returns the Quiz sections kept for the given ``TYPE_FILTERS`` names, or None to keep every section.
+    """
+    if not type_names:
+        return None
+    return frozenset(TYPE_FILTERS[name][0] for name in type_names)
+
+
 # FIXME ERROR HANDLING FOR if user doesnt answer a question
 def parse_multiple_choice(soup: BeautifulSoup) -> MultipleChoiceQuestion:
     """
@@ -38,6 +78,7 @@ def parse_multiple_choice(soup: BeautifulSoup) -> MultipleChoiceQuestion:
                                  choices=text_by_filter(soup, "answer", "answer_text"))
 
     points = extract_points(find_elements_by_class(soup, 'user_points').get_text(strip=True))
+    mcq._points = points
 
     if not mcq.answer and points[0] == points[1]:
         selected_answer = text_by_filter(soup=soup, initial_filter="selected_answer", last_filter="answer_text")
@@ -46,6 +87,8 @@ def parse_multiple_choice(soup: BeautifulSoup) -> MultipleChoiceQuestion:
         is_true_false = any(item.lower() in ['true', 'false'] for item in mcq.choices)
 
         mcq.answer = get_true_false_answer(soup=soup) if is_true_false else NO_ANSWER
+        # The choice picked in a failed attempt is known to be wrong
+        mcq._selected = text_by_filter(soup=soup, initial_filter="selected_answer", last_filter="answer_text")
 
     return mcq
 
@@ -75,6 +118,7 @@ def parse_multiple_answer(soup: BeautifulSoup) -> MultipleAnswersQuestion:
                                   choices=text_by_filter(soup, "select_answer"))
 
     points = extract_points(find_elements_by_class(soup, 'user_points').get_text(strip=True))
+    maq._points = points
 
     if not maq.answers and points[0] == points[1]:
         selected_answer = text_by_filter(soup=soup, initial_filter="selected_answer", last_filter="answer_text")
@@ -98,6 +142,7 @@ def parse_single_matching(soup: BeautifulSoup) -> MatchingQuestion:
                           answers=None)
 
     points = extract_points(find_elements_by_class(soup, 'user_points').get_text(strip=True))
+    mq._points = points
 
     if points[0] == points[1]:
         mq.answers = {k: v for k, v in zip(mq.word_bank, mq.answer_bank)}
@@ -118,6 +163,7 @@ def parse_multiple_short_answer(soup) -> MultipleShortAnswerQuestion:
                                       answers=text_by_filter(soup, "answer_group", "answer_text"))
 
     points = extract_points(find_elements_by_class(soup, 'user_points').get_text(strip=True))
+    msa._points = points
 
     if not msa.answers and points[0] == points[1]:
         selected_answer = text_by_filter(soup=soup, initial_filter="selected_answer", last_filter="answer_text")
@@ -135,23 +181,39 @@ def parse_short_answer(soup: BeautifulSoup) -> ShortAnswerQuestion:
     saq = ShortAnswerQuestion(question=get_question_text(soup))
 
     points = extract_points(find_elements_by_class(soup, 'user_points').get_text(strip=True))
+    saq._points = points
 
     if points[0] == points[1]:
         selected_answer = get_text_from_input(soup=soup, name="question_input")
         saq.answer = selected_answer if selected_answer else NO_ANSWER
     elif points[0] != points[1]:
         saq.answer = NO_ANSWER
+        # What was typed in a failed attempt is known to be wrong
+        question_input = soup.find("input", class_="question_input")
+        if question_input is not None and question_input.get("value"):
+            saq._selected = [clean_input(question_input["value"])]
 
     return saq
 
 
-def process_html(html_content: str) -> Quiz:
+@profiled("process_html")
+def process_html(html_content: str, question_types: Optional[FrozenSet[str]] = None) -> Quiz:
     """
     Processes the HTML content and returns a Quiz object.
 
     :param html_content: The HTML content to process.
+    :param question_types: The Canvas question types to parse, from ``question_type_filter``. Questions of other
+        types are dropped before they are parsed and are not counted. None parses every type.
     :return: A Quiz object.
     """
+    if question_types is not None:
+        # The page is split first, so questions of unwanted types are never parsed, not even into a soup
+        split = split_html(html_content)
+        if split is not None:
+            title, fragments = split
+            fragments = filter_fragments(fragments, question_types)
+            return assemble_quiz(title, fragments, parse_fragments(fragments, question_types), question_types)
+
     soup = BeautifulSoup(html_content, 'html.parser')
 
     quiz_title = get_title_text(soup)
@@ -163,51 +225,210 @@ def process_html(html_content: str) -> Quiz:
     quiz.number_of_questions = len(questions_list)
 
     for item in questions_list:
-        class_names = get_class_names(item, 'display_question')
-        question_type = class_names[0] if class_names[0] else "QUESTION TYPE NOT FOUND"
-
+        question_type = get_question_type(item)
+        if question_types is not None and question_type not in question_types:
+            quiz.number_of_questions -= 1
+            continue
         add_to_quiz(quiz=quiz, question_type=question_type, soup=item)
 
     return quiz
 
 
-def add_to_quiz(quiz: Quiz, question_type: str, soup: BeautifulSoup) -> Quiz:
+def get_question_type(soup: BeautifulSoup) -> str:
     """
-    Adds a question to the quiz object.
+    Returns the Canvas question type of a question element, e.g. ``multiple_choice_question``.
+    """
+    class_names = get_class_names(soup, 'display_question')
+    return class_names[0] if class_names[0] else "QUESTION TYPE NOT FOUND"
 
-    :param quiz: The quiz object to add the question to.
-    :param question_type: The type of question to add.
+
+def sniff_question_type(fragment: str) -> Optional[str]:
+    """
+    Reads the type of a question fragment from its markup, the same way ``get_question_type`` does from its soup.
+
+    :return: The question type, or None if it can't be read without parsing the fragment.
+    """
+    match = DISPLAY_QUESTION_CLASS_PATTERN.search(fragment)
+    if match is None:
+        return None
+    class_names = [name for name in match.group(1).split() if name not in ['display_question', 'question']]
+    return class_names[0] if class_names else None
+
+
+def filter_fragments(fragments: List[str], question_types: FrozenSet[str]) -> List[str]:
+    """
+    Drops the question fragments whose type is not wanted. Fragments whose type can't be read from the markup are
+    kept, and are filtered once parsed.
+    """
+    kept = []
+    for fragment in fragments:
+        question_type = sniff_question_type(fragment)
+        if question_type is None or question_type in question_types:
+            kept.append(fragment)
+    return kept
+
+
+def parse_question(question_type: str, soup: BeautifulSoup) -> Optional[Question]:
+    """
+    Parses a single question element.
+
+    :param question_type: The type of the question.
     :param soup: The soup object containing the question.
-    :return: The quiz object with the question added.
+    :return: The parsed question, or None for question types that are skipped or not recognized.
     """
     if question_type == QuestionTypes.MultipleChoice.value:
-        quiz.multiple_choice_questions.append(parse_multiple_choice(soup))
+        return parse_multiple_choice(soup)
 
     elif question_type == QuestionTypes.TrueFalse.value:
-        quiz.multiple_choice_questions.append(parse_multiple_choice(soup))
+        return parse_multiple_choice(soup)
 
     elif question_type == QuestionTypes.Matching.value:
-        quiz.matching_questions.append(parse_single_matching(soup))
+        return parse_single_matching(soup)
 
     elif question_type == QuestionTypes.MultipleAnswers.value:
-        quiz.multiple_answer_questions.append(parse_multiple_answer(soup))
+        return parse_multiple_answer(soup)
 
     elif question_type == QuestionTypes.MultipleShortAnswer.value:
-        quiz.multiple_short_answer_questions.append(parse_multiple_short_answer(soup))
+        return parse_multiple_short_answer(soup)
 
     elif question_type == QuestionTypes.ShortAnswer.value:
-        quiz.short_answer_questions.append(parse_short_answer(soup))
+        return parse_short_answer(soup)
 
     elif question_type == QuestionTypes.Essay.value:
         logging.info("Essay questions are not supported yet. Skipping.")
 
-    else:
+    return None
+
+
+def add_to_quiz(quiz: Quiz, question_type: str, soup: BeautifulSoup, question: Optional[Question] = None) -> Quiz:
+    """
+    Adds a question to the quiz object.
+
+    :param quiz: The quiz object to add the question to.
+    :param question_type: The type of question to add.
+    :param soup: The soup object containing the question.
+    :param question: The question, if it was already parsed from ``soup`` elsewhere.
+    :return: The quiz object with the question added.
+    """
+    if question is None:
+        question = parse_question(question_type, soup)
+
+    if question is not None:
+        quiz.add_question(question)
+
+    elif question_type not in QUESTION_TYPE_VALUES:
         quiz.unrecognized_questions[question_type].append(soup)
         logging.warning(f"WARNING: Unrecognized question type '{question_type}'")
 
     return quiz
 
 
+def find_question_fragments(html_content: str) -> Optional[List[str]]:
+    """
+    Returns the markup of each question container of a page, in page order, by matching div tags instead of parsing
+    the whole page.
+
+    :param html_content: The HTML content to scan.
+    :return: The question fragments, or None if the page has no questions or can't be split reliably.
+    """
+    fragments = []
+    position = 0
+    while True:
+        question_start = QUESTION_START_PATTERN.search(html_content, position)
+        if question_start is None:
+            break
+
+        depth = 1
+        for tag in DIV_TAG_PATTERN.finditer(html_content, question_start.end()):
+            depth += -1 if tag.group(1) else 1
+            if depth == 0:
+                fragments.append(html_content[question_start.start():tag.end()])
+                position = tag.end()
+                break
+        else:
+            # Unbalanced markup: leave the page to the full parser
+            return None
+
+    return fragments or None
+
+
+def split_html(html_content: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Splits a quiz page into its title and the markup of each question, in page order. Each fragment can then be
+    parsed on its own with ``parse_fragments``.
+
+    :param html_content: The HTML content to split.
+    :return: The cleaned quiz title and the question fragments, or None if the page can't be split reliably.
+    """
+    fragments = find_question_fragments(html_content)
+    if fragments is None:
+        return None
+
+    head = html_content[:html_content.index(fragments[0])]
+    title = clean_filename(get_title_text(BeautifulSoup(head, 'html.parser')))
+    return title, fragments
+
+
+def compact_html(html_content: str) -> str:
+    """
+    Strips a quiz page down to what the parser reads, its title and question containers, dropping scripts, styles and
+    navigation. ``process_html`` returns the same Quiz for the compact page as for the original.
+
+    :param html_content: The HTML content to compact.
+    :return: The compact page, or the page unchanged if it can't be split reliably.
+    """
+    fragments = find_question_fragments(html_content)
+    if fragments is None:
+        return html_content
+
+    title = TITLE_PATTERN.search(html_content, 0, html_content.index(fragments[0]))
+    return f"<html><head>{title.group(0) if title else ''}</head><body>{''.join(fragments)}</body></html>"
+
+
+def parse_fragments(fragments: List[str],
+                    question_types: Optional[FrozenSet[str]] = None) -> List[Tuple[str, Optional[Question]]]:
+    """
+    Parses question fragments produced by ``split_html``. Runs in a worker process.
+
+    :param fragments: The markup of the questions.
+    :param question_types: The question types to parse, or None for every type.
+    :return: The type and the parsed question (None if skipped, filtered out or not recognized) of each fragment, in
+        order.
+    """
+    parsed = []
+    for fragment in fragments:
+        item = get_all_questions(BeautifulSoup(fragment, 'html.parser'))[0]
+        question_type = get_question_type(item)
+        if question_types is not None and question_type not in question_types:
+            parsed.append((question_type, None))
+            continue
+        parsed.append((question_type, parse_question(question_type, item)))
+    return parsed
+
+
+def assemble_quiz(title: str, fragments: List[str], parsed: List[Tuple[str, Optional[Question]]],
+                  question_types: Optional[FrozenSet[str]] = None) -> Quiz:
+    """
+    Builds the quiz of a split page from its parsed fragments, keeping the page order.
+
+    :param title: The cleaned quiz title returned by ``split_html``.
+    :param fragments: The question fragments returned by ``split_html``.
+    :param parsed: The results of ``parse_fragments`` for all fragments, in the same order.
+    :param question_types: The question types that were parsed, or None for every type.
+    :return: The same Quiz object ``process_html`` returns for the page.
+    """
+    quiz = Quiz(title=title, number_of_questions=len(fragments))
+    for fragment, (question_type, question) in zip(fragments, parsed):
+        if question_types is not None and question_type not in question_types:
+            quiz.number_of_questions -= 1
+            continue
+        # Only unrecognized questions keep their soup, so the fragment is only parsed again for those
+        soup = None if question is not None or question_type in QUESTION_TYPE_VALUES \
+            else get_all_questions(BeautifulSoup(fragment, 'html.parser'))[0]
+        add_to_quiz(quiz=quiz, question_type=question_type, soup=soup, question=question)
+    return quiz
+
+
 def get_mc_correct_answer(soup: BeautifulSoup) -> str:
     """
     Retrieves the correct answer from a multiple-choice question element.
@@ -0,0 +1,210 @@
+import gzip
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from typing import List, Optional
+
+PLANNER_PROFILE_FILE = "planner_profile.json"
+
+HTML_QUESTION_MARKER = b'aria-label="Question"'
+JSON_QUESTION_MARKER = b'"question":'
+SCAN_CHUNK_BYTES = 1 << 20
+# Every Canvas quiz results page has both, in its first question. Submission and course pages, and downloads cut off
+# before the questions, do not.
+QUIZ_PAGE_MARKERS = (b"display_question", HTML_QUESTION_MARKER)
+
+# Used until a run has been measured; refined after every run
+DEFAULT_PROFILE = {
+    "cpu_seconds_per_question": 0.004,
+    "cpu_seconds_per_mb": 0.05,
+    "pool_startup_seconds": 0.5,
+    "worker_base_mb": 60.0,
+    "worker_mb_per_input_mb": 12.0,
+    "runs": 0,
+}
+# Weight of the newest run when the profile is updated
+PROFILE_SMOOTHING = 0.3
+# Keep at least this much estimated work per worker, otherwise extra workers cost more than they save
+MIN_CPU_SECONDS_PER_WORKER = 1.0
+# Distributed batches hold about this much work per worker, so claiming and renewing leases stays cheap
+TARGET_BATCH_SECONDS_PER_WORKER = 2.0
+MAX_BATCH_FILES_PER_WORKER = 16
+
+
+def count_marker(file_path: Path, marker: bytes) -> int:
+    """
+    Counts occurrences of a byte string in a file without parsing it, reading it in fixed-size chunks. Gzip files
+    are counted on their decompressed contents. A truncated gzip file is counted up to where it ends; the parser
+    reports it when it gets to it.
+    """
+    count = 0
+    overlap = len(marker) - 1
+    tail = b""
+    opener = gzip.open if Path(file_path).suffix == ".gz" else open
+    with opener(file_path, "rb") as file:
+        try:
+            for chunk in iter(lambda: file.read(SCAN_CHUNK_BYTES), b""):
+                data = tail + chunk
+                count += data.count(marker)
+                # Keep the end of the chunk so a marker split across two reads is still found, but never counted twice
+                tail = data[-overlap:] if overlap else b""
+                count -= tail.count(marker)
+        except EOFError:
+            logging.warning(f"{file_path} is truncated")
+    return count
+
+
+def looks_like_quiz_page(file_path: Path) -> bool:
+    """
+    Tells whether a file looks like a quiz page from its first chunk alone, without parsing it. Gzip files are
+    checked on their decompressed contents.
+    """
+    opener = gzip.open if Path(file_path).suffix == ".gz" else open
+    try:
+        with opener(file_path, "rb") as file:
+            chunk = file.read(SCAN_CHUNK_BYTES)
+    except (OSError, EOFError):
+        # Unreadable or truncated gzip
+        return False
+    return all(marker in chunk for marker in QUIZ_PAGE_MARKERS)
+
+
+def load_profile(profile_path: Path) -> dict:
+    profile = dict(DEFAULT_PROFILE)
+    try:
+        with open(profile_path, "r", encoding="utf-8") as profile_file:
+            profile.update(json.load(profile_file))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as ex:
+        logging.warning(f"Ignoring unreadable planner profile {profile_path}: {ex}")
+    return profile
+
+
+class Plan:
+    """
+    How a run will be executed, and what it is expected to cost.
+
+    :param files: The input files.
+    :param total_bytes: The combined size of the input files.
+    :param largest_bytes: The size of the largest input file.
+    :param questions: The estimated number of questions across all files.
+    :param cpu_seconds: The estimated total processing time, summed over all workers.
+    :param workers: The number of worker processes to use.
+    :param chunk_size: The number of files claimed per batch in distributed mode.
+    :param in_process: Run everything in the main process instead of starting a pool.
+    :param wall_seconds: The estimated run time.
+    :param memory_mb_per_worker: The estimated peak memory of one worker.
+    """
+
+    def __init__(self, files: List[Path], total_bytes: int, largest_bytes: int, questions: int, cpu_seconds: float,
+                 workers: int, chunk_size: int, in_process: bool, wall_seconds: float, memory_mb_per_worker: float):
+        self.files = files
+        self.total_bytes = total_bytes
+        self.largest_bytes = largest_bytes
+        self.questions = questions
+        self.cpu_seconds = cpu_seconds
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.in_process = in_process
+        self.wall_seconds = wall_seconds
+        self.memory_mb_per_worker = memory_mb_per_worker
+
+    def describe(self) -> str:
+        mode = "in-process (no worker pool)" if self.in_process else f"process pool with {self.workers} worker(s)"
+        return "\n".join([
+            f"Plan: {len(self.files)} file(s), {self.total_bytes / 1e6:.1f} MB, ~{self.questions} question(s)",
+            f"  Estimated CPU time: {self.cpu_seconds:.1f} s, wall time: {self.wall_seconds:.1f} s",
+            f"  Estimated memory per worker: {self.memory_mb_per_worker:.0f} MB",
+            f"  Mode: {mode}, batches of {self.chunk_size} file(s)",
+        ])
+
+
+class Planner:
+    """
+    Scans the input set cheaply and decides how many workers a run should use, based on a calibration profile that is
+    refined with the measurements of every run.
+
+    :param profile_path: Where the calibration profile is kept between runs.
+    """
+
+    def __init__(self, profile_path: Path):
+        self.profile_path = Path(profile_path)
+        self.profile = load_profile(self.profile_path)
+
+    def plan(self, files: List[Path], cores: Optional[int] = None) -> Plan:
+        """
+        Builds a plan for the given files.
+
+        :param files: The input files.
+        :param cores: A worker count chosen by the user, which the plan keeps. None lets the planner decide.
+        :return: The plan.
+        """
+        profile = self.profile
+        sizes = [os.path.getsize(file) for file in files]
+        total_bytes, largest_bytes = sum(sizes), max(sizes, default=0)
+        questions = sum(count_marker(file, JSON_QUESTION_MARKER if file.suffix == ".json" else HTML_QUESTION_MARKER)
+                        for file in files)
+
+        cpu_seconds = questions * profile["cpu_seconds_per_question"] + \
+                      total_bytes / 1e6 * profile["cpu_seconds_per_mb"]
+        memory_mb_per_worker = profile["worker_base_mb"] + largest_bytes / 1e6 * profile["worker_mb_per_input_mb"]
+
+        if cores is None:
+            workers = max(1, min(os.cpu_count() or 1, len(files),
+                                 int(cpu_seconds // MIN_CPU_SECONDS_PER_WORKER) or 1,
+                                 self.memory_limited_workers(memory_mb_per_worker)))
+            # A pool only pays off once the work outweighs starting it
+            in_process = workers == 1 and cpu_seconds < profile["pool_startup_seconds"] * 2
+        else:
+            workers, in_process = cores, False
+
+        wall_seconds = cpu_seconds / workers + (0 if in_process else profile["pool_startup_seconds"])
+        seconds_per_file = cpu_seconds / len(files) if files else 0
+        files_per_worker = math.ceil(TARGET_BATCH_SECONDS_PER_WORKER / seconds_per_file) if seconds_per_file else 1
+        chunk_size = workers * max(1, min(files_per_worker, MAX_BATCH_FILES_PER_WORKER))
+
+        return Plan(files, total_bytes, largest_bytes, questions, cpu_seconds, workers, chunk_size, in_process,
+                    wall_seconds, memory_mb_per_worker)
+
+    @staticmethod
+    def memory_limited_workers(memory_mb_per_worker: float) -> int:
+        """
+        How many workers fit in the memory currently available. Unlimited where it can't be determined.
+        """
+        try:
+            available_mb = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1e6
+        except (AttributeError, ValueError, OSError):
+            return os.cpu_count() or 1
+        return max(1, int(available_mb * 0.8 // memory_mb_per_worker))
+
+    def calibrate(self, plan: Plan, elapsed_seconds: float, workers_peak_rss_mb: Optional[float] = None) -> None:
+        """
+        Refines the profile with the measurements of a finished run and saves it.
+
+        :param plan: The plan the run was executed with.
+        :param elapsed_seconds: How long the run took.
+        :param workers_peak_rss_mb: The largest peak memory of any worker, if known.
+        """
+        if not plan.files or (plan.questions == 0 and plan.total_bytes == 0):
+            return
+
+        profile = self.profile
+        startup = 0 if plan.in_process else profile["pool_startup_seconds"]
+        measured_cpu_seconds = max(elapsed_seconds - startup, 0.0) * plan.workers
+        # Scale both coefficients by how far off the estimate was, keeping their ratio
+        if plan.cpu_seconds > 0:
+            correction = measured_cpu_seconds / plan.cpu_seconds
+            for key in ("cpu_seconds_per_question", "cpu_seconds_per_mb"):
+                profile[key] = (1 - PROFILE_SMOOTHING) * profile[key] + PROFILE_SMOOTHING * profile[key] * correction
+
+        if workers_peak_rss_mb and plan.largest_bytes:
+            measured = max(workers_peak_rss_mb - profile["worker_base_mb"], 0.0) / (plan.largest_bytes / 1e6)
+            profile["worker_mb_per_input_mb"] = (1 - PROFILE_SMOOTHING) * profile["worker_mb_per_input_mb"] + \
+                                                PROFILE_SMOOTHING * measured
+
+        profile["runs"] += 1
+        with open(self.profile_path, "w", encoding="utf-8") as profile_file:
+            json.dump(profile, profile_file, indent=4)
@@ -0,0 +1,108 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+from utils.constants import NO_ANSWER
+from utils.questions import MultipleChoiceQuestion, Question
+from utils.quiz import Quiz, QUIZ_SECTIONS
+
+QUESTION_BANK_FILE = "question_bank.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_hash TEXT NOT NULL UNIQUE,
+    question_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    has_answer INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_type ON questions (question_type);
+"""
+
+
+class QuestionBank:
+    """
+    A persistent, SQLite-backed store of every unique question seen across runs.
+
+    Questions are keyed by their stable hash, so each run only has to upsert the quizzes it parsed instead of
+    re-combining the whole archive. Duplicates follow the same rules as ``Quiz.combine``: the first copy wins, except
+    that a multiple choice question whose answer is ``NO_ANSWER`` is replaced once a copy with an answer shows up.
+
+    :param db_path: The path of the SQLite database file. Created if it does not exist.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'QuestionBank':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def upsert_quiz(self, quiz: Quiz) -> int:
+        """
+        Adds every question of the quiz to the bank.
+
+        :param quiz: The quiz to add.
+        :return: The number of questions that were inserted or replaced.
+        """
+        changed = 0
+        with self.connection:
+            for json_key, attribute, _ in QUIZ_SECTIONS:
+                for question in getattr(quiz, attribute):
+                    changed += self._upsert_question(json_key, question)
+        return changed
+
+    def _upsert_question(self, question_type: str, question: Question) -> int:
+        question_hash = question.stable_hash()
+        payload = json.dumps(question.to_dict(), ensure_ascii=False)
+        has_answer = int(not isinstance(question, MultipleChoiceQuestion) or question.answer != NO_ANSWER)
+        now = time.time()
+
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO questions (question_hash, question_type, payload, has_answer, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (question_hash, question_type, payload, has_answer, now))
+        if cursor.rowcount:
+            return 1
+
+        if not has_answer:
+            return 0
+
+        # Same replacement rule as Quiz.combine: only an unanswered copy is ever overwritten.
+        cursor = self.connection.execute(
+            "UPDATE questions SET payload = ?, has_answer = 1, updated_at = ? "
+            "WHERE question_hash = ? AND has_answer = 0",
+            (payload, now, question_hash))
+        if cursor.rowcount:
+            logging.info(f"Replaced unanswered question {question_hash} in the question bank")
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def to_quiz(self, title: str = "Question Bank") -> Quiz:
+        """
+        Builds a Quiz object holding every question in the bank, in the order they were first seen.
+
+        :param title: The title of the exported quiz.
+        :return: A Quiz object that any QuizWriter format can write.
+        """
+        quiz = Quiz(title=title)
+        for json_key, attribute, question_class in QUIZ_SECTIONS:
+            rows = self.connection.execute(
+                "SELECT payload FROM questions WHERE question_type = ? ORDER BY id", (json_key,))
+            questions = getattr(quiz, attribute)
+            for (payload,) in rows:
+                questions.append(question_class(**json.loads(payload)))
+            quiz.number_of_questions += len(questions)
+        return quiz
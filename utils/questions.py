@@ -1,4 +1,6 @@
-from typing import Dict, List
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
 
 
 class Question:
@@ -10,6 +12,9 @@ class Question:
 
     def __init__(self, question: str = ""):
         self.question = question
+        # Details of the attempt the question was parsed from, used for answer reconciliation. Not part of the output.
+        self._points: Optional[Tuple[float, float]] = None
+        self._selected: List[str] = []
 
     def __eq__(self, other):
         if not isinstance(other, Question):
@@ -19,6 +24,52 @@ class Question:
     def __hash__(self):
         return hash(self.question)
 
+    @property
+    def points(self) -> Optional[Tuple[float, float]]:
+        """
+        The points earned and possible in the attempt the question was parsed from, or None if the page had no score.
+        """
+        return self._points
+
+    @property
+    def selected_choices(self) -> List[str]:
+        """
+        The answers selected in the attempt the question was parsed from.
+        """
+        return list(self._selected)
+
+    def identity(self) -> tuple:
+        """
+        The fields that decide whether two questions are the same, mirroring ``__eq__``.
+        """
+        return (self.question,)
+
+    def stable_hash(self) -> str:
+        """
+        A hash of ``identity()`` that, unlike ``__hash__``, is the same across processes and runs.
+        """
+        payload = json.dumps([type(self).__name__, self.identity()], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def answer_identity(self) -> tuple:
+        """
+        The fields that identify a question across attempts, whatever was answered in each attempt.
+        """
+        return (self.question,)
+
+    def answer_key(self) -> str:
+        """
+        A stable hash of ``answer_identity()``, keying the question in the answer knowledge base.
+        """
+        payload = json.dumps([type(self).__name__, self.answer_identity()], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def to_dict(self) -> dict:
+        """
+        The public fields of the question, as written to JSON and YAML.
+        """
+        return {key: value for key, value in self.__dict__.items() if not key.startswith("_")}
+
 
 class MultipleShortAnswerQuestion(Question):
     """
@@ -43,6 +94,9 @@ class MultipleShortAnswerQuestion(Question):
     def __hash__(self):
         return hash((super().__hash__(), tuple(self.answers)))
 
+    def identity(self) -> tuple:
+        return super().identity() + (list(self.answers),)
+
 
 class MultipleAnswersQuestion(Question):
     """
@@ -69,6 +123,12 @@ class MultipleAnswersQuestion(Question):
     def __hash__(self):
         return hash((super().__hash__(), tuple(self.answers), tuple(self.choices)))
 
+    def identity(self) -> tuple:
+        return super().identity() + (list(self.answers), list(self.choices))
+
+    def answer_identity(self) -> tuple:
+        return super().answer_identity() + (sorted(self.choices),)
+
 
 class MultipleChoiceQuestion(Question):
     """
@@ -96,6 +156,12 @@ class MultipleChoiceQuestion(Question):
     def __hash__(self):
         return hash((super().__hash__(), tuple(self.choices)))
 
+    def identity(self) -> tuple:
+        return super().identity() + (list(self.choices),)
+
+    def answer_identity(self) -> tuple:
+        return super().answer_identity() + (sorted(self.choices),)
+
 
 class MatchingQuestion(Question):
     """
@@ -141,6 +207,9 @@ class MatchingQuestion(Question):
             tuple(self.word_bank),
         ))
 
+    def identity(self) -> tuple:
+        return super().identity() + (sorted(self.answers.items()), list(self.answer_bank), list(self.word_bank))
+
 
 class ShortAnswerQuestion(Question):
     """
@@ -164,3 +233,6 @@ class ShortAnswerQuestion(Question):
 
     def __hash__(self):
         return hash((super().__hash__(), self.answer))
+
+    def identity(self) -> tuple:
+        return super().identity() + (self.answer,)
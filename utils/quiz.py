@@ -1,7 +1,10 @@
 from collections import defaultdict
-from typing import List, Dict, Any
+from collections.abc import Sequence
+from typing import List, Dict, Any, Iterator, Optional, Collection, Union
+import json
 import logging
 from utils.constants import NO_ANSWER
+from utils.memory_profile import profiled
 from utils.questions import (
     MultipleShortAnswerQuestion,
     MultipleChoiceQuestion,
@@ -9,6 +12,69 @@ from utils.questions import (
     MatchingQuestion, ShortAnswerQuestion,
 )
 
+# (JSON key, Quiz attribute, question class) for every supported section, in output order.
+QUIZ_SECTIONS = (
+    ("multiple_choice_questions", "multiple_choice_questions", MultipleChoiceQuestion),
+    ("matching_questions", "matching_questions", MatchingQuestion),
+    ("multiple_answers_questions", "multiple_answer_questions", MultipleAnswersQuestion),
+    ("multiple_short_answer_questions", "multiple_short_answer_questions", MultipleShortAnswerQuestion),
+    ("short_answer_questions", "short_answer_questions", ShortAnswerQuestion),
+)
+SECTION_ATTRIBUTES = {question_class: attribute for _, attribute, question_class in QUIZ_SECTIONS}
+# The fields read from a JSON export for every question class. Other keys in an entry are ignored.
+QUESTION_FIELDS = {
+    MultipleChoiceQuestion: ("question", "answer", "choices"),
+    MatchingQuestion: ("question", "answers", "answer_bank", "word_bank"),
+    MultipleAnswersQuestion: ("question", "answers", "choices"),
+    MultipleShortAnswerQuestion: ("question", "answers"),
+    ShortAnswerQuestion: ("question", "answer"),
+}
+
+# The members of a JSON export, in the order the json file type writes them
+EXPORT_MEMBERS = ("title", "number_of_questions") + tuple(json_key for json_key, _, _ in QUIZ_SECTIONS)
+_json_decoder = json.JSONDecoder()
+
+
+def question_from_json(question_class: type, entry: Dict[str, Any]):
+    """
+    Builds a question from its entry in a JSON export, using only the fields of its class.
+    """
+    return question_class(**{field: entry[field] for field in QUESTION_FIELDS[question_class]})
+
+
+def split_export(text: str) -> Optional[Dict[str, str]]:
+    """
+    Finds the members of a JSON export written by the json file type (indent=4) without decoding it. A member starts
+    where its key starts a line indented by four spaces, which nothing else in such a file can, because strings can't
+    hold a raw newline.
+
+    :return: The JSON text from the value of each member found to the next member found, which ``decode_member``
+        reads, or None if the export is not laid out that way, e.g. it is compact.
+    """
+    if not text.startswith('{\n    "'):
+        return None
+    starts = {}
+    position = 0
+    for key in EXPORT_MEMBERS:
+        needle = f'\n    "{key}": '
+        # Looked for from the previous member first, so an export in the usual order is scanned once
+        start = text.find(needle, position)
+        if start == -1:
+            start = text.find(needle)
+        if start != -1:
+            starts[key] = start + len(needle)
+            position = start
+    ordered = sorted(starts.items(), key=lambda item: item[1])
+    ends = [start for _, start in ordered[1:]] + [len(text)]
+    return {key: text[start:end] for (key, start), end in zip(ordered, ends)}
+
+
+def decode_member(member_text: str) -> Any:
+    """
+    Decodes the value at the start of a member found by ``split_export``, ignoring whatever follows it.
+    """
+    return _json_decoder.raw_decode(member_text)[0]
+
 
 class Quiz:
     """
@@ -37,98 +103,162 @@ class Quiz:
                f"\nmultiple_short_answer_questions =\n{self.multiple_short_answer_questions} " \
                f"\nshort_answer_questions =\n{self.short_answer_questions} "
 
+    def add_question(self, question) -> None:
+        """
+        Appends a parsed question to the section of its type.
+        """
+        getattr(self, SECTION_ATTRIBUTES[type(question)]).append(question)
+
     def to_dict(self):
         return {
             "title": self.title,
             "number_of_questions": self.number_of_questions,
-            "multiple_choice_questions": [mcq.__dict__ for mcq in self.multiple_choice_questions],
-            "matching_questions": [mq.__dict__ for mq in self.matching_questions],
-            "multiple_answers_questions": [maq.__dict__ for maq in self.multiple_answer_questions],
-            "multiple_short_answer_questions": [msaq.__dict__ for msaq in self.multiple_short_answer_questions],
-            "short_answer_questions": [saq.__dict__ for saq in self.short_answer_questions],
+            "multiple_choice_questions": [mcq.to_dict() for mcq in self.multiple_choice_questions],
+            "matching_questions": [mq.to_dict() for mq in self.matching_questions],
+            "multiple_answers_questions": [maq.to_dict() for maq in self.multiple_answer_questions],
+            "multiple_short_answer_questions": [msaq.to_dict() for msaq in self.multiple_short_answer_questions],
+            "short_answer_questions": [saq.to_dict() for saq in self.short_answer_questions],
         }
 
     @classmethod
     def from_json(cls, json_data: Dict[str, Any]) -> 'Quiz':
         quiz = Quiz(title=json_data["title"], number_of_questions=json_data["number_of_questions"])
-
-        for mcq_data in json_data["multiple_choice_questions"]:
-            mcq = MultipleChoiceQuestion(question=mcq_data["question"], answer=mcq_data["answer"],
-                                         choices=mcq_data["choices"])
-            quiz.multiple_choice_questions.append(mcq)
-
-        for maq_data in json_data["multiple_answers_questions"]:
-            maq = MultipleAnswersQuestion(question=maq_data["question"], answers=maq_data["answers"],
-                                          choices=maq_data["choices"])
-            quiz.multiple_answer_questions.append(maq)
-
-        for msaq_data in json_data["multiple_short_answer_questions"]:
-            msaq = MultipleShortAnswerQuestion(question=msaq_data["question"], answers=msaq_data["answers"])
-            quiz.multiple_short_answer_questions.append(msaq)
-
-        for saq_data in json_data["short_answer_questions"]:
-            saq = ShortAnswerQuestion(question=saq_data["question"], answer=saq_data["answer"])
-            quiz.short_answer_questions.append(saq)
-
-        for mq_data in json_data["matching_questions"]:
-            mq = MatchingQuestion(
-                question=mq_data["question"],
-                answers=mq_data["answers"],
-                answer_bank=mq_data["answer_bank"],
-                word_bank=mq_data["word_bank"],
-            )
-            quiz.matching_questions.append(mq)
-
+        for json_key, attribute, question_class in QUIZ_SECTIONS:
+            setattr(quiz, attribute, [question_from_json(question_class, entry) for entry in json_data[json_key]])
         return quiz
 
     def combine(self, other: 'Quiz') -> 'Quiz':
-        combined_quiz = Quiz(title="Combined Quiz")
-
-        seen_questions = set()
-
-        for question in self.multiple_choice_questions + other.multiple_choice_questions:
-            if question not in seen_questions:
-                seen_questions.add(question)
-                combined_quiz.multiple_choice_questions.append(question)
-            else:
-                index = combined_quiz.multiple_choice_questions.index(question)
-                existing_question = combined_quiz.multiple_choice_questions[index]
-                if question.answer != NO_ANSWER and existing_question.answer == NO_ANSWER:
-                    logging.warning(f"Replacing {existing_question}with {question}")
-                    combined_quiz.multiple_choice_questions[index] = question
+        combiner = QuizCombiner()
+        combiner.add(self)
+        combiner.add(other)
+        return combiner.to_quiz()
+
+
+class QuestionSection(Sequence):
+    """
+    A read-only section of a LazyQuiz. Its length comes from the JSON entries, and each question object is built from
+    its entry when it is accessed and not kept, so iterating a section streams its questions.
 
-        seen_questions.clear()
+    :param question_class: The class of the questions in the section.
+    :param entries: The section's question dictionaries, as found in a JSON export, or their JSON text, which is only
+        decoded when the section is first used.
+    """
+
+    def __init__(self, question_class: type, entries: Union[List[Dict[str, Any]], str]):
+        self.question_class = question_class
+        self._entries = entries
+
+    @property
+    def entries(self) -> List[Dict[str, Any]]:
+        if isinstance(self._entries, str):
+            self._entries = decode_member(self._entries)
+        return self._entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [question_from_json(self.question_class, entry) for entry in self.entries[index]]
+        return question_from_json(self.question_class, self.entries[index])
+
+    def __iter__(self) -> Iterator:
+        for entry in self.entries:
+            yield question_from_json(self.question_class, entry)
 
-        for question in self.multiple_answer_questions + other.multiple_answer_questions:
-            if question not in seen_questions:
-                seen_questions.add(question)
-                combined_quiz.multiple_answer_questions.append(question)
+    def __repr__(self):
+        return f"<{len(self)} lazy {self.question_class.__name__}(s)>"
+
+
+class LazyQuiz(Quiz):
+    """
+    A Quiz view of a decoded JSON export that only builds question objects when they are used.
 
-        seen_questions.clear()
+    The title and the question counts are available without building any question, and every section is a
+    QuestionSection that writers, QuizCombiner and the recorders can iterate like a list. Questions are rebuilt on
+    every access, so changes made to them are not kept; use ``materialize()`` for a Quiz that can be modified.
 
-        for question in self.multiple_short_answer_questions + other.multiple_short_answer_questions:
-            if question not in seen_questions:
-                seen_questions.add(question)
-                combined_quiz.multiple_short_answer_questions.append(question)
+    :param json_data: The decoded JSON export, as written by the json file type. Sections may also be given as their
+        JSON text, see ``from_text``.
+    :param sections: The attributes of the sections to keep. The others are left empty and are not counted in
+        ``number_of_questions``. None keeps every section.
+    """
 
-        seen_questions.clear()
+    def __init__(self, json_data: Dict[str, Any], sections: Optional[Collection[str]] = None):
+        super().__init__(title=json_data["title"], number_of_questions=json_data["number_of_questions"])
+        for json_key, attribute, question_class in QUIZ_SECTIONS:
+            entries = json_data.get(json_key, []) if sections is None or attribute in sections else []
+            setattr(self, attribute, QuestionSection(question_class, entries))
+        if sections is not None:
+            self.number_of_questions = sum(len(getattr(self, attribute)) for _, attribute, _ in QUIZ_SECTIONS)
 
-        for question in self.short_answer_questions + other.short_answer_questions:
-            if question not in seen_questions:
-                seen_questions.add(question)
-                combined_quiz.short_answer_questions.append(question)
+    @classmethod
+    def from_text(cls, text: str, sections: Optional[Collection[str]] = None) -> 'LazyQuiz':
+        """
+        Reads a JSON export, decoding only its title and question count up front. Each section is decoded when it is
+        first used, and sections that are not kept are never decoded. Exports that were not written by the json file
+        type are decoded whole.
 
-        seen_questions.clear()
+        :param text: The contents of the export.
+        :param sections: As for the constructor.
+        """
+        members = split_export(text)
+        if members is None:
+            return cls(json.loads(text), sections)
+        json_data = {key: decode_member(members[key]) for key in ("title", "number_of_questions")}
+        for json_key, _, _ in QUIZ_SECTIONS:
+            json_data[json_key] = members.get(json_key, "[]")
+        return cls(json_data, sections)
 
-        for question in self.matching_questions + other.matching_questions:
-            if question not in seen_questions:
-                seen_questions.add(question)
-                combined_quiz.matching_questions.append(question)
+    def add_question(self, question) -> None:
+        raise TypeError("A LazyQuiz is read-only. Use materialize() to get a Quiz that can be modified.")
 
-        combined_quiz.number_of_questions = len(combined_quiz.multiple_choice_questions) + \
-                                            len(combined_quiz.multiple_answer_questions) + \
-                                            len(combined_quiz.multiple_short_answer_questions) + \
-                                            len(combined_quiz.short_answer_questions) + \
-                                            len(combined_quiz.matching_questions)
+    def materialize(self) -> Quiz:
+        """
+        Builds every question and returns them as a regular Quiz.
+        """
+        quiz = Quiz(title=self.title, number_of_questions=self.number_of_questions)
+        for _, attribute, _ in QUIZ_SECTIONS:
+            setattr(quiz, attribute, list(getattr(self, attribute)))
+        return quiz
+
+
+class QuizCombiner:
+    """
+    Folds quizzes, one at a time, into a running set of unique questions.
+
+    Only the unique questions are kept, so a quiz can be dropped as soon as it has been added and memory grows with
+    the number of distinct questions rather than with the number of quizzes. Duplicates are resolved like
+    ``Quiz.combine``: the first copy wins, except that a multiple choice question whose answer is ``NO_ANSWER`` is
+    replaced by a later copy that has an answer.
+
+    :param title: The title of the combined quiz.
+    """
+
+    def __init__(self, title: str = "Combined Quiz"):
+        self.title = title
+        # Dicts keep first-seen order; a question maps to the copy currently kept for it
+        self.sections: Dict[str, Dict[Any, Any]] = {attribute: {} for _, attribute, _ in QUIZ_SECTIONS}
+
+    def __len__(self):
+        return sum(len(questions) for questions in self.sections.values())
+
+    @profiled("combine")
+    def add(self, quiz: Quiz) -> None:
+        for _, attribute, _ in QUIZ_SECTIONS:
+            questions = self.sections[attribute]
+            for question in getattr(quiz, attribute):
+                existing_question = questions.get(question)
+                if existing_question is None:
+                    questions[question] = question
+                elif isinstance(question, MultipleChoiceQuestion) \
+                        and question.answer != NO_ANSWER and existing_question.answer == NO_ANSWER:
+                    logging.warning(f"Replacing {existing_question}with {question}")
+                    questions[question] = question
 
+    def to_quiz(self) -> Quiz:
+        combined_quiz = Quiz(title=self.title)
+        for _, attribute, _ in QUIZ_SECTIONS:
+            setattr(combined_quiz, attribute, list(self.sections[attribute].values()))
+        combined_quiz.number_of_questions = len(self)
         return combined_quiz
@@ -1,15 +1,109 @@
+import gzip
 import json
 import logging
+import math
 import os
 import shutil
+import time
 
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import Counter, deque
+from concurrent.futures import CancelledError, FIRST_COMPLETED, Future, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
 from functools import partial
+from itertools import chain
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from utils.parser import process_html
-from utils.quiz import Quiz
+from utils.output_sink import open_output_sink
+from utils.answer_kb import ANSWER_KB_FILE, AnswerKnowledgeBase
+from utils.memory_profile import enable_memory_profiling, memory_profile
+from utils.parser import assemble_quiz, compact_html, filter_fragments, parse_fragments, process_html, \
+    question_type_filter, section_filter, split_html
+from utils.planner import HTML_QUESTION_MARKER, PLANNER_PROFILE_FILE, Plan, Planner, count_marker, \
+    looks_like_quiz_page
+from utils.question_bank import QuestionBank, QUESTION_BANK_FILE
+from utils.quiz import LazyQuiz, Quiz, QuizCombiner
 from utils.quiz_writer import QuizWriter
+from utils.run_journal import ARCHIVED_STATES, DISCOVERED, FAILED, PARSED, RUN_JOURNAL_FILE, RunJournal, \
+    file_fingerprint, written_state
+from utils.run_metrics import count_questions, MetricsExporter, RunMetrics, timed, worker_metrics
+from utils.run_report import FailedFile, RunReport
+from utils.score_store import SCORE_STORE_DIR, ScoreStore
+from utils.search_index import SearchIndex, SEARCH_INDEX_FILE
+from utils.sharding import remove_stale_shards, SHARD_DIR, shard_index, SHARD_INDEX_FILE, shard_quiz
+from utils.utils import merge_normalization_stats, normalization_stats, peak_rss_mb, write_if_changed
+from utils.work_queue import WorkQueue
+from utils.worker_pool import FileTimeoutError, WorkerPool, run_tracked, run_with_time_limit, worker_context
+
+# How many times a file is resubmitted after its worker process died (crash, OOM kill or watchdog recycle)
+MAX_RETRIES_AFTER_BROKEN_POOL = 1
+# Extra seconds the watchdog waits on top of the per-file timeout before it considers the workers hung
+WATCHDOG_GRACE_SECONDS = 30
+# Fragment tasks per worker when an oversized page is split, so uneven questions still balance across the pool
+SPLIT_TASKS_PER_WORKER = 4
+
+
+class FileResult:
+    """
+    The outcome of processing one input file in a worker process.
+
+    :param source: The input file.
+    :param title: The title of the parsed quiz.
+    :param message: A human-readable summary of what was done.
+    :param quiz: The parsed quiz, when the main process needs it.
+    :param rendered: The rendered output by file type, when it is written by an output sink instead of the worker.
+    :param written: The file types whose output files the worker wrote (or found up to date).
+    :param staged_archive: The compressed archive prepared by the worker with -ca, published by the main process.
+    :param worker_pid: The process that processed the file.
+    :param memory_profile: That process's cumulative memory profile, when --profile_memory is on.
+    :param metrics: That process's cumulative run metrics, when they are exported.
+    """
+
+    def __init__(self, source: Path, title: str = "", message: str = "", quiz: Optional[Quiz] = None,
+                 rendered: Optional[Dict[str, str]] = None, written: Optional[List[str]] = None,
+                 staged_archive: Optional[Path] = None, worker_pid: Optional[int] = None,
+                 memory_profile: Optional[dict] = None, metrics: Optional[dict] = None):
+        self.source = source
+        self.title = title
+        self.message = message
+        self.quiz = quiz
+        self.rendered = rendered
+        self.written = written or []
+        self.staged_archive = staged_archive
+        self.worker_pid = worker_pid
+        self.memory_profile = memory_profile
+        self.metrics = metrics
+
+
+class ShardTask:
+    """
+    One shard of the combined quiz to render in a worker. Compared by its output file, so ``map_tasks`` can match a
+    worker that hung or died to the shard it was writing.
+
+    :param quiz: The questions of the shard.
+    :param output_file: The output path without an extension.
+    """
+
+    def __init__(self, quiz: Quiz, output_file: Path):
+        self.quiz = quiz
+        self.output_file = output_file
+
+    def __eq__(self, other):
+        return isinstance(other, ShardTask) and self.output_file == other.output_file
+
+    def __hash__(self):
+        return hash(self.output_file)
+
+    def __str__(self):
+        return str(self.output_file)
+
+
+def call_worker_processor(method_name: str, *args, **kwargs) -> Any:
+    """
+    Runs a QuizProcessor method in a worker, on the processor the pool initializer delivered to it once.
+    """
+    return getattr(worker_context("processor"), method_name)(*args, **kwargs)
 
 
 class QuizProcessor:
@@ -19,95 +113,719 @@ class QuizProcessor:
         self.raw_html_dir = Path(self.directories["raw_html"])
         self.parsed_html_dir = Path(self.directories["parsed_html"])
         self.output_dir = Path(self.directories["output"])
+        self.state_dir = Path(self.directories["state"])
+        self.quarantine_dir = Path(self.directories["quarantine"])
+        # Configurations written before the pre-filter existed have no rejected directory
+        self.rejected_dir = Path(self.directories.get("rejected", self.quarantine_dir.parent / "rejected"))
+
+        # Compact archives (-ca) can be moved back into raw_html and reprocessed as they are
+        self.file_patterns = ["*.json"] if self.args.search_json else ["*.html", "*.html.gz"]
+        self.file_types = [self.args.file_type] if isinstance(self.args.file_type, str) else self.args.file_type
+        # --types: the question types parsed from HTML pages and the sections kept from JSON exports. None keeps all.
+        self.question_types = question_type_filter(self.args.types)
+        self.sections = section_filter(self.args.types)
 
-        self.file_extension = "*.json" if self.args.search_json else "*.html"
+        # Latest cumulative normalization cache counters reported by each worker process, keyed by PID
+        self.worker_normalization_stats = {}
 
-        self.quizzes = []
+        # Parsed quizzes only need to be sent back to the main process when something there keeps them
+        self.collect_quizzes = (self.args.question_bank or self.args.search_index or self.args.reconcile
+                                or self.args.record_scores)
+
+        self.report = RunReport()
+        self.metrics = RunMetrics(self.report)
+        # Workers only send their metrics back when something publishes them
+        self.export_metrics = bool(self.args.metrics_file) or self.args.metrics_port is not None
+        # Both are set up by process_files() once the input set has been scanned
+        self.plan: Optional[Plan] = None
+        self.pool: Optional[WorkerPool] = None
+        # Open while per-file outputs are being produced
+        self.journal: Optional[RunJournal] = None
+
+    def __getstate__(self):
+        # Workers only need the settings. The pool, the parsed quizzes and the run report stay in the main process.
+        state = self.__dict__.copy()
+        state.update(pool=None, plan=None, report=None, metrics=None, journal=None, worker_normalization_stats={})
+        return state
+
+    def worker_task(self, method_name: str, **kwargs) -> Callable[[Path], Any]:
+        """
+        Returns a picklable task that runs the named method on the worker's own copy of this processor.
+        """
+        return partial(call_worker_processor, method_name, **kwargs)
 
     def _process_file(self, file):
         if self.args.search_json:
-            return self.process_json_file(file)
+            quiz = self.process_json_file(file)
         elif self.args.combine and not self.args.search_json:
-            html_content = self.read_html_file(file)
-            return process_html(html_content)
-
-        # logging.critical("Invalid combination of arguments. _process_file() should not be called.")
+            with timed("parse"):
+                quiz = process_html(self.read_html_file(file), self.question_types)
+        else:
+            # logging.critical("Invalid combination of arguments. _process_file() should not be called.")
+            return None
+        count_questions(quiz)
+        return quiz, os.getpid(), normalization_stats(), memory_profile(), self.worker_metrics()
 
     def process_files(self):
-        with ProcessPoolExecutor(max_workers=self.args.cores) as executor:
-            process_file_with_args = partial(self._process_file)
-            futures = {executor.submit(process_file_with_args, file): file for file in
-                       self.raw_html_dir.glob(self.file_extension)}
+        planner = Planner(self.state_dir / PLANNER_PROFILE_FILE)
+        files = self.input_files()
+        if not self.args.distributed:
+            # Other hosts share a distributed input directory, so there each batch is screened once it is claimed
+            files = self.screen_files(files)
+        self.plan = planner.plan(files, self.args.cores)
+        if self.args.dry_run:
+            print(self.plan.describe())
+            return
+        logging.info(self.plan.describe())
+
+        if self.args.profile_memory:
+            enable_memory_profiling()
+        self.pool = WorkerPool(self.plan.workers, self.args.start_method,
+                               context={"processor": self, "log_path": self.directories["logs"],
+                                        "profile_memory": self.args.profile_memory},
+                               in_process=self.plan.in_process)
+        start = time.perf_counter()
+        self.metrics.start_run(self.plan.workers)
+        with self.pool, self.metrics_exporter():
+            self.run_phases()
+        planner.calibrate(self.plan, time.perf_counter() - start, peak_rss_mb(children=not self.plan.in_process))
+        self.report.record_memory_profile(os.getpid(), memory_profile())
+
+        print(self.report.summary())
+
+    def metrics_exporter(self):
+        if not self.export_metrics:
+            return nullcontext()
+        return MetricsExporter(self.metrics.render, self.args.metrics_file, self.args.metrics_interval,
+                               self.args.metrics_port)
 
-            for future in as_completed(futures):
-                result = future.result()
-                self.quizzes.append(result)
+    def worker_metrics(self) -> Optional[dict]:
+        return worker_metrics() if self.export_metrics else None
 
-        if self.args.combine:
+    def run_phases(self):
+        if self.args.combine or self.args.search_json:
             self.combine_quizzes_from_files()
-        elif self.args.search_json:  # Code here to print JSON into w/e other format wanted
-            pass
         else:
             self.process_files_parallel()
 
-    def merge_quizzes(self, quiz_chunks: list) -> Quiz:
-        merged_quiz = quiz_chunks[0]
-        for quiz in quiz_chunks[1:]:
-            merged_quiz = merged_quiz.combine(quiz)
-        return merged_quiz
+        if self.args.export_bank:
+            self.export_question_bank()
+
+    def input_files(self) -> list:
+        return sorted(file for pattern in self.file_patterns for file in self.raw_html_dir.glob(pattern))
+
+    def screen_files(self, files: List[Path]) -> List[Path]:
+        """
+        Sets aside the files that do not look like quiz pages, judging by their first chunk only, so they never reach
+        the parser or the pool. With --dry_run they are only counted.
+
+        :return: The files that look like quiz pages.
+        """
+        if self.args.search_json or self.args.no_prefilter:
+            return files
+
+        accepted, rejected = [], []
+        for file in files:
+            (accepted if looks_like_quiz_page(file) else rejected).append(file)
+
+        if self.args.dry_run:
+            if rejected:
+                print(f"{len(rejected)} file(s) do not look like quiz pages and would be moved to {self.rejected_dir}")
+            return accepted
+
+        for file in rejected:
+            logging.warning(f"{file} does not look like a quiz page. Rejecting it without parsing.")
+            self.report.record_rejection(FailedFile(file, "not a quiz page", self.set_aside(file, self.rejected_dir)))
+        return accepted
+
+    def map_files(self, function: Callable[[Path], Any], files: Iterable[Path]) -> Iterator[Tuple[Path, Any]]:
+        """
+        Runs ``function`` on every file across the worker pool and yields ``(file, result)`` as each one finishes.
+
+        A file whose function raises, or runs past the per-file timeout, is quarantined and recorded in the run
+        report instead of stopping the batch. If no file finishes for longer than the timeout allows, the workers are
+        considered hung and are recycled, and the same happens when a worker process dies. Files that were only
+        queued, or finished, are unaffected: the unfinished ones are resubmitted to the fresh pool. Only the files the
+        workers were running count as suspects; each is retried once on its own and quarantined if it hangs or kills
+        its worker again.
+
+        :param function: The picklable function processing a single file.
+        :param files: The files to process.
+        :return: An iterator of (file, result) tuples for the files that were processed successfully.
+        """
+        for file, result in self.map_tasks(function, files, self.fail_file):
+            self.report.record_success()
+            yield file, result
+
+    def map_tasks(self, function: Callable[[Any], Any], items: Iterable[Any],
+                  fail: Callable[[Any, BaseException], None]) -> Iterator[Tuple[Any, Any]]:
+        """
+        The engine of ``map_files``, for any picklable items that compare by value, not only input files. Items are
+        held to the per-file timeout and recovered from hung or dead workers the same way.
+
+        :param function: The picklable function processing a single item.
+        :param items: The items to process.
+        :param fail: Called with every item that failed and its error.
+        :return: An iterator of (item, result) tuples for the items that were processed successfully.
+        """
+        task = partial(run_tracked, partial(run_with_time_limit, function, timeout=self.args.timeout))
+        watchdog_timeout = self.args.timeout + WATCHDOG_GRACE_SECONDS if self.args.timeout else None
+        retries = Counter()
+
+        rounds = deque([list(items)])
+        while rounds:
+            pending_files = rounds.popleft()
+            if not pending_files:
+                continue
+            # Every future of a round belongs to the pool of this generation
+            generation = self.pool.generation
+            executor = self.pool.executor
+            futures = {executor.submit(task, file): file for file in pending_files}
+            not_done = set(futures)
+            breakdown = None
+
+            while not_done and breakdown is None:
+                self.metrics.queue_depth = len(not_done)
+                done, not_done = wait(not_done, timeout=watchdog_timeout, return_when=FIRST_COMPLETED)
+                # Drained on every pass, so announcements never fill the pipe
+                self.pool.started_tasks()
+                if not done:
+                    logging.error(f"No file finished within {watchdog_timeout} seconds. Recycling workers.")
+                    breakdown = FileTimeoutError(f"No result within {watchdog_timeout} seconds; the worker hung")
+                    break
+
+                for future in done:
+                    file = futures[future]
+                    try:
+                        result = future.result()
+                    except (BrokenProcessPool, CancelledError) as ex:
+                        # The pool died under this file; it is handled below with everything else that was in flight
+                        not_done.add(future)
+                        breakdown = ex
+                    except Exception as ex:
+                        fail(file, ex)
+                    else:
+                        yield file, result
+
+            if breakdown is not None:
+                unfinished = {future: futures[future] for future in not_done}
+                yield from self.salvage_results(unfinished)
+                rounds.extendleft(reversed(self.retry_rounds(list(unfinished.values()), generation, breakdown,
+                                                             retries, fail)))
+        self.metrics.queue_depth = 0
+
+    def salvage_results(self, unfinished: Dict[Future, Path]) -> Iterator[Tuple[Path, Any]]:
+        """
+        Yields the results of files that finished while the pool was being given up on, and drops them from
+        ``unfinished``.
+        """
+        for future, file in list(unfinished.items()):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                del unfinished[future]
+                yield file, future.result()
+
+    def retry_rounds(self, unfinished: List[Path], generation: int, breakdown: BaseException, retries: Counter,
+                     fail: Callable[[Any, BaseException], None]) -> List[List[Path]]:
+        """
+        Recycles a pool that hung or died and decides what happens to the files it had not finished.
+
+        The suspects are the files a worker was running at the time. They are retried once, each in a round of its
+        own, so a file that hangs or kills its worker again while running alone is the one at fault and is
+        quarantined. Every other unfinished file was only queued and goes back to the fresh pool as it is.
+
+        :return: The rounds of files to submit next, in order.
+        """
+        running = set(self.pool.started_tasks().values())
+        self.pool.recycle(generation)
+
+        suspects = [file for file in unfinished if file in running]
+        # Without announcements from the workers there is no telling, so every file in flight is a suspect
+        isolate = bool(suspects)
+        suspects = suspects or unfinished
+        queued = [file for file in unfinished if file not in suspects]
+
+        retried = []
+        for file in suspects:
+            retries[file] += 1
+            if retries[file] <= MAX_RETRIES_AFTER_BROKEN_POOL:
+                retried.append(file)
+            else:
+                fail(file, breakdown)
+
+        if unfinished:
+            logging.warning(f"Resubmitting {len(queued) + len(retried)} file(s) to a fresh pool, "
+                            f"{len(retried)} of which were running when the workers hung or died")
+        return [queued] + ([[file] for file in retried] if isolate else [retried])
+
+    def partition_oversized(self, files: Iterable[Path]) -> Tuple[List[Path], List[Path]]:
+        """
+        Separates the pages holding more questions than --split_threshold, which are split across the pool instead of
+        being parsed by a single worker.
+
+        :return: The files to process whole, and the oversized files.
+        """
+        files = list(files)
+        if self.args.search_json or not self.args.split_threshold or self.plan.in_process or self.plan.workers < 2:
+            return files, []
+
+        whole, oversized = [], []
+        for file in files:
+            questions = count_marker(file, HTML_QUESTION_MARKER)
+            (oversized if questions > self.args.split_threshold else whole).append(file)
+        return whole, oversized
+
+    def map_split_files(self, files: Iterable[Path],
+                        finish: Callable[[Path, Quiz], Any]) -> Iterator[Tuple[Path, Any]]:
+        """
+        The counterpart of ``map_files`` for oversized pages. One file at a time is split into question fragments
+        that are parsed across the whole pool, and ``finish(file, quiz)`` runs on the reassembled quiz in the main
+        process. Failures are quarantined the same way.
+
+        :param files: The oversized files.
+        :param finish: Turns the parsed quiz into the same result ``map_files`` would yield for the file.
+        :return: An iterator of (file, result) tuples for the files that were processed successfully.
+        """
+        for file in files:
+            try:
+                with timed("parse"):
+                    quiz = self.parse_split_file(file)
+                count_questions(quiz)
+                result = finish(file, quiz)
+            except Exception as ex:
+                self.fail_file(file, ex)
+            else:
+                self.report.record_success()
+                yield file, result
+
+    def parse_split_file(self, file: Path) -> Quiz:
+        html_content = self.read_html_file(file)
+        executor, generation = self.pool.executor, self.pool.generation
+
+        split = split_html(html_content)
+        if split is None:
+            logging.warning(f"Could not split {file} into questions. Parsing it in a single worker.")
+            return self.wait_for_file(file, [executor.submit(process_html, html_content, self.question_types)],
+                                      generation)[0]
+
+        title, fragments = split
+        if self.question_types is not None:
+            fragments = filter_fragments(fragments, self.question_types)
+            if not fragments:
+                return Quiz(title=title)
+        chunk_size = math.ceil(len(fragments) / (self.plan.workers * SPLIT_TASKS_PER_WORKER))
+        futures = [executor.submit(parse_fragments, fragments[start:start + chunk_size], self.question_types)
+                   for start in range(0, len(fragments), chunk_size)]
+        parsed = [item for chunk in self.wait_for_file(file, futures, generation) for item in chunk]
+        return assemble_quiz(title, fragments, parsed, self.question_types)
+
+    def wait_for_file(self, file: Path, futures: list, generation: int) -> list:
+        """
+        Waits for every task of one file, in order, within the per-file timeout.
+
+        A task that timed out by itself leaves its worker usable, so the pool is only recycled when the deadline runs
+        out here, with tasks still stuck in the workers, or when the pool broke.
+
+        :param generation: The pool generation the tasks were submitted to.
+        :return: The results of the tasks.
+        """
+        deadline = time.monotonic() + self.args.timeout if self.args.timeout else None
+        try:
+            return [future.result(timeout=max(deadline - time.monotonic(), 0) if deadline else None)
+                    for future in futures]
+        except FileTimeoutError:
+            raise
+        except FutureTimeoutError:
+            self.pool.recycle(generation)
+            raise FileTimeoutError(f"Processing {file} took longer than {self.args.timeout} seconds")
+        except BrokenProcessPool:
+            self.pool.recycle(generation)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def fail_file(self, file: Path, error: BaseException) -> None:
+        """
+        Records a failed file and quarantines it, together with a note of the error, so it is not retried next run.
+        """
+        description = f"{type(error).__name__}: {error}"
+        logging.error(f"Failed to process {file}: {description}")
+
+        quarantined_as = self.set_aside(file, self.quarantine_dir)
+        if quarantined_as is not None:
+            try:
+                with open(quarantined_as.with_name(f"{quarantined_as.name}.error.txt"), "w", encoding="utf-8") as note:
+                    note.write(f"{file}\n{description}\n")
+            except OSError as ex:
+                logging.exception(ex)
+
+        self.report.record_failure(FailedFile(file, description, quarantined_as))
+        if self.journal is not None:
+            self.journal.record(file, FAILED, error=description)
+
+    def set_aside(self, file: Path, directory: Path) -> Optional[Path]:
+        """
+        Moves a file out of the input directory into ``directory``, or copies it with -dm, without overwriting a file
+        set aside earlier. With -dm the file stays in the input directory and is set aside again on every run, so a
+        copy an earlier run made of this version of the file is reused instead of adding another one.
+
+        :return: Where the file was moved or copied to, or None if that failed.
+        """
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            destination = directory / file.name
+            counter = 1
+            while destination.exists():
+                # copy2 keeps the modification time, so the copy has the same fingerprint as the original
+                if self.args.dont_move and file_fingerprint(destination) == file_fingerprint(file):
+                    return destination
+                counter += 1
+                destination = directory / f"{file.stem}_{counter}{file.suffix}"
+
+            # -dm promises to leave the input directory alone, so files are only copied
+            if self.args.dont_move:
+                shutil.copy2(file, destination)
+            else:
+                shutil.move(file, destination)
+            return destination
+        except OSError as ex:
+            logging.exception(ex)
+            return None
+
+    @contextmanager
+    def quiz_recorder(self) -> Iterator[Callable[[Quiz], None]]:
+        """
+        Yields a function that adds each newly parsed quiz to the persistent question bank, search index, answer
+        knowledge base and score store, when enabled, so quizzes can be recorded as they arrive instead of being kept
+        until the end of the run.
+        """
+        bank = QuestionBank(self.state_dir / QUESTION_BANK_FILE) if self.args.question_bank else None
+        index = SearchIndex(self.state_dir / SEARCH_INDEX_FILE) if self.args.search_index else None
+        answers = AnswerKnowledgeBase(self.state_dir / ANSWER_KB_FILE) if self.args.reconcile else None
+        scores = ScoreStore(self.state_dir / SCORE_STORE_DIR) if self.args.record_scores else None
+        totals = Counter()
+
+        def record(quiz: Quiz) -> None:
+            if bank is not None:
+                totals["changed"] += bank.upsert_quiz(quiz)
+            if index is not None:
+                totals["indexed"] += index.add_quiz(quiz)
+            if answers is not None:
+                totals["observed"] += answers.record_quiz(quiz)
+            if scores is not None:
+                totals["scored"] += scores.record_quiz(quiz)
+
+        try:
+            yield record
+        finally:
+            if bank is not None:
+                print(f"Question bank: {totals['changed']} question(s) added or updated, {bank.count()} total")
+                bank.close()
+            if index is not None:
+                print(f"Search index: {totals['indexed']} question(s) indexed")
+                index.close()
+            if answers is not None:
+                print(f"Answer knowledge base: {totals['observed']} answer(s) and wrong choice(s) recorded")
+                answers.close()
+            if scores is not None:
+                print(f"Score store: {totals['scored']} question attempt(s) recorded")
+                scores.close()
+
+    def reconcile_quiz(self, quiz: Quiz) -> Quiz:
+        """
+        Fills in unanswered questions from what other attempts revealed, then folds the quiz again so copies of a
+        question that now agree are merged.
+        """
+        with AnswerKnowledgeBase(self.state_dir / ANSWER_KB_FILE) as answers:
+            resolved = answers.resolve_quiz(quiz)
+        print(f"Reconciled {resolved} unanswered question(s) from other attempts")
+
+        combiner = QuizCombiner(quiz.title)
+        combiner.add(quiz)
+        return combiner.to_quiz()
+
+    def export_question_bank(self) -> None:
+        with QuestionBank(self.state_dir / QUESTION_BANK_FILE) as bank:
+            quiz = bank.to_quiz()
+        if self.args.reconcile:
+            quiz = self.reconcile_quiz(quiz)
+
+        wq = QuizWriter(quiz)
+        output_file = self.output_dir / "question_bank"
+        wq.write(self.args.file_type, output_file)
+        print(f"Exported {quiz.number_of_questions} question bank question(s) to {output_file}")
 
     def process_files_parallel(self):
-        with ProcessPoolExecutor(max_workers=self.args.cores) as executor:
-            process_file_with_args = \
-                partial(self.process_single_file, output_dir=self.output_dir, parsed_html_dir=self.parsed_html_dir)
-            results = list(executor.map(process_file_with_args, self.raw_html_dir.glob(self.file_extension)))
+        process_file_with_args = \
+            self.worker_task("process_single_file", output_dir=self.output_dir, parsed_html_dir=self.parsed_html_dir)
+
+        with self.quiz_recorder() as record, \
+                RunJournal(self.state_dir / RUN_JOURNAL_FILE, resume=self.args.resume) as self.journal:
+            for batch in self.file_batches():
+                files, oversized = self.partition_oversized(self.resume_batch(batch))
+                bundled = []
+                with open_output_sink(self.args.output_sink, self.output_dir, self.file_types) or nullcontext() as sink:
+                    results = chain(self.map_files(process_file_with_args, files),
+                                    self.map_split_files(oversized, self.finish_split_file))
+                    for _, result in results:
+                        self.journal.record(result.source, PARSED, title=result.title)
+                        if sink is not None and result.rendered is not None:
+                            sink.write_quiz(result.title, result.rendered)
+                            bundled.append(result)
+                        else:
+                            self.finish_result(result)
+
+                        print(result.message)
+                        self.report.record_memory_profile(result.worker_pid, result.memory_profile)
+                        self.metrics.record_worker(result.worker_pid, result.metrics)
+                        if result.quiz is not None:
+                            record(result.quiz)
+
+                # A bundle is only complete once its sink is closed, so until then its pages stay in the input
+                # directory and an interrupted run redoes them
+                for result in bundled:
+                    result.written = self.file_types
+                    self.finish_result(result)
+
+        self.journal = None
+
+    def archive_state(self) -> str:
+        if self.args.remove_html:
+            return "removed"
+        return "kept" if self.args.dont_move else "moved"
+
+    def resume_batch(self, batch: List[Path]) -> List[Path]:
+        """
+        Records the files of a batch in the journal. With --resume, files an earlier run finished are dropped, and
+        files whose outputs were all written but that were never archived are archived here without being parsed.
+
+        :return: The files that still have to be processed.
+        """
+        remaining, skipped, archived = [], 0, 0
+        required = {written_state(file_type) for file_type in self.file_types}
+
+        for file in batch:
+            fingerprint = file_fingerprint(file)
+            progress = self.journal.progress_of(file, fingerprint) if self.args.resume else None
+            if progress is not None and required <= progress.states:
+                if not progress.states & ARCHIVED_STATES:
+                    self.archive_html_file(file, progress.title, self.parsed_html_dir)
+                    self.journal.record(file, self.archive_state())
+                    archived += 1
+                skipped += 1
+                continue
+
+            self.journal.record(file, DISCOVERED, fingerprint=fingerprint)
+            remaining.append(file)
 
-        for result in results:
-            print(result)
+        if skipped:
+            print(f"Resuming: skipped {skipped} file(s) finished by an earlier run, "
+                  f"{archived} of which only needed archiving")
+        return remaining
+
+    def finish_result(self, result: FileResult) -> None:
+        """
+        Journals the outputs that were written for a file, then archives the file and journals that too. A run that
+        stops in between leaves a file whose outputs are all journalled, which --resume only archives.
+        """
+        for file_type in result.written:
+            self.journal.record(result.source, written_state(file_type))
+        try:
+            self.archive_html_file(result.source, result.title, self.parsed_html_dir, result.staged_archive)
+        except OSError as ex:
+            if result.staged_archive is not None:
+                result.staged_archive.unlink(missing_ok=True)
+            self.report.retract_success()
+            self.fail_file(result.source, ex)
+            return
+        self.journal.record(result.source, self.archive_state())
+
+    def file_batches(self) -> Iterator[list]:
+        """
+        Yields the input files to process. Normally that is a single batch of everything in the input directory; in
+        distributed mode it is one claimed batch at a time until the shared queue is empty.
+        """
+        if not self.args.distributed:
+            yield self.plan.files
+            return
+
+        queue = WorkQueue(self.raw_html_dir, self.file_patterns, self.args.worker_id, self.args.lease_seconds)
+        recovered = queue.recover_expired_leases()
+        if recovered:
+            print(f"Returned {recovered} file(s) with expired leases to the queue")
+
+        while True:
+            batch = queue.claim(self.plan.chunk_size)
+            if not batch:
+                break
+            with queue.keep_alive(batch):
+                # Claimed files were never screened by the planner
+                yield self.screen_files(batch)
+            queue.release(batch)
+
+        queue.close()
 
     def combine_quizzes_from_files(self):
-        chunk_size = max(len(self.quizzes) // self.args.cores, 1)
-        quiz_chunks = [self.quizzes[i:i + chunk_size] for i in range(0, len(self.quizzes), chunk_size)]
+        """
+        Parses every input file and folds each quiz into the combined quiz as soon as it arrives, so only the unique
+        questions are ever held in memory. With -sj and without -cb, the quizzes are only recorded.
+        """
+        combiner = QuizCombiner() if self.args.combine else None
 
-        with ProcessPoolExecutor(max_workers=self.args.cores) as executor:
-            merged_quiz_chunks = list(executor.map(self.merge_quizzes, quiz_chunks))
+        files, oversized = self.partition_oversized(self.plan.files)
+        # Split files are reassembled in the main process, whose cache counters are added at the end anyway
+        results = chain(self.map_files(self.worker_task("_process_file"), files),
+                        self.map_split_files(oversized, lambda file, quiz: (quiz, None, None, None, None)))
 
-        combined_quiz = self.merge_quizzes(merged_quiz_chunks)
+        with self.quiz_recorder() as record:
+            for _, (quiz, worker_pid, worker_stats, worker_memory, worker_metrics) in results:
+                if worker_pid is not None:
+                    self.worker_normalization_stats[worker_pid] = worker_stats
+                    self.report.record_memory_profile(worker_pid, worker_memory)
+                    self.metrics.record_worker(worker_pid, worker_metrics)
+                record(quiz)
+                if combiner is not None:
+                    combiner.add(quiz)
 
-        wq = QuizWriter(combined_quiz)
-        output_file = self.output_dir / f"combined_quiz"
-        wq.write(self.args.file_type, output_file)
+        if combiner is None:
+            return
+
+        if not len(combiner):
+            print("No questions were parsed. Nothing to combine.")
+            return
+
+        combined_quiz = combiner.to_quiz()
+        if self.args.reconcile:
+            combined_quiz = self.reconcile_quiz(combined_quiz)
+
+        with timed("write"):
+            if self.args.shard_questions or self.args.shard_bytes:
+                self.write_shards(combined_quiz)
+            else:
+                wq = QuizWriter(combined_quiz)
+                output_file = self.output_dir / f"combined_quiz"
+                wq.write(self.args.file_type, output_file, streaming=True)
+
+        self.log_normalization_stats()
+
+    def write_shards(self, combined_quiz: Quiz) -> None:
+        """
+        Writes the combined quiz as size-bounded shards, rendered across the worker pool, next to an index listing
+        them. Shards whose questions did not change keep their name and contents and are not rewritten.
+        """
+        shards = shard_quiz(combined_quiz, self.args.shard_questions, self.args.shard_bytes)
+        shard_dir = self.output_dir / SHARD_DIR
+        shard_dir.mkdir(exist_ok=True)
+
+        failed = []
+
+        def fail_shard(task: ShardTask, error: BaseException) -> None:
+            description = f"{type(error).__name__}: {error}"
+            logging.error(f"Failed to write {task.output_file}: {description}")
+            failed.append(FailedFile(task.output_file, description))
 
-    def process_single_file(self, raw_html_file: Path, output_dir: Path, parsed_html_dir: Path) -> str:
-        html_content = self.read_html_file(raw_html_file)
+        tasks = [ShardTask(shard.quiz, shard_dir / shard.name) for shard in shards]
+        written = sum(any(result.values()) for _, result in self.map_tasks(self.worker_task("write_shard"), tasks,
+                                                                           fail_shard))
+        if failed:
+            for failed_file in failed:
+                self.report.record_failure(failed_file)
+            # The shard directory is left as it was, so the index never lists a shard that was not written
+            print(f"Combined quiz: {len(failed)} of {len(shards)} shard(s) could not be written, so {shard_dir} "
+                  f"was not cleaned up and its index was not updated")
+            return
+        removed = remove_stale_shards(shard_dir, shards, self.file_types)
+
+        index = shard_index(combined_quiz, shards, self.file_types)
+        write_if_changed(shard_dir / SHARD_INDEX_FILE, json.dumps(index, ensure_ascii=False, indent=4))
+        print(f"Combined quiz: {len(shards)} shard(s) in {shard_dir}, {written} written, "
+              f"{len(shards) - written} unchanged, {removed} stale file(s) removed")
+
+    def write_shard(self, task: 'ShardTask') -> Dict[str, bool]:
+        return QuizWriter(task.quiz).write(self.args.file_type, task.output_file)
+
+    def log_normalization_stats(self) -> None:
+        all_stats = list(self.worker_normalization_stats.values()) + [normalization_stats()]
+        for name, stats in merge_normalization_stats(all_stats).items():
+            logging.info(f"Normalization cache '{name}': {stats['hits']} hits, {stats['misses']} misses "
+                         f"({stats['hit_rate']:.1%} hit rate)")
+
+    def process_single_file(self, raw_html_file: Path, output_dir: Path, parsed_html_dir: Path,
+                            quiz: Optional[Quiz] = None) -> FileResult:
+        if quiz is None:
+            with timed("parse"):
+                quiz = process_html(self.read_html_file(raw_html_file), self.question_types)
+            count_questions(quiz)
 
-        quiz = process_html(html_content)
         wq = QuizWriter(quiz)
 
         output_file = output_dir / f"{quiz.title}"
-        try:
-            wq.write(self.args.file_type, output_file)
-
-            new_html_file = parsed_html_dir / f"{quiz.title}.html"
-            if self.args.remove_html:
-                os.remove(raw_html_file)
-            elif self.args.dont_move:
-                pass
+        result = FileResult(raw_html_file, title=quiz.title, quiz=quiz if self.collect_quizzes else None,
+                            worker_pid=os.getpid())
+        # Errors propagate to QuizProcessor.map_files, which quarantines the file and records the failure. The page
+        # itself is archived by the main process, once it has journalled the outputs
+        with timed("write"):
+            if self.args.output_sink == "files":
+                result.written = list(wq.write(self.args.file_type, output_file))
             else:
-                shutil.move(raw_html_file, new_html_file)
+                result.rendered = wq.render(self.args.file_type)
+            if self.args.compact_archive and not (self.args.remove_html or self.args.dont_move):
+                result.staged_archive = self.stage_compact_archive(raw_html_file, parsed_html_dir)
 
-        except Exception as ex:
-            logging.exception(ex)
-            logging.info(f"Error occurred while writing {raw_html_file}. Skipping...")
+        if self.args.output_sink == "files":
+            result.message = f"Processed {raw_html_file} and saved output as {output_file}.{self.args.file_type}"
+        else:
+            result.message = f"Processed {raw_html_file} into the {self.args.output_sink} bundle"
+        result.memory_profile = memory_profile()
+        result.metrics = self.worker_metrics()
+        return result
+
+    def finish_split_file(self, raw_html_file: Path, quiz: Quiz) -> FileResult:
+        return self.process_single_file(raw_html_file, self.output_dir, self.parsed_html_dir, quiz=quiz)
+
+    def archive_html_file(self, raw_html_file: Path, title: str, parsed_html_dir: Path,
+                          staged_archive: Optional[Path] = None) -> None:
+        """
+        Removes, keeps or moves a processed HTML file according to the -rm/-dm flags. With -ca, the archived copy is
+        stripped down to the title and questions and gzip-compressed instead.
+
+        :param staged_archive: The compressed archive already prepared by ``stage_compact_archive``, with -ca.
+        """
+        if self.args.remove_html:
+            os.remove(raw_html_file)
+        elif self.args.dont_move:
+            pass
+        elif self.args.compact_archive:
+            if staged_archive is None:
+                staged_archive = self.stage_compact_archive(raw_html_file, parsed_html_dir)
+            os.replace(staged_archive, parsed_html_dir / f"{title}.html.gz")
+            os.remove(raw_html_file)
+        else:
+            suffix = ".html.gz" if raw_html_file.suffix == ".gz" else ".html"
+            shutil.move(raw_html_file, parsed_html_dir / f"{title}{suffix}")
+
+    def stage_compact_archive(self, raw_html_file: Path, parsed_html_dir: Path) -> Path:
+        """
+        Compresses the compact copy of a page under a temporary name next to its archive, so the raw page is only
+        removed once its archive is complete. It is named after the page rather than the quiz, so attempts of the same
+        quiz don't overwrite each other's, and a copy left by an interrupted run is overwritten by the next attempt.
 
-        return f"Processed {raw_html_file} and saved output as {output_file}.{self.args.file_type}"
+        :return: The temporary file, which ``archive_html_file`` renames into place.
+        """
+        compressed = gzip.compress(compact_html(self.read_html_file(raw_html_file)).encode("utf-8"), mtime=0)
+        temp_file = parsed_html_dir / f".{raw_html_file.name}.tmp"
+        temp_file.write_bytes(compressed)
+        return temp_file
 
-    def process_json_file(self, json_file: Path) -> Quiz:
+    def process_json_file(self, json_file: Path) -> LazyQuiz:
         with open(json_file, "r", encoding="utf-8") as file:
-            json_data = json.load(file)
-        return Quiz.from_json(json_data)
+            text = file.read()
+        # Sections are only decoded when they are used, and questions only built while they are combined or
+        # recorded, one at a time
+        return LazyQuiz.from_text(text, self.sections)
 
     def read_html_file(self, file_path: Path) -> str:
-        with open(file_path, "r", encoding="utf-8") as file:
+        opener = gzip.open if file_path.suffix == ".gz" else open
+        with opener(file_path, "rt", encoding="utf-8") as file:
             html_content = file.read()
         return html_content
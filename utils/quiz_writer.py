@@ -1,17 +1,22 @@
+import io
 import json
 import logging
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Union, Any, Dict
+from string import Formatter
+from typing import List, Union, Any, Dict, TextIO, Callable, Iterable, Optional
 
 import yaml
 
 from utils.constants import DASHES_WITH_NEWLINES, QUIZLET_CARDS_DELIMITER, QUIZLET_TERM_DEFINITION_DELIMITER
+from utils.memory_profile import memory_stage
 from utils.questions import MatchingQuestion, MultipleShortAnswerQuestion, MultipleChoiceQuestion, \
     MultipleAnswersQuestion, ShortAnswerQuestion
 from utils.quiz import Quiz
-from utils.utils import insert_newlines
+from utils.utils import insert_newlines, write_if_changed, write_stream_if_changed
 
 # Constants
 HEADINGS = {
@@ -25,7 +30,8 @@ HEADINGS = {
 BETA_MESSAGE = " **This section is still being tested. Please report any bugs.**"
 BETA_CLASSES = [MultipleShortAnswerQuestion]
 
-QUESTION_FORMAT_TUPLE = (MultipleShortAnswerQuestion, MultipleAnswersQuestion, ShortAnswerQuestion)
+# Rendered fragments are joined and written in batches of this many, so a large quiz takes a few large writes
+WRITE_BATCH_FRAGMENTS = 1024
 
 
 class FileWriterTypes(Enum):
@@ -34,55 +40,231 @@ class FileWriterTypes(Enum):
     Quizlet = "QuizletFileWriter"
 
 
+class AnswerTemplate:
+    """
+    How a file format lays out the answers of a question: a prefix, then either the items of a list of answers or the
+    ``key : value`` pairs of a dictionary of answers, each through a format string prepared once.
+    """
+
+    def __init__(self, prefix: str, item: str, item_separator: str, pair: str, pair_separator: str):
+        self.prefix = prefix
+        self.item = item.format
+        self.item_separator = item_separator
+        self.pair = pair.format
+        self.pair_separator = pair_separator
+
+    def render(self, answers: Union[List[str], Dict[str, str]]) -> str:
+        if isinstance(answers, list):
+            return self.prefix + self.item_separator.join(map(self.item, answers))
+        return self.prefix + self.pair_separator.join(map(self.pair, answers.keys(), answers.values()))
+
+
+ANSWER_TEMPLATES = {
+    FileWriterTypes.Text: AnswerTemplate("Answer(s): ", "{}", ", ", "{} : {}", "\n"),
+    FileWriterTypes.Quizlet: AnswerTemplate(QUIZLET_TERM_DEFINITION_DELIMITER, "{}", ", ", "{} : {}", "\n"),
+    FileWriterTypes.Markdown: AnswerTemplate("#### _Answer(s):_ ", "\n- {}", "", "\n- {} : {}", ""),
+}
+
+
+def _single_answer(q: Any) -> Optional[List[str]]:
+    return [q.answer] if q.answer else None
+
+
+def _answers(q: Any) -> Union[List[str], Dict[str, str], None]:
+    return q.answers or None
+
+
+# The answer(s) of each question type, or None when it has none
+ANSWER_GETTERS = {
+    MultipleChoiceQuestion: _single_answer,
+    ShortAnswerQuestion: _single_answer,
+    MultipleAnswersQuestion: _answers,
+    MultipleShortAnswerQuestion: _answers,
+    MatchingQuestion: _answers,
+}
+
+# The fields a question layout can use, besides {answer}
+QUESTION_FIELDS = {
+    "question": attrgetter("question"),
+    "question_lines": lambda q: insert_newlines(q.question),
+    "choices": lambda q: format_choices(q.choices),
+    "answer_bank": lambda q: format_choices(q.answer_bank),
+    "word_bank": lambda q: format_choices(q.word_bank),
+}
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _closest(question_class: type, table: dict) -> Optional[type]:
+    return next((cls for cls in question_class.__mro__ if cls in table), None)
+
+
+class QuestionTemplates:
+    """
+    The question layouts of one file format, each compiled once per question class into a function that renders a
+    question.
+
+    A layout is a format string over the fields in ``QUESTION_FIELDS`` and ``{answer}``, or a function taking the
+    question. Compiling a format string binds every field to the function that produces it and turns the layout and the
+    constant suffix into one positional format string, so rendering a question is a single ``str.format`` call without
+    any type checks.
+
+    :param writer_type: The file format, which decides how answers are laid out.
+    :param layouts: The layout of each question class. A subclass uses the layout of its closest listed base class.
+    :param suffix: Constant text written after every question rendered from a format string.
+    """
+
+    def __init__(self, writer_type: FileWriterTypes, layouts: Dict[type, Union[str, Callable[[Any], str]]],
+                 suffix: str = ""):
+        self.writer_type = writer_type
+        self.answer_template = ANSWER_TEMPLATES[writer_type]
+        self.layouts = layouts
+        self.suffix = suffix
+        self.renderers: Dict[type, Callable[[Any], str]] = {}
+
+    def renderer(self, question_class: type) -> Callable[[Any], str]:
+        renderer = self.renderers.get(question_class)
+        if renderer is None:
+            renderer = self.renderers[question_class] = self.compile(question_class)
+        return renderer
+
+    def compile(self, question_class: type) -> Callable[[Any], str]:
+        layout_class = _closest(question_class, self.layouts)
+        if layout_class is None:
+            logging.error(f"Question type {question_class} not supported by the {self.writer_type.name} writer")
+            return lambda q: ""
+
+        layout = self.layouts[layout_class]
+        if callable(layout):
+            return layout
+
+        fields, pattern = [], []
+        for literal, name, _, _ in Formatter().parse(layout):
+            pattern.append(_escape(literal))
+            if name is not None:
+                pattern.append(f"{{{len(fields)}}}")
+                fields.append(self.answer_field(ANSWER_GETTERS[layout_class]) if name == "answer"
+                              else QUESTION_FIELDS[name])
+        pattern.append(_escape(self.suffix))
+
+        render = "".join(pattern).format
+        return lambda q: render(*[field(q) for field in fields])
+
+    def answer_field(self, get_answers: Callable[[Any], Any]) -> Callable[[Any], str]:
+        render = self.answer_template.render
+
+        def answer(q: Any) -> str:
+            answers = get_answers(q)
+            return render(answers) if answers else ""
+        return answer
+
+
+class FragmentBuffer:
+    """
+    Collects rendered text and writes it to the stream in joined batches instead of one write per fragment.
+    """
+
+    def __init__(self, text_file: TextIO):
+        self.text_file = text_file
+        self.fragments: List[str] = []
+
+    def write(self, fragment: str) -> None:
+        self.fragments.append(fragment)
+        if len(self.fragments) >= WRITE_BATCH_FRAGMENTS:
+            self.flush()
+
+    def write_questions(self, questions: Iterable, templates: QuestionTemplates) -> None:
+        renderer_class, renderer = None, None
+        for q in questions:
+            # Sections hold one question type, so the renderer is looked up again only when the type changes
+            if type(q) is not renderer_class:
+                renderer_class = type(q)
+                renderer = templates.renderer(renderer_class)
+            self.write(renderer(q))
+
+    def flush(self) -> None:
+        if self.fragments:
+            self.text_file.write("".join(self.fragments))
+            self.fragments.clear()
+
+
+def format_matching_cards(q: MatchingQuestion) -> str:
+    """
+    One Quizlet card per match. The answer bank is the same on every card, so it is formatted once.
+    """
+    front = f"{q.question}\n\n"
+    back = f"\n\n{format_choices(q.answer_bank)}{QUIZLET_TERM_DEFINITION_DELIMITER}"
+    return "\n".join([f"{front}{k}{back}{v}{QUIZLET_CARDS_DELIMITER}" for k, v in q.answers.items()])
+
+
 class QuizFileWriter(ABC):
     def __init__(self, quiz: Quiz):
         self.quiz = quiz
 
     @abstractmethod
-    def write(self, file_path: Path) -> None:
+    def write_to(self, text_file: TextIO) -> None:
         pass
 
+    def render(self) -> str:
+        """
+        Renders the quiz in this writer's format.
+
+        :return: The rendered file contents.
+        """
+        with memory_stage(f"writer {type(self).__name__}"):
+            buffer = io.StringIO()
+            self.write_to(buffer)
+            return buffer.getvalue()
+
+    def write(self, file_path: Path, streaming: bool = False) -> bool:
+        """
+        Writes the rendered quiz to the file, leaving it untouched if its contents would not change.
+
+        :param file_path: The path of the file to write.
+        :param streaming: Stream the output to disk instead of rendering it in memory first. Meant for large quizzes.
+        :return: True if the file was written, False if it was already up to date.
+        """
+        if streaming:
+            with memory_stage(f"writer {type(self).__name__}"):
+                return write_stream_if_changed(file_path, self.write_to)
+        return write_if_changed(file_path, self.render())
+
 
 class TextQuizFileWriter(QuizFileWriter):
-    def write(self, file_path: Path) -> None:
-
-        with open(file_path, 'w', encoding='utf-8') as text_file:
-            quiz = self.quiz
-            mcq, mq = quiz.multiple_choice_questions, quiz.matching_questions
-            maq, msaq = quiz.multiple_answer_questions, quiz.multiple_short_answer_questions
-            saq = quiz.short_answer_questions
-            sections = [
-                (len(mcq), HEADINGS["multiple_choice"], "multiple choice questions", mcq),
-                (len(mq), HEADINGS["matching"], "matching questions", mq),
-                (len(maq), HEADINGS["multiple_answers"], "multiple answers questions", maq),
-                (len(msaq), HEADINGS["multiple_short_answers"], "multiple short answer questions", msaq),
-                (len(saq), HEADINGS["short_answer"], "short answer questions", saq)
-            ]
-
-            text_file.write(HEADINGS["initial"])
-            text_file.write(f"Title: {quiz.title}\n\nNumber of questions: {quiz.number_of_questions}\n")
-
-            for count, heading, heading_text, questions in sections:
-                if count > 0:
-                    text_file.write(self.write_question_summary(questions, heading_text))
-
-            for count, heading, heading_text, questions in sections:
-                if count > 0:
-                    text_file.write(heading)
-                    for q in questions:
-                        question = q.question
-                        choices = format_choices(q.choices) if hasattr(q, 'choices') else ""
-
-                        if isinstance(q, MatchingQuestion):
-                            answer_bank = format_choices(q.answer_bank)
-                            word_bank = format_choices(q.word_bank)
-                            choices = f"Answer Bank:\n{answer_bank}\n\nWord Bank:\n{word_bank}"
-
-                        if isinstance(q, QUESTION_FORMAT_TUPLE):
-                            question = insert_newlines(q.question)
-
-                        answer = format_answers(q, FileWriterTypes.Text)
-                        text_file.writelines([f"{question}\n{choices}\n\n{answer}{DASHES_WITH_NEWLINES}"])
+    templates = QuestionTemplates(FileWriterTypes.Text, {
+        MultipleChoiceQuestion: "{question}\n{choices}\n\n{answer}",
+        MatchingQuestion: "{question}\nAnswer Bank:\n{answer_bank}\n\nWord Bank:\n{word_bank}\n\n{answer}",
+        MultipleAnswersQuestion: "{question_lines}\n{choices}\n\n{answer}",
+        MultipleShortAnswerQuestion: "{question_lines}\n\n\n{answer}",
+        ShortAnswerQuestion: "{question_lines}\n\n\n{answer}",
+    }, suffix=DASHES_WITH_NEWLINES)
+    # (Quiz attribute, heading, summary text) of every section, in output order
+    sections = [
+        ("multiple_choice_questions", HEADINGS["multiple_choice"], "multiple choice questions"),
+        ("matching_questions", HEADINGS["matching"], "matching questions"),
+        ("multiple_answer_questions", HEADINGS["multiple_answers"], "multiple answers questions"),
+        ("multiple_short_answer_questions", HEADINGS["multiple_short_answers"], "multiple short answer questions"),
+        ("short_answer_questions", HEADINGS["short_answer"], "short answer questions"),
+    ]
+
+    def write_to(self, text_file: TextIO) -> None:
+        quiz = self.quiz
+        sections = [(getattr(quiz, attribute), heading, heading_text)
+                    for attribute, heading, heading_text in self.sections if len(getattr(quiz, attribute)) > 0]
+
+        out = FragmentBuffer(text_file)
+        out.write(HEADINGS["initial"])
+        out.write(f"Title: {quiz.title}\n\nNumber of questions: {quiz.number_of_questions}\n")
+
+        for questions, _, heading_text in sections:
+            out.write(self.write_question_summary(questions, heading_text))
+
+        for questions, heading, _ in sections:
+            out.write(heading)
+            out.write_questions(questions, self.templates)
+        out.flush()
 
     @staticmethod
     def write_question_summary(questions: list, heading_text: str) -> str:
@@ -95,47 +277,40 @@ class TextQuizFileWriter(QuizFileWriter):
 
 
 class MarkdownQuizFileWriter(QuizFileWriter):
-    def write(self, file_path: Path) -> None:
-
-        dashes = f"\n\n{'-' * 3}\n\n"
-
-        with open(file_path, 'w', encoding='utf-8') as text_file:
-            quiz = self.quiz
-            mcq, mq = quiz.multiple_choice_questions, quiz.matching_questions
-            maq, msaq = quiz.multiple_answer_questions, quiz.multiple_short_answer_questions
-            saq = quiz.short_answer_questions
-            sections = [
-                (len(mcq), "Multiple Choice Questions", mcq),
-                (len(mq), "Matching Questions", mq),
-                (len(maq), "Multiple Answer Questions", maq),
-                (len(msaq), "Multiple Short Answer Questions", msaq),
-                (len(saq), "Short Answer Questions", saq)
-            ]
-
-            text_file.write(f"# {quiz.title}\n\n- Number of questions: {quiz.number_of_questions}\n")
-
-            for count, heading, questions in sections:
-                if count > 0:
-                    text_file.write(self.write_markdown_summary(questions, heading, count))
-
-            text_file.write(f"\n{dashes}\n")
-
-            for count, heading, questions in sections:
-                if count > 0:
-                    text_file.write(f"## {heading}\n")
-                    for q in questions:
-                        question = f"#### {q.question}"
-                        choices = format_choices(q.choices) if hasattr(q, 'choices') else ""
-
-                        if isinstance(q, MatchingQuestion):
-                            answer_bank = format_choices(q.answer_bank)
-                            word_bank = format_choices(q.word_bank)
-                            choices = f"#### Answer Bank:\n{answer_bank}\n\n#### Word Bank:\n{word_bank}"
-                        elif isinstance(q, QUESTION_FORMAT_TUPLE):
-                            question = insert_newlines(q.question)
-
-                        answer = format_answers(q, FileWriterTypes.Markdown)
-                        text_file.writelines([f"{question}\n{choices}\n\n{answer}{dashes}"])
+    dashes = f"\n\n{'-' * 3}\n\n"
+    templates = QuestionTemplates(FileWriterTypes.Markdown, {
+        MultipleChoiceQuestion: "#### {question}\n{choices}\n\n{answer}",
+        MatchingQuestion: "#### {question}\n#### Answer Bank:\n{answer_bank}\n\n#### Word Bank:\n{word_bank}\n\n{answer}",
+        MultipleAnswersQuestion: "{question_lines}\n{choices}\n\n{answer}",
+        MultipleShortAnswerQuestion: "{question_lines}\n\n\n{answer}",
+        ShortAnswerQuestion: "{question_lines}\n\n\n{answer}",
+    }, suffix=dashes)
+    # (Quiz attribute, heading) of every section, in output order
+    sections = [
+        ("multiple_choice_questions", "Multiple Choice Questions"),
+        ("matching_questions", "Matching Questions"),
+        ("multiple_answer_questions", "Multiple Answer Questions"),
+        ("multiple_short_answer_questions", "Multiple Short Answer Questions"),
+        ("short_answer_questions", "Short Answer Questions"),
+    ]
+
+    def write_to(self, text_file: TextIO) -> None:
+        quiz = self.quiz
+        sections = [(getattr(quiz, attribute), heading)
+                    for attribute, heading in self.sections if len(getattr(quiz, attribute)) > 0]
+
+        out = FragmentBuffer(text_file)
+        out.write(f"# {quiz.title}\n\n- Number of questions: {quiz.number_of_questions}\n")
+
+        for questions, heading in sections:
+            out.write(self.write_markdown_summary(questions, heading, len(questions)))
+
+        out.write(f"\n{self.dashes}\n")
+
+        for questions, heading in sections:
+            out.write(f"## {heading}\n")
+            out.write_questions(questions, self.templates)
+        out.flush()
 
     @staticmethod
     def write_markdown_summary(questions: list, heading: str, count: int) -> str:
@@ -148,90 +323,104 @@ class MarkdownQuizFileWriter(QuizFileWriter):
 
 
 class QuizletQuizFileWriter(QuizFileWriter):
-    def write(self, file_path: Path) -> None:
+    card_end = f"{QUIZLET_CARDS_DELIMITER}\n"
+    templates = QuestionTemplates(FileWriterTypes.Quizlet, {
+        MultipleChoiceQuestion: "{question_lines}\n\n{choices}{answer}" + card_end,
+        MatchingQuestion: format_matching_cards,
+        MultipleAnswersQuestion: "{question_lines}\n\n{choices}{answer}" + card_end,
+        MultipleShortAnswerQuestion: "{question_lines}\n\n{answer}" + card_end,
+        ShortAnswerQuestion: "{question_lines}\n\n{answer}" + card_end,
+    })
+    sections = ["multiple_choice_questions", "matching_questions", "multiple_answer_questions",
+                "multiple_short_answer_questions", "short_answer_questions"]
+
+    def write_to(self, text_file: TextIO) -> None:
         """
-        Write the Quiz object to a text file with the specified file name and a format for easy quizlet import
+        Write the Quiz object to a text stream in a format for easy quizlet import
 
-        :param file_path: The name of the text file to write.
+        :param text_file: The text stream to write to.
         """
-
-        with open(file_path, 'w', encoding='utf-8') as text_file:
-            quiz = self.quiz
-            mcq, mq = quiz.multiple_choice_questions, quiz.matching_questions
-            maq, msaq = quiz.multiple_answer_questions, quiz.multiple_short_answer_questions
-            saq = quiz.short_answer_questions
-            sections = [
-                (len(mcq), HEADINGS["multiple_choice"], "multiple choice questions", mcq),
-                (len(mq), HEADINGS["matching"], "matching questions", mq),
-                (len(maq), HEADINGS["multiple_answers"], "multiple answers questions", maq),
-                (len(msaq), HEADINGS["multiple_short_answers"], "multiple short answer questions", msaq),
-                (len(saq), HEADINGS["short_answer"], "short answer questions", saq)
-            ]
-
-            for count, heading, heading_text, questions in sections:
-                if count > 0:
-                    for q in questions:
-                        question = q.question
-                        choices = format_choices(q.choices) if hasattr(q, 'choices') else ""
-
-                        if isinstance(q, MatchingQuestion):
-                            choices = self.format_matching(q)
-                            text_file.writelines([f"{choices}"])
-                        elif isinstance(q, QUESTION_FORMAT_TUPLE) or isinstance(q, MultipleChoiceQuestion):
-                            question = insert_newlines(q.question)
-                            answer = format_answers(q, FileWriterTypes.Quizlet)
-                            text_file.writelines([f"{question}\n\n{choices}{answer}{QUIZLET_CARDS_DELIMITER}\n"])
-                        else:
-                            logging.error(f"Question type {type(q)} not supported for Quizlet import")
-
-    @staticmethod
-    def format_matching(q: MatchingQuestion):
-        return "\n".join([f"{q.question}\n\n{k}\n\n{format_choices(q.answer_bank)}"
-                          f"{QUIZLET_TERM_DEFINITION_DELIMITER}{v}{QUIZLET_CARDS_DELIMITER}"
-                          for k, v in q.answers.items()])
+        out = FragmentBuffer(text_file)
+        for attribute in self.sections:
+            out.write_questions(getattr(self.quiz, attribute), self.templates)
+        out.flush()
 
 
 class YAMLQuizFileWriter(QuizFileWriter):
-    def write(self, file_path: Path) -> None:
-        with open(file_path, 'w', encoding='utf-8') as yaml_file:
-            yaml.dump(self.quiz.to_dict(), yaml_file, default_flow_style=False, allow_unicode=True)
+    def write_to(self, yaml_file: TextIO) -> None:
+        yaml.dump(self.quiz.to_dict(), yaml_file, default_flow_style=False, allow_unicode=True)
 
 
 class JSONQuizFileWriter(QuizFileWriter):
-    def write(self, file_path: Path) -> None:
-        with open(file_path, 'w', encoding='utf-8') as json_file:
-            json.dump(self.quiz.to_dict(), json_file, ensure_ascii=False, indent=4)
-        pass
+    def write_to(self, json_file: TextIO) -> None:
+        json.dump(self.quiz.to_dict(), json_file, ensure_ascii=False, indent=4)
 
 
 class QuizWriter:
     def __init__(self, quiz: Quiz):
         self.quiz = quiz
 
-    def write(self, file_types: Union[List[str], str], output_file: Path) -> None:
+    def write(self, file_types: Union[List[str], str], output_file: Path, streaming: bool = False) -> Dict[str, bool]:
+        """
+        Writes the quiz in every requested format. Formats are rendered and written concurrently, and files whose
+        contents would not change are left untouched.
+
+        :param file_types: The file type(s) to write, e.g. ``["txt", "json"]``.
+        :param output_file: The output path without an extension.
+        :param streaming: Stream each format to disk instead of rendering it in memory first.
+        :return: A dictionary telling, for each file type, whether its file was (re)written.
+        """
         if isinstance(file_types, str):
             file_types = [file_types]
 
-        file_writers = {
-            "txt": TextQuizFileWriter,
-            "json": JSONQuizFileWriter,
-            "yaml": YAMLQuizFileWriter,
-            "md": MarkdownQuizFileWriter,
-            "qz.txt": QuizletQuizFileWriter
-        }
+        for file_type in file_types:
+            if file_type not in FILE_WRITERS:
+                raise ValueError(f"Unsupported file type: {file_type}")
+
+        def write_file_type(file_type: str) -> bool:
+            writer = FILE_WRITERS[file_type](self.quiz)
+            output_file_with_ext = output_file.with_suffix(f".{file_type}")
+            written = writer.write(output_file_with_ext, streaming)
+            if not written:
+                logging.debug(f"{output_file_with_ext} is unchanged. Skipping write.")
+            return written
+
+        if len(file_types) == 1:
+            return {file_types[0]: write_file_type(file_types[0])}
+
+        with ThreadPoolExecutor(max_workers=len(file_types)) as executor:
+            return dict(zip(file_types, executor.map(write_file_type, file_types)))
+
+    def render(self, file_types: Union[List[str], str]) -> Dict[str, str]:
+        """
+        Renders the quiz in every requested format without touching the filesystem.
 
+        :param file_types: The file type(s) to render, e.g. ``["txt", "json"]``.
+        :return: A dictionary of the rendered contents, keyed by file type.
+        """
+        if isinstance(file_types, str):
+            file_types = [file_types]
+
+        rendered = {}
         for file_type in file_types:
-            writer_class = file_writers.get(file_type)
-            if writer_class:
-                output_file_with_ext = output_file.with_suffix(f".{file_type}")
-                writer = writer_class(self.quiz)
-                writer.write(output_file_with_ext)
-            else:
+            writer_class = FILE_WRITERS.get(file_type)
+            if writer_class is None:
                 raise ValueError(f"Unsupported file type: {file_type}")
+            rendered[file_type] = writer_class(self.quiz).render()
+        return rendered
+
+
+FILE_WRITERS = {
+    "txt": TextQuizFileWriter,
+    "json": JSONQuizFileWriter,
+    "yaml": YAMLQuizFileWriter,
+    "md": MarkdownQuizFileWriter,
+    "qz.txt": QuizletQuizFileWriter
+}
 
 
 def format_choices(choices_list):
-    return "\n".join([f"{i + 1}. {choice}" for i, choice in enumerate(choices_list)])
+    return "\n".join([f"{i}. {choice}" for i, choice in enumerate(choices_list, start=1)])
 
 
 def format_answers(q: Any, writer_type: FileWriterTypes) -> str:
@@ -242,26 +431,6 @@ def format_answers(q: Any, writer_type: FileWriterTypes) -> str:
     :param writer_type: FileWriterTypes
     :return: str
     """
-
-    def format_writer(q_answers: Union[str, List[str], Dict[str, str]]) -> str:
-        newline = "\n"
-        
-        if writer_type == FileWriterTypes.Text:
-            return f"Answer(s): {', '.join(q_answers) if isinstance(q_answers, list) else newline.join([f'{key} : {value}' for key, value in q_answers.items()])}"
-        elif writer_type == FileWriterTypes.Quizlet:
-            return f"{QUIZLET_TERM_DEFINITION_DELIMITER}{', '.join(q_answers) if isinstance(q_answers, list) else newline.join([f'{key} : {value}' for key, value in q_answers.items()])}"
-        elif writer_type == FileWriterTypes.Markdown:
-            return f"#### _Answer(s):_ {''.join([f'{newline}- {item}' for item in q_answers]) if isinstance(q_answers, list) else ''.join([f'{newline}- {key} : {value}' for key, value in q_answers.items()])}"
-
-    if hasattr(q, 'answers') and q.answers or hasattr(q, 'answer') and q.answer:
-
-        if isinstance(q, (MatchingQuestion, MultipleShortAnswerQuestion)):
-            return format_writer(q.answers)
-        elif isinstance(q, MultipleChoiceQuestion):
-            return format_writer([q.answer])
-        elif isinstance(q, MultipleAnswersQuestion):
-            return format_writer(q.answers)
-        elif isinstance(q, ShortAnswerQuestion):
-            return format_writer([q.answer])
-
-    return ""
+    answer_class = _closest(type(q), ANSWER_GETTERS)
+    answers = ANSWER_GETTERS[answer_class](q) if answer_class is not None else None
+    return ANSWER_TEMPLATES[writer_type].render(answers) if answers else ""
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+RUN_JOURNAL_FILE = "run_journal.jsonl"
+# Records are flushed to disk after this many appends or seconds, whichever comes first
+FSYNC_EVERY_RECORDS = 64
+FSYNC_EVERY_SECONDS = 1.0
+
+DISCOVERED = "discovered"
+PARSED = "parsed"
+FAILED = "failed"
+ARCHIVED_STATES = {"moved", "removed", "kept"}
+
+
+def written_state(file_type: str) -> str:
+    return f"written:{file_type}"
+
+
+def file_fingerprint(file_path: Path) -> str:
+    """
+    Identifies a version of an input file without reading it, so an edited file is not mistaken for a finished one.
+    """
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class FileProgress:
+    """
+    What the journal knows about one input file.
+
+    :param fingerprint: The version of the file the states belong to.
+    """
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.states: Set[str] = set()
+        self.title: Optional[str] = None
+
+
+class RunJournal:
+    """
+    An append-only JSON Lines log of how far each input file got, so an interrupted run can be resumed.
+
+    Each line is one state change of one file: ``discovered``, ``parsed``, ``written:<file type>``, then ``moved``,
+    ``removed`` or ``kept``, or ``failed``. Lines are fsynced in batches, so a crash loses at most the last batch,
+    which only means that work is redone. A torn last line is ignored when the journal is read back.
+
+    :param journal_path: The journal file.
+    :param resume: Continue the existing journal. Otherwise a new one is started.
+    """
+
+    def __init__(self, journal_path: Path, resume: bool):
+        self.journal_path = Path(journal_path)
+        self.progress: Dict[str, FileProgress] = self.load() if resume else {}
+        self.file = open(self.journal_path, "a" if resume else "w", encoding="utf-8")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def __enter__(self) -> 'RunJournal':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def load(self) -> Dict[str, FileProgress]:
+        progress = {}
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as journal_file:
+                for line_number, line in enumerate(journal_file, start=1):
+                    try:
+                        self.apply(progress, json.loads(line))
+                    except (ValueError, KeyError):
+                        logging.warning(f"Ignoring unreadable line {line_number} of {self.journal_path}")
+        except FileNotFoundError:
+            pass
+        return progress
+
+    @staticmethod
+    def apply(progress: Dict[str, FileProgress], entry: dict) -> None:
+        if entry["state"] == DISCOVERED:
+            # A new version of the file starts over
+            progress[entry["file"]] = FileProgress(entry["fingerprint"])
+            return
+
+        file_progress = progress.get(entry["file"])
+        if file_progress is None:
+            return
+        file_progress.states.add(entry["state"])
+        if entry["state"] == PARSED:
+            file_progress.title = entry["title"]
+
+    def record(self, file: Path, state: str, **details) -> None:
+        """
+        Appends a state change of a file.
+
+        :param file: The input file.
+        :param state: The state it reached.
+        :param details: Extra fields, e.g. ``fingerprint`` for ``discovered`` and ``title`` for ``parsed``.
+        """
+        entry = {"file": file.name, "state": state, **details}
+        self.apply(self.progress, entry)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        self.unsynced += 1
+        if self.unsynced >= FSYNC_EVERY_RECORDS or time.monotonic() - self.last_sync >= FSYNC_EVERY_SECONDS:
+            self.sync()
+
+    def progress_of(self, file: Path, fingerprint: str) -> Optional[FileProgress]:
+        """
+        Returns the recorded progress of this version of the file, or None if it was never seen.
+        """
+        file_progress = self.progress.get(file.name)
+        return file_progress if file_progress is not None and file_progress.fingerprint == fingerprint else None
+
+    def sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
@@ -0,0 +1,309 @@
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.quiz import Quiz, QUIZ_SECTIONS
+from utils.utils import merge_normalization_stats, normalization_stats, write_if_changed
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+# Stages timed in every process: reading and parsing one input file, and rendering or writing its outputs
+STAGES = ("parse", "write")
+METRIC_PREFIX = "quiz_"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Cumulative counters of this process, shipped to the main process with each result like normalization_stats()
+_stage_latency: Dict[str, 'LatencyHistogram'] = {}
+_questions = Counter()
+
+
+class LatencyHistogram:
+    """
+    A thread-safe, fixed-bucket histogram of request latencies.
+    """
+
+    def __init__(self, bounds_ms: List[float] = None):
+        self.bounds_ms = bounds_ms or LATENCY_BUCKETS_MS
+        self.counts = [0] * len(self.bounds_ms)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, latency_ms: float) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds_ms, latency_ms)] += 1
+            self.total += 1
+            self.sum_ms += latency_ms
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "count": self.total,
+                "sum_ms": round(self.sum_ms, 3),
+                "mean_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+                "buckets": [{"le_ms": "+Inf" if bound == float("inf") else bound, "count": count}
+                            for bound, count in zip(self.bounds_ms, self.counts)],
+            }
+
+
+def merge_histograms(histograms: List[dict]) -> dict:
+    """
+    Adds up ``LatencyHistogram.to_dict()`` reports with the same buckets, e.g. from several processes.
+    """
+    merged = {"count": 0, "sum_ms": 0.0, "buckets": [{"le_ms": "+Inf" if bound == float("inf") else bound,
+                                                       "count": 0} for bound in LATENCY_BUCKETS_MS]}
+    for histogram in histograms:
+        merged["count"] += histogram["count"]
+        merged["sum_ms"] += histogram["sum_ms"]
+        for total, bucket in zip(merged["buckets"], histogram["buckets"]):
+            total["count"] += bucket["count"]
+    merged["mean_ms"] = merged["sum_ms"] / merged["count"] if merged["count"] else 0.0
+    return merged
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Adds the wall time of a block of code to the latency histogram of a stage in this process.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram = _stage_latency.get(stage)
+        if histogram is None:
+            histogram = _stage_latency.setdefault(stage, LatencyHistogram())
+        histogram.observe((time.perf_counter() - start) * 1000)
+
+
+def count_questions(quiz: Quiz) -> None:
+    """
+    Adds the questions of a parsed quiz to this process's per-type counters.
+    """
+    for json_key, attribute, _ in QUIZ_SECTIONS:
+        _questions[question_type_label(json_key)] += len(getattr(quiz, attribute))
+
+
+def question_type_label(json_key: str) -> str:
+    # multiple_choice_questions -> multiple_choice, the names --types accepts
+    return json_key[:-len("_questions")]
+
+
+def worker_metrics() -> dict:
+    """
+    Reports the cumulative metrics of this process: stage latencies, parsed questions by type and normalization cache
+    counters.
+    """
+    return {
+        "stages": {stage: histogram.to_dict() for stage, histogram in list(_stage_latency.items())},
+        "questions": dict(_questions),
+        "normalization": normalization_stats(),
+    }
+
+
+def merge_worker_metrics(reports: List[dict]) -> dict:
+    """
+    Adds up ``worker_metrics()`` reports from several processes.
+    """
+    questions = Counter()
+    for report in reports:
+        questions.update(report["questions"])
+    return {
+        "stages": {stage: merge_histograms([report["stages"][stage] for report in reports
+                                            if stage in report["stages"]]) for stage in STAGES},
+        "questions": questions,
+        "normalization": merge_normalization_stats([report["normalization"] for report in reports]),
+    }
+
+
+def _format_value(value: float) -> str:
+    """
+    Formats a sample value without losing precision, the way Prometheus clients do: integers in full, and floats as
+    their shortest exact representation, e.g. ``1234567`` and ``0.1`` rather than ``1.23457e+06``.
+    """
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _sample(name: str, value: float, labels: Optional[Dict[str, str]] = None) -> str:
+    label_text = ",".join(f'{key}="{label_value}"' for key, label_value in (labels or {}).items())
+    if label_text:
+        return f"{METRIC_PREFIX}{name}{{{label_text}}} {_format_value(value)}"
+    return f"{METRIC_PREFIX}{name} {_format_value(value)}"
+
+
+def _family(lines: List[str], name: str, metric_type: str, description: str) -> None:
+    lines.append(f"# HELP {METRIC_PREFIX}{name} {description}")
+    lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+
+
+class RunMetrics:
+    """
+    The live metrics of a conversion run, in Prometheus text exposition format.
+
+    File counts come from the run report and the queue depth from the main process. Everything measured in the
+    workers arrives as the latest ``worker_metrics()`` report of each process, over the same channel as the results,
+    so collecting them costs the workers one small dictionary per file.
+
+    :param report: The run report of the run.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.workers = 0
+        self.start = time.perf_counter()
+        # Files submitted to the pool that have not finished yet
+        self.queue_depth = 0
+        # Latest cumulative report of each process, keyed by PID
+        self.worker_reports: Dict[int, dict] = {}
+        self.lock = threading.Lock()
+
+    def start_run(self, workers: int) -> None:
+        self.workers = workers
+        self.start = time.perf_counter()
+
+    def record_worker(self, pid: Optional[int], report: Optional[dict]) -> None:
+        if pid is not None and report is not None:
+            with self.lock:
+                self.worker_reports[pid] = report
+
+    def render(self) -> str:
+        with self.lock:
+            reports = dict(self.worker_reports)
+        # The main process parses split pages and, without worker processes, every file
+        reports[os.getpid()] = worker_metrics()
+        merged = merge_worker_metrics(list(reports.values()))
+        elapsed = time.perf_counter() - self.start
+
+        lines = []
+        for name, count, description in (
+                ("files_processed_total", self.report.processed, "Input files processed."),
+                ("files_failed_total", len(self.report.failed), "Input files that failed and were quarantined."),
+                ("files_rejected_total", len(self.report.rejected), "Input files rejected as not quiz pages.")):
+            _family(lines, name, "counter", description)
+            lines.append(_sample(name, count))
+
+        _family(lines, "questions_total", "counter", "Questions parsed, by type.")
+        for json_key, _, _ in QUIZ_SECTIONS:
+            label = question_type_label(json_key)
+            lines.append(_sample("questions_total", merged["questions"].get(label, 0), {"type": label}))
+
+        _family(lines, "stage_duration_seconds", "histogram", "Time spent parsing and writing one file.")
+        for stage, histogram in merged["stages"].items():
+            cumulative = 0
+            for bucket in histogram["buckets"]:
+                cumulative += bucket["count"]
+                bound = "+Inf" if bucket["le_ms"] == "+Inf" else _format_value(bucket["le_ms"] / 1000)
+                lines.append(_sample("stage_duration_seconds_bucket", cumulative, {"stage": stage, "le": bound}))
+            lines.append(_sample("stage_duration_seconds_sum", histogram["sum_ms"] / 1000, {"stage": stage}))
+            lines.append(_sample("stage_duration_seconds_count", histogram["count"], {"stage": stage}))
+
+        busy_seconds = sum(histogram["sum_ms"] for histogram in merged["stages"].values()) / 1000
+        for name, metric_type, value, description in (
+                ("queue_depth", "gauge", self.queue_depth, "Files submitted to the workers that have not finished."),
+                ("workers", "gauge", self.workers, "Worker processes in the pool."),
+                ("worker_utilization", "gauge",
+                 busy_seconds / (elapsed * self.workers) if elapsed and self.workers else 0,
+                 "Share of the pool's time spent parsing and writing since the run started."),
+                ("elapsed_seconds", "gauge", elapsed, "Seconds since the run started.")):
+            _family(lines, name, metric_type, description)
+            lines.append(_sample(name, value))
+
+        for name, key, metric_type, description in (
+                ("normalization_cache_hits_total", "hits", "counter", "Text normalization cache hits."),
+                ("normalization_cache_misses_total", "misses", "counter", "Text normalization cache misses."),
+                ("normalization_cache_hit_ratio", "hit_rate", "gauge", "Text normalization cache hit rate.")):
+            _family(lines, name, metric_type, description)
+            for cache, stats in sorted(merged["normalization"].items()):
+                lines.append(_sample(name, stats[key], {"cache": cache}))
+        return "\n".join(lines) + "\n"
+
+
+def make_metrics_handler(render: Callable[[], str]):
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            body = render().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+    return MetricsRequestHandler
+
+
+class MetricsExporter:
+    """
+    Publishes run metrics while a run is in progress: rewrites a text file every ``interval`` seconds, for the node
+    exporter's textfile collector, and/or serves them on ``http://127.0.0.1:<port>/metrics``. The file is written once
+    more when the exporter is closed, so it ends with the final counts.
+
+    :param render: Returns the metrics in Prometheus text exposition format.
+    :param metrics_file: The file to rewrite, or None.
+    :param interval: Seconds between rewrites of the file.
+    :param port: The localhost port to serve the metrics on, or None. 0 picks a free port.
+    """
+
+    def __init__(self, render: Callable[[], str], metrics_file: Optional[Path] = None, interval: float = 10,
+                 port: Optional[int] = None):
+        self.render = render
+        self.metrics_file = Path(metrics_file) if metrics_file else None
+        self.interval = interval
+        self.port = port
+        self.stopped = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def __enter__(self) -> 'MetricsExporter':
+        if self.metrics_file is not None:
+            self.metrics_file.parent.mkdir(parents=True, exist_ok=True)
+            self.threads.append(threading.Thread(target=self.write_periodically, name="metrics-file", daemon=True))
+        if self.port is not None:
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), make_metrics_handler(self.render))
+            self.server.daemon_threads = True
+            self.threads.append(threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True))
+            print(f"Serving run metrics on http://127.0.0.1:{self.server.server_address[1]}/metrics")
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if self.metrics_file is not None:
+            self.write()
+
+    def write(self) -> None:
+        try:
+            write_if_changed(self.metrics_file, self.render())
+        except Exception as ex:
+            # Metrics must never stop a run
+            logging.exception(ex)
+
+    def write_periodically(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
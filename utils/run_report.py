@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.memory_profile import log_memory_profile, merge_memory_profiles
+
+
+class FailedFile:
+    """
+    An input file that could not be processed.
+
+    :param source: The input file.
+    :param error: A one-line description of what went wrong.
+    :param set_aside_as: Where the file was moved or copied to (quarantined or rejected), if anywhere.
+    """
+
+    def __init__(self, source: Path, error: str, set_aside_as: Optional[Path] = None):
+        self.source = source
+        self.error = error
+        self.set_aside_as = set_aside_as
+
+    def __repr__(self):
+        return f"{self.source}: {self.error}"
+
+
+class RunReport:
+    """
+    Collects the per-file outcome of a run so it can be summarized at the end.
+    """
+
+    def __init__(self):
+        self.processed: int = 0
+        self.failed: List[FailedFile] = []
+        # Files set aside by the pre-filter because they do not look like quiz pages
+        self.rejected: List[FailedFile] = []
+        # Latest cumulative memory profile reported by each process, keyed by PID. Empty unless --profile_memory.
+        self.memory_profiles: Dict[int, dict] = {}
+
+    def record_success(self) -> None:
+        self.processed += 1
+
+    def retract_success(self) -> None:
+        """
+        Takes back a success recorded for a file that then failed in a later step, before calling ``record_failure``.
+        """
+        self.processed -= 1
+
+    def record_failure(self, failed_file: FailedFile) -> None:
+        self.failed.append(failed_file)
+
+    def record_rejection(self, rejected_file: FailedFile) -> None:
+        self.rejected.append(rejected_file)
+
+    def record_memory_profile(self, pid: int, profile: Optional[dict]) -> None:
+        if profile is not None:
+            self.memory_profiles[pid] = profile
+
+    def summary(self) -> str:
+        rejected = f", {len(self.rejected)} rejected" if self.rejected else ""
+        lines = [f"Run summary: {self.processed} file(s) processed, {len(self.failed)} failed{rejected}"]
+        for failed_file in self.failed:
+            destination = f" -> {failed_file.set_aside_as}" if failed_file.set_aside_as else ""
+            lines.append(f"  FAILED {failed_file.source}{destination}: {failed_file.error}")
+        for rejected_file in self.rejected:
+            destination = f" -> {rejected_file.set_aside_as}" if rejected_file.set_aside_as else ""
+            lines.append(f"  REJECTED {rejected_file.source}{destination}: {rejected_file.error}")
+        if self.memory_profiles:
+            lines.extend(self.memory_summary())
+        return "\n".join(lines)
+
+    def memory_summary(self) -> List[str]:
+        lines = ["Memory profile:"]
+        for pid, profile in sorted(self.memory_profiles.items()):
+            rss = f"{profile['peak_rss_mb']:.1f} MB" if profile["peak_rss_mb"] is not None else "n/a"
+            lines.append(f"  Process {pid}: peak RSS {rss}")
+
+        stages = merge_memory_profiles(list(self.memory_profiles.values()))
+        log_memory_profile(stages)
+        for name, stage in sorted(stages.items()):
+            lines.append(f"  {name}: {stage['calls']} call(s), peak {stage['peak_bytes'] / 1e6:.2f} MB traced, "
+                         f"{stage['retained_bytes'] / 1e6:+.2f} MB retained")
+            for site, size in list(stage["top_sites"].items())[:3]:
+                lines.append(f"    {size / 1e6:8.2f} MB  {site}")
+        return lines
@@ -0,0 +1,212 @@
+import csv
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from utils.score_store import ATTEMPT_COLUMNS, column_path, load_keys, QUESTION_KEYS_FILE, QUIZ_KEYS_FILE, ROW_COLUMNS
+
+SCORE_REPORT_FILE = "score_report"
+REPORT_FORMATS = ["json", "csv"]
+# Quantiles reported for the score distribution of each quiz
+QUANTILES = {"min": 0.0, "p25": 0.25, "median": 0.5, "p75": 0.75, "max": 1.0}
+# Attempt scores are also counted in this many equal-width percentage bins, the last one including 100%
+HISTOGRAM_BINS = 10
+
+QUESTION_FIELDS = ["question_id", "type", "question", "attempts", "missed", "miss_rate", "mean_earned",
+                   "mean_possible", "difficulty"]
+QUIZ_FIELDS = ["quiz_id", "title", "attempts", "mean", "std"] + list(QUANTILES) + ["histogram"]
+
+
+def import_numpy():
+    """
+    NumPy is only needed by the analytics command, so it is not a requirement of the rest of the tool.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise SystemExit("The analytics command needs NumPy. Install it with: pip install numpy")
+    return numpy
+
+
+def load_columns(np, store_dir: Path) -> Dict[str, "np.ndarray"]:
+    """
+    Maps the column files of a ScoreStore, trimming columns an interrupted run left uneven.
+    """
+    columns = {}
+    for names in (ROW_COLUMNS, ATTEMPT_COLUMNS):
+        for name, typecode in names.items():
+            path = column_path(store_dir, name)
+            columns[name] = np.fromfile(path, dtype=typecode) if path.exists() else np.zeros(0, dtype=typecode)
+
+    rows = min(len(columns[name]) for name in ROW_COLUMNS)
+    for name in ROW_COLUMNS:
+        columns[name] = columns[name][:rows]
+
+    # Rows of an attempt whose quiz was never written cannot be grouped by quiz
+    complete = columns["attempt"] < len(columns["attempt_quiz"])
+    for name in ROW_COLUMNS:
+        columns[name] = columns[name][complete]
+    return columns
+
+
+def _ratio(np, numerator, denominator):
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+
+def question_statistics(np, columns: Dict, question_count: int) -> Dict[str, "np.ndarray"]:
+    """
+    Per-question totals over every attempt: a question is missed when it earned less than its possible points, and its
+    difficulty is the share of possible points not earned.
+    """
+    question = columns["question"]
+    earned = columns["earned"].astype(np.float64)
+    possible = columns["possible"].astype(np.float64)
+
+    attempts = np.bincount(question, minlength=question_count)
+    missed = np.bincount(question, weights=earned < possible, minlength=question_count)
+    earned_sum = np.bincount(question, weights=earned, minlength=question_count)
+    possible_sum = np.bincount(question, weights=possible, minlength=question_count)
+    return {
+        "attempts": attempts,
+        "missed": missed.astype(np.int64),
+        "miss_rate": _ratio(np, missed, attempts),
+        "mean_earned": _ratio(np, earned_sum, attempts),
+        "mean_possible": _ratio(np, possible_sum, attempts),
+        "difficulty": 1 - _ratio(np, earned_sum, possible_sum),
+    }
+
+
+def quiz_statistics(np, columns: Dict, quiz_count: int) -> Dict[str, "np.ndarray"]:
+    """
+    The distribution of attempt scores, as a percentage of the possible points, for each quiz.
+    """
+    attempt_quiz = columns["attempt_quiz"]
+    attempt_count = len(attempt_quiz)
+    earned = np.bincount(columns["attempt"], weights=columns["earned"], minlength=attempt_count)
+    possible = np.bincount(columns["attempt"], weights=columns["possible"], minlength=attempt_count)
+
+    scored = possible > 0
+    quiz = attempt_quiz[scored].astype(np.int64)
+    score = 100 * earned[scored] / possible[scored]
+
+    counts = np.bincount(quiz, minlength=quiz_count)
+    sums = np.bincount(quiz, weights=score, minlength=quiz_count)
+    squares = np.bincount(quiz, weights=score * score, minlength=quiz_count)
+    mean = _ratio(np, sums, counts)
+    statistics = {
+        "attempts": counts,
+        "mean": mean,
+        "std": np.sqrt(np.maximum(_ratio(np, squares, counts) - mean * mean, 0)),
+    }
+
+    # Sorting by quiz, then score, puts each quiz's scores in one ascending run starting at its offset,
+    # so every quantile of every quiz is a single interpolated lookup. The trailing NaN keeps the offset of a quiz
+    # without attempts, the end of the run, a valid index.
+    ordered = np.append(score[np.lexsort((score, quiz))], np.nan)
+    starts = np.cumsum(counts) - counts
+    for name, quantile in QUANTILES.items():
+        position = quantile * np.maximum(counts - 1, 0)
+        lower = np.floor(position).astype(np.int64)
+        low = ordered[starts + lower]
+        high = ordered[starts + np.ceil(position).astype(np.int64)]
+        statistics[name] = np.where(counts > 0, low + (high - low) * (position - lower), np.nan)
+
+    bins = np.minimum((score * HISTOGRAM_BINS / 100).astype(np.int64), HISTOGRAM_BINS - 1)
+    statistics["histogram"] = np.bincount(quiz * HISTOGRAM_BINS + bins,
+                                          minlength=quiz_count * HISTOGRAM_BINS).reshape(quiz_count, HISTOGRAM_BINS)
+    return statistics
+
+
+def _records(statistics: Dict[str, "np.ndarray"], indices) -> List[dict]:
+    columns = {name: values[indices].tolist() for name, values in statistics.items()}
+    records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    # NaN marks "no data", which JSON has no literal for
+    for record in records:
+        for name, value in record.items():
+            if isinstance(value, float):
+                record[name] = None if value != value else round(value, 4)
+    return records
+
+
+def analyze_scores(store_dir: Path, top: int = 20) -> dict:
+    """
+    Computes the score analytics of every question attempt recorded in a ScoreStore.
+
+    :param store_dir: The ScoreStore directory.
+    :param top: How many of the most missed questions to list.
+    :return: The report: row counts, per-question statistics, per-quiz score distributions and the most missed
+        questions.
+    """
+    np = import_numpy()
+    questions = load_keys(Path(store_dir) / QUESTION_KEYS_FILE)
+    quizzes = load_keys(Path(store_dir) / QUIZ_KEYS_FILE)
+    columns = load_columns(np, store_dir)
+
+    per_question = question_statistics(np, columns, len(questions))
+    per_quiz = quiz_statistics(np, columns, len(quizzes))
+
+    seen = np.flatnonzero(per_question["attempts"] > 0)
+    # Most missed first, then the highest miss rate, then the question that was seen first
+    most_missed = seen[np.lexsort((seen, -per_question["miss_rate"][seen], -per_question["missed"][seen]))]
+
+    question_records = [{"question_id": question_id, "type": questions[question_id]["type"],
+                         "question": questions[question_id]["question"], **record}
+                        for question_id, record in zip(most_missed.tolist(), _records(per_question, most_missed))]
+
+    attempted_quizzes = np.flatnonzero(per_quiz["attempts"] > 0)
+    quiz_records = [{"quiz_id": quiz_id, "title": quizzes[quiz_id]["title"], **record}
+                    for quiz_id, record in zip(attempted_quizzes.tolist(), _records(per_quiz, attempted_quizzes))]
+
+    return {
+        "rows": int(len(columns["question"])),
+        "attempts": int(per_quiz["attempts"].sum()),
+        "questions": question_records,
+        "quizzes": quiz_records,
+        "most_missed": [record for record in question_records[:top] if record["missed"]],
+    }
+
+
+def write_score_report(report: dict, output_file: Path, report_format: str) -> List[Path]:
+    """
+    Writes the report as ``<output_file>.json``, or as ``<output_file>_questions.csv`` and
+    ``<output_file>_quizzes.csv``.
+
+    :return: The files written.
+    """
+    if report_format == "json":
+        path = output_file.with_name(output_file.name + ".json")
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=4, ensure_ascii=False)
+        return [path]
+
+    written = []
+    for table, fields in (("questions", QUESTION_FIELDS), ("quizzes", QUIZ_FIELDS)):
+        path = output_file.with_name(f"{output_file.name}_{table}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=fields)
+            writer.writeheader()
+            for record in report[table]:
+                row = dict(record)
+                if "histogram" in row:
+                    row["histogram"] = " ".join(str(count) for count in row["histogram"])
+                writer.writerow(row)
+        written.append(path)
+    return written
+
+
+def format_score_report(report: dict) -> List[str]:
+    lines = [f"{report['rows']} question attempt(s) in {report['attempts']} quiz attempt(s), "
+             f"{len(report['questions'])} question(s), {len(report['quizzes'])} quiz(zes)"]
+
+    if report["quizzes"]:
+        lines.append("Score distribution per quiz (% of possible points):")
+        for quiz in report["quizzes"]:
+            lines.append(f"  {quiz['title']}: {quiz['attempts']} attempt(s), mean {quiz['mean']:.1f}, "
+                         f"min {quiz['min']:.1f}, median {quiz['median']:.1f}, max {quiz['max']:.1f}")
+
+    if report["most_missed"]:
+        lines.append("Most missed questions:")
+        for rank, question in enumerate(report["most_missed"], start=1):
+            lines.append(f"  {rank}. missed {question['missed']}/{question['attempts']} "
+                         f"(difficulty {question['difficulty']:.2f}) [{question['type']}] {question['question']}")
+    return lines
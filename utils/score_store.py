@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List
+
+from utils.quiz import Quiz, QUIZ_SECTIONS
+
+SCORE_STORE_DIR = "scores"
+
+# One file per column, each a flat run of native fixed-width values that NumPy maps with np.fromfile(dtype=typecode).
+# Row i of every row column is one question attempt; row i of the attempt column is the quiz of attempt i.
+ROW_COLUMNS = {"question": "I", "attempt": "I", "earned": "f", "possible": "f"}
+ATTEMPT_COLUMNS = {"attempt_quiz": "I"}
+QUESTION_KEYS_FILE = "questions.jsonl"
+QUIZ_KEYS_FILE = "quizzes.jsonl"
+# Buffered rows are appended to the column files once there are this many
+FLUSH_EVERY_ROWS = 65536
+
+
+def column_path(store_dir: Path, name: str) -> Path:
+    return Path(store_dir) / f"{name}.bin"
+
+
+def load_keys(path: Path) -> List[dict]:
+    """
+    Reads a key table, where the id of each entry is its line number, starting at 0.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as keys_file:
+            return [json.loads(line) for line in keys_file]
+    except FileNotFoundError:
+        return []
+
+
+class ScoreStore:
+    """
+    Append-only, column-oriented storage of the points earned in every question attempt, for the analytics command.
+
+    Questions and quizzes are replaced by small integer ids, kept in JSON Lines key tables, so a question attempt is
+    16 bytes on disk however long the question is. Rows are buffered in ``array`` columns and appended to the column
+    files in batches and when the store is closed. When the store is opened, columns cut short by an interrupted run
+    are trimmed to their common length, and rows of an attempt whose quiz was never written are dropped, so new rows
+    line up and the attempt id is not reused.
+
+    :param store_dir: The directory holding the column files and key tables. Created if it does not exist.
+    """
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        self.question_ids: Dict[str, int] = {entry["key"]: number for number, entry
+                                             in enumerate(load_keys(self.store_dir / QUESTION_KEYS_FILE))}
+        self.quiz_ids: Dict[str, int] = {entry["title"]: number for number, entry
+                                         in enumerate(load_keys(self.store_dir / QUIZ_KEYS_FILE))}
+        self.attempt_count = self.column_length("attempt_quiz", ATTEMPT_COLUMNS["attempt_quiz"])
+        self.recover()
+
+        self.rows = {name: array(typecode) for name, typecode in ROW_COLUMNS.items()}
+        self.attempts = {name: array(typecode) for name, typecode in ATTEMPT_COLUMNS.items()}
+        self.new_questions: List[dict] = []
+        self.new_quizzes: List[dict] = []
+
+    def __enter__(self) -> 'ScoreStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def column_length(self, name: str, typecode: str) -> int:
+        path = column_path(self.store_dir, name)
+        return path.stat().st_size // array(typecode).itemsize if path.exists() else 0
+
+    def recover(self) -> None:
+        """
+        Cuts the column files back to the last complete row of a complete attempt. Rows are appended in attempt order,
+        so the rows to drop are always at the end.
+        """
+        rows = min(self.column_length(name, typecode) for name, typecode in ROW_COLUMNS.items())
+        attempt_path = column_path(self.store_dir, "attempt")
+        if rows and attempt_path.exists():
+            attempts = array(ROW_COLUMNS["attempt"])
+            with open(attempt_path, "rb") as attempt_file:
+                attempts.fromfile(attempt_file, rows)
+            rows = bisect_left(attempts, self.attempt_count)
+
+        lengths = {name: rows for name in ROW_COLUMNS}
+        lengths["attempt_quiz"] = self.attempt_count
+        for name, length in lengths.items():
+            path = column_path(self.store_dir, name)
+            size = length * array(ROW_COLUMNS.get(name) or ATTEMPT_COLUMNS[name]).itemsize
+            if path.exists() and path.stat().st_size != size:
+                logging.warning(f"Trimming {path} to {length} complete row(s) left by an interrupted run")
+                os.truncate(path, size)
+
+    def record_quiz(self, quiz: Quiz) -> int:
+        """
+        Records the points of every question of one attempt that has them.
+
+        :param quiz: A parsed quiz.
+        :return: The number of question attempts recorded.
+        """
+        attempt = self.attempt_count + len(self.attempts["attempt_quiz"])
+        recorded = 0
+        for json_key, attribute, _ in QUIZ_SECTIONS:
+            for question in getattr(quiz, attribute):
+                if question.points is None:
+                    continue
+                earned, possible = question.points
+                self.rows["question"].append(self._question_id(json_key, question))
+                self.rows["attempt"].append(attempt)
+                self.rows["earned"].append(earned)
+                self.rows["possible"].append(possible)
+                recorded += 1
+
+        if recorded:
+            self.attempts["attempt_quiz"].append(self._quiz_id(quiz.title))
+        if len(self.rows["question"]) >= FLUSH_EVERY_ROWS:
+            self.flush()
+        return recorded
+
+    def _question_id(self, question_type: str, question) -> int:
+        key = question.answer_key()
+        question_id = self.question_ids.get(key)
+        if question_id is None:
+            question_id = self.question_ids[key] = len(self.question_ids)
+            self.new_questions.append({"key": key, "type": question_type, "question": question.question})
+        return question_id
+
+    def _quiz_id(self, title: str) -> int:
+        quiz_id = self.quiz_ids.get(title)
+        if quiz_id is None:
+            quiz_id = self.quiz_ids[title] = len(self.quiz_ids)
+            self.new_quizzes.append({"title": title})
+        return quiz_id
+
+    def flush(self) -> None:
+        # Key tables first, so every id a row refers to is on disk before the row is
+        for file_name, entries in ((QUESTION_KEYS_FILE, self.new_questions), (QUIZ_KEYS_FILE, self.new_quizzes)):
+            if entries:
+                with open(self.store_dir / file_name, "a", encoding="utf-8") as keys_file:
+                    keys_file.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+                entries.clear()
+
+        for columns in (self.rows, self.attempts):
+            for name, values in columns.items():
+                with open(column_path(self.store_dir, name), "ab") as column_file:
+                    values.tofile(column_file)
+
+        self.attempt_count += len(self.attempts["attempt_quiz"])
+        logging.info(f"Appended {len(self.rows['question'])} question attempt(s) to {self.store_dir}")
+        for columns in (self.rows, self.attempts):
+            for name, values in list(columns.items()):
+                columns[name] = array(values.typecode)
+
+    def close(self) -> None:
+        self.flush()
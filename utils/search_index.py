@@ -0,0 +1,253 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.questions import MatchingQuestion, Question
+from utils.quiz import LazyQuiz, Quiz, QUIZ_SECTIONS
+
+SEARCH_INDEX_FILE = "search_index.sqlite3"
+
+# BM25 tuning constants
+K1 = 1.2
+B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    body TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_documents (
+    path TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    PRIMARY KEY (path, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_source_documents_doc ON source_documents (doc_id);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def format_answer(question: Question) -> str:
+    """
+    Flattens the answer(s) of any question type into a single line of text.
+    """
+    if isinstance(question, MatchingQuestion):
+        return "; ".join(f"{key} : {value}" for key, value in (question.answers or {}).items())
+    if hasattr(question, "answers"):
+        return ", ".join(question.answers or [])
+    return question.answer or ""
+
+
+class SearchResult:
+    """
+    A single ranked hit returned by ``SearchIndex.search``.
+    """
+
+    def __init__(self, score: float, title: str, question_type: str, question: str, answer: str):
+        self.score = score
+        self.title = title
+        self.question_type = question_type
+        self.question = question
+        self.answer = answer
+
+    def __repr__(self):
+        return f"\n[{self.score:.3f}] {self.title} ({self.question_type})\nQuestion = {self.question}" \
+               f"\nAnswer = {self.answer}\n"
+
+
+class SearchIndex:
+    """
+    A persistent inverted index over question text, choices and answers.
+
+    Each question of each quiz is one document. Documents are updated in place, so re-indexing a quiz only touches
+    its own postings, and JSON files that were already indexed are skipped unless they changed. The documents of a
+    changed JSON file replace the ones indexed from it before, so e.g. a question whose answer was resolved since is
+    not found under its old answer too.
+
+    :param db_path: The path of the SQLite database file. Created if it does not exist.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'SearchIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def add_quiz(self, quiz: Quiz, source: Optional[str] = None) -> int:
+        """
+        Adds or refreshes every question of the quiz in the index.
+
+        :param quiz: The quiz to index.
+        :param source: The file the quiz was read from. The documents indexed from it before are removed first.
+        :return: The number of questions indexed.
+        """
+        indexed = 0
+        with self.connection:
+            if source is not None:
+                self._remove_source(source)
+            for json_key, attribute, _ in QUIZ_SECTIONS:
+                for question in getattr(quiz, attribute):
+                    doc_id = self._add_question(quiz.title, json_key, question)
+                    if source is not None:
+                        self.connection.execute(
+                            "INSERT OR IGNORE INTO source_documents (path, doc_id) VALUES (?, ?)", (source, doc_id))
+                    indexed += 1
+        return indexed
+
+    def _remove_source(self, source: str) -> None:
+        """
+        Removes the documents indexed from a file, except those another file still holds.
+        """
+        doc_ids = [doc_id for doc_id, in self.connection.execute(
+            "SELECT doc_id FROM source_documents WHERE path = ?", (source,))]
+        self.connection.execute("DELETE FROM source_documents WHERE path = ?", (source,))
+        for doc_id in doc_ids:
+            if self.connection.execute("SELECT 1 FROM source_documents WHERE doc_id = ?", (doc_id,)).fetchone():
+                continue
+            self.connection.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            self.connection.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def _add_question(self, title: str, question_type: str, question: Question) -> int:
+        doc_key = hashlib.sha1(f"{title}\0{question.stable_hash()}".encode("utf-8")).hexdigest()
+        answer = format_answer(question)
+        choices = getattr(question, "choices", None) or []
+        if isinstance(question, MatchingQuestion):
+            choices = (question.word_bank or []) + (question.answer_bank or [])
+
+        tokens = tokenize(" ".join([question.question, *choices, answer]))
+
+        row = self.connection.execute("SELECT id FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+        if row:
+            self.connection.execute("DELETE FROM postings WHERE doc_id = ?", row)
+            self.connection.execute("DELETE FROM documents WHERE id = ?", row)
+
+        cursor = self.connection.execute(
+            "INSERT INTO documents (doc_key, title, question_type, question, answer, body, length) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc_key, title, question_type, question.question, answer, " ".join(tokens), len(tokens)))
+        doc_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+            [(term, doc_id, tf) for term, tf in Counter(tokens).items()])
+        if row:
+            # Other files that hold the same question keep it
+            self.connection.execute("UPDATE source_documents SET doc_id = ? WHERE doc_id = ?", (doc_id, row[0]))
+        return doc_id
+
+    def add_json_files(self, json_dir: Path) -> Tuple[int, int]:
+        """
+        Indexes the quiz JSON exports in a directory, skipping files that have not changed since they were indexed.
+
+        :param json_dir: The directory containing the ``.json`` exports.
+        :return: A tuple of (files indexed, files skipped).
+        """
+        indexed, skipped = 0, 0
+        for json_file in sorted(Path(json_dir).glob("*.json")):
+            mtime_ns = os.stat(json_file).st_mtime_ns
+            row = self.connection.execute("SELECT mtime_ns FROM sources WHERE path = ?",
+                                          (str(json_file),)).fetchone()
+            if row and row[0] == mtime_ns:
+                skipped += 1
+                continue
+
+            with open(json_file, "r", encoding="utf-8") as file:
+                json_data = json.load(file)
+            # The output directory also holds other JSON files, e.g. the score report
+            if not isinstance(json_data, dict) or "number_of_questions" not in json_data:
+                skipped += 1
+                continue
+            self.add_quiz(LazyQuiz(json_data), source=str(json_file))
+
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO sources (path, mtime_ns) VALUES (?, ?)",
+                                        (str(json_file), mtime_ns))
+            indexed += 1
+        return indexed, skipped
+
+    def search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        """
+        Ranks questions against a query with BM25. Quoted parts of the query are phrases that must appear verbatim
+        (ignoring case and punctuation); every other word is an optional keyword that only affects the ranking.
+
+        :param query: The query, e.g. ``"binary search" complexity``.
+        :param limit: The maximum number of results.
+        :return: The best matching questions, best first.
+        """
+        phrases, terms = [], []
+        for phrase, word in QUERY_PATTERN.findall(query):
+            if phrase:
+                phrase_tokens = tokenize(phrase)
+                phrases.append(" ".join(phrase_tokens))
+                terms.extend(phrase_tokens)
+            else:
+                terms.extend(tokenize(word))
+
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+
+        doc_count, average_length = self.connection.execute(
+            "SELECT COUNT(*), AVG(length) FROM documents").fetchone()
+        if not doc_count:
+            return []
+
+        placeholders = ", ".join("?" * len(terms))
+        postings = self.connection.execute(
+            f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN documents d ON d.id = p.doc_id "
+            f"WHERE p.term IN ({placeholders})", terms).fetchall()
+
+        document_frequency = Counter(term for term, _, _, _ in postings)
+        scores: Dict[int, float] = defaultdict(float)
+        for term, doc_id, tf, length in postings:
+            df = document_frequency[term]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            scores[doc_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+        results = []
+        for doc_id, score in ranked:
+            title, question_type, question, answer, body = self.connection.execute(
+                "SELECT title, question_type, question, answer, body FROM documents WHERE id = ?",
+                (doc_id,)).fetchone()
+            padded_body = f" {body} "
+            if all(f" {phrase} " in padded_body for phrase in phrases):
+                results.append(SearchResult(score, title, question_type, question, answer))
+                if len(results) >= limit:
+                    break
+        return results
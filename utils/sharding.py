@@ -0,0 +1,140 @@
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from utils.quiz import Quiz, QUIZ_SECTIONS
+
+SHARD_DIR = "combined_quiz_shards"
+SHARD_INDEX_FILE = "index.json"
+SHARD_PREFIX = "shard_"
+# Shard files are named after the hash of their first question, cut to this many characters
+SHARD_KEY_LENGTH = 12
+# A shard is not cut by a question's hash before it is filled to this fraction of a limit
+MIN_FILL = 0.25
+# Natural cuts are placed so that shards average about this fraction of a limit
+MEAN_FILL = 0.5
+
+
+def question_bytes(question) -> int:
+    """
+    The approximate output size of a question, measured on its JSON. The same for every file type, so all of them
+    share the same shard boundaries.
+    """
+    return len(json.dumps(question.to_dict(), ensure_ascii=False).encode("utf-8"))
+
+
+def _hash_fraction(stable_hash: str) -> float:
+    return int(stable_hash[:13], 16) / 16 ** 13
+
+
+class Shard:
+    """
+    One part of a sharded quiz.
+
+    :param key: Identifies the shard across runs. It is derived from its first question, so it only changes if the
+        shard starts with a different question.
+    :param title: The title of the quiz being sharded.
+    """
+
+    def __init__(self, key: str, title: str):
+        self.key = key
+        self.quiz = Quiz(title=title)
+        # The approximate output size, as measured by question_bytes
+        self.size_bytes = 0
+        self.first_question: Optional[str] = None
+        self.last_question: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{SHARD_PREFIX}{self.key}"
+
+    def add(self, attribute: str, question, size_bytes: int) -> None:
+        getattr(self.quiz, attribute).append(question)
+        self.quiz.number_of_questions += 1
+        self.size_bytes += size_bytes
+        if self.first_question is None:
+            self.first_question = question.question
+        self.last_question = question.question
+
+    def is_full(self, max_questions: Optional[int], max_bytes: Optional[int], next_bytes: int) -> bool:
+        return bool((max_questions and self.quiz.number_of_questions >= max_questions)
+                    or (max_bytes and self.size_bytes + next_bytes > max_bytes))
+
+    def is_filled_to(self, fraction: float, max_questions: Optional[int], max_bytes: Optional[int]) -> bool:
+        return bool((max_questions and self.quiz.number_of_questions >= max_questions * fraction)
+                    or (max_bytes and self.size_bytes >= max_bytes * fraction))
+
+
+def shard_quiz(quiz: Quiz, max_questions: Optional[int] = None, max_bytes: Optional[int] = None) -> List[Shard]:
+    """
+    Splits a quiz into shards of at most ``max_questions`` questions and about ``max_bytes`` bytes each.
+
+    Questions are put in a stable order (by section, then question text), and a shard ends after a question whose own
+    hash says so, like content-defined chunking, or where the next question would break a limit. Whether a question
+    ends a shard does not depend on the other questions, so adding or removing a few questions moves the boundaries of
+    the shards they fall into and leaves the other shards exactly as they were.
+
+    :param quiz: The quiz to split.
+    :param max_questions: The most questions in a shard. None for no limit.
+    :param max_bytes: The approximate largest output size of a shard. A single larger question gets a shard of its
+        own. None for no limit.
+    :return: The shards, in order.
+    """
+    ordered = []
+    for section, (_, attribute, _) in enumerate(QUIZ_SECTIONS):
+        for question in getattr(quiz, attribute):
+            stable_hash = question.stable_hash()
+            ordered.append(((section, question.question, stable_hash), attribute, question))
+    ordered.sort(key=lambda entry: entry[0])
+
+    shards: List[Shard] = []
+    shard = None
+    for (_, _, stable_hash), attribute, question in ordered:
+        size_bytes = question_bytes(question)
+        if shard is not None and shard.is_full(max_questions, max_bytes, size_bytes):
+            shard = None
+        if shard is None:
+            shard = Shard(stable_hash[:SHARD_KEY_LENGTH], quiz.title)
+            shards.append(shard)
+        shard.add(attribute, question, size_bytes)
+
+        # The cut chance grows with the question's share of a limit, so shards average MEAN_FILL of it
+        cut_chance = max(1 / (max_questions * MEAN_FILL) if max_questions else 0,
+                         size_bytes / (max_bytes * MEAN_FILL) if max_bytes else 0)
+        if shard.is_filled_to(MIN_FILL, max_questions, max_bytes) and _hash_fraction(stable_hash) < cut_chance:
+            shard = None
+    return shards
+
+
+def shard_index(quiz: Quiz, shards: List[Shard], file_types: List[str]) -> dict:
+    """
+    The index listing every shard in order, with its files and the range of questions it holds.
+    """
+    return {
+        "title": quiz.title,
+        "questions": quiz.number_of_questions,
+        "shards": [{
+            "name": shard.name,
+            "files": [f"{shard.name}.{file_type}" for file_type in file_types],
+            "questions": shard.quiz.number_of_questions,
+            "approximate_bytes": shard.size_bytes,
+            "first_question": shard.first_question,
+            "last_question": shard.last_question,
+        } for shard in shards],
+    }
+
+
+def remove_stale_shards(shard_dir: Path, shards: List[Shard], file_types: List[str]) -> int:
+    """
+    Deletes the shard files of the given file types that are not part of the current shards.
+
+    :return: The number of files deleted.
+    """
+    current = {shard.name for shard in shards}
+    removed = 0
+    for path in Path(shard_dir).glob(f"{SHARD_PREFIX}*"):
+        name, _, file_type = path.name.partition(".")
+        if file_type in file_types and name not in current:
+            path.unlink()
+            removed += 1
+    return removed
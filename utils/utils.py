@@ -1,11 +1,26 @@
+import hashlib
+import os
 import re
+import sys
 import uuid
+from functools import lru_cache
 from html import unescape
-from typing import List, Optional
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
 
 from bs4 import BeautifulSoup, Tag
 
-from utils.constants import NO_ANSWER
+from utils.constants import NO_ANSWER, NORMALIZATION_CACHE_SIZE
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# A whitespace-delimited token, followed by the token after it (empty at the end of the text)
+SENTENCE_TOKEN_PATTERN = re.compile(r'(\S+)\s*(?=(\S*))')
+SENTENCE_ENDINGS = ('.', '!', '?')
+ABBREVIATIONS = ('i.e.', 'e.g.')
 
 
 # NO_ANSWER = "CANNOT DETERMINE ANSWER. PLEASE CHECK MANUALLY."
@@ -28,17 +43,14 @@ def clean_input(input_obj):
     :return: The cleaned input object.
     """
 
-    def clean_str(s: str) -> str:
-        return ' '.join(s.strip().split())
-
     def clean_dict(d: dict) -> dict:
         return {k.strip(): v.strip() for k, v in d.items() if v.strip()}
 
     def clean_list(l: list) -> list:
-        return remove_duplicates([clean_str(item) for item in l if item.strip()])
+        return list(_clean_tuple(tuple(l)))
 
     cleaning_functions = {
-        str: clean_str,
+        str: _clean_str,
         dict: clean_dict,
         list: clean_list,
     }
@@ -47,6 +59,57 @@ def clean_input(input_obj):
     return cleaning_function(input_obj) if cleaning_function else input_obj
 
 
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def _clean_str(s: str) -> str:
+    return ' '.join(s.split())
+
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def _clean_tuple(items: Tuple[str, ...]) -> Tuple[str, ...]:
+    # Memoized as a tuple so the cached value can't be mutated by callers; clean_input hands out a fresh list
+    return tuple(remove_duplicates([_clean_str(item) for item in items if item.strip()]))
+
+
+def normalization_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Reports how often the memoized text normalization functions were answered from their cache in this process.
+
+    :return: A dictionary of hits, misses, current size and hit rate for each memoized function.
+    """
+    stats = {}
+    for name, function in (("clean_str", _clean_str), ("clean_list", _clean_tuple),
+                           ("insert_newlines", insert_newlines)):
+        info = function.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+        }
+    return stats
+
+
+def merge_normalization_stats(stats_list: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """
+    Adds up ``normalization_stats()`` reports from several processes.
+
+    :param stats_list: The reports to combine.
+    :return: A single report with the summed counters and the overall hit rate.
+    """
+    merged = {}
+    for stats in stats_list:
+        for name, counters in stats.items():
+            total = merged.setdefault(name, {"hits": 0, "misses": 0, "size": 0, "hit_rate": 0.0})
+            for key in ("hits", "misses", "size"):
+                total[key] += counters[key]
+
+    for total in merged.values():
+        lookups = total["hits"] + total["misses"]
+        total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+    return merged
+
+
 def remove_duplicates(input_list) -> List:
     seen = set()
     return [x for x in input_list if not (x in seen or seen.add(x))]
@@ -81,6 +144,7 @@ def clean_html(html_string) -> str:
     return ' '.join(line.strip() for line in soup.get_text().split() if line.strip())
 
 
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
 def insert_newlines(text: str) -> str:
     """
     Inserts a newline after periods and question marks in the input text, unless they are inside parentheses.
@@ -92,27 +156,20 @@ def insert_newlines(text: str) -> str:
     result = []
     parenthesis_count = 0
 
-    # Split the text into tokens
-    tokens = text.split()
+    for match in SENTENCE_TOKEN_PATTERN.finditer(text):
+        token, next_token = match.groups()
 
-    for i, token in enumerate(tokens):
         if token == '(':
             parenthesis_count += 1
         elif token == ')':
             parenthesis_count -= 1
-        elif token.endswith(('.', '!', '?')) and parenthesis_count == 0:
-            # Check if the next token is 'i.e.' or 'e.g.'
-            next_token = tokens[i + 1] if i + 1 < len(tokens) else ''
-            if not next_token.lower() in ['i.e.', 'e.g.']:
-                result.append(token)
-                result.append('\n')
-                continue
-
-        result.append(token)
+        elif token.endswith(SENTENCE_ENDINGS) and parenthesis_count == 0 \
+                and next_token.lower() not in ABBREVIATIONS:
+            result.append(f"{token}\n")
+            continue
 
-        if i < len(tokens) - 1:
-            # Append a space between tokens
-            result.append(' ')
+        # Tokens are separated by a single space, except for the last one
+        result.append(f"{token} " if next_token else token)
 
     return ''.join(result)
 
@@ -237,3 +294,119 @@ def clean_filename(text):
     text = text[:max_filename_length]
 
     return text
+
+
+def file_digest(file_path: Path) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def create_temp_file(file_path: Path) -> Tuple[int, str]:
+    """
+    Creates a new, empty temporary file next to ``file_path``, to be renamed over it once written.
+
+    Unlike ``tempfile.mkstemp``, which makes the file owner-only, it is created with mode 0o666, so the kernel applies
+    the umask and the renamed file gets the permissions a normally created file would have.
+
+    :return: The open file descriptor and the path of the temporary file.
+    """
+    while True:
+        temp_path = str(file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex[:8]}.tmp"))
+        try:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+            return os.open(temp_path, flags, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def write_if_changed(file_path: Path, content: str) -> bool:
+    """
+    Atomically replaces a text file with the given content, unless the file already holds exactly that content.
+
+    The content is written to a temporary file in the same directory, flushed to disk and renamed over the target,
+    so readers never see a half-written file.
+
+    :param file_path: The path of the file to write.
+    :param content: The text to write. Newlines are translated the same way as a file opened in text mode.
+    :return: True if the file was written, False if it was already up to date.
+    """
+    file_path = Path(file_path)
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    data = content.encode('utf-8')
+
+    try:
+        if os.path.getsize(file_path) == len(data) and file_digest(file_path) == hashlib.sha256(data).hexdigest():
+            return False
+    except FileNotFoundError:
+        pass
+
+    file_descriptor, temp_path = create_temp_file(file_path)
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return True
+
+
+def write_stream_if_changed(file_path: Path, write_to: Callable[[TextIO], None]) -> bool:
+    """
+    Like ``write_if_changed``, but the content is streamed straight into the temporary file instead of being built
+    in memory first. The temporary file is only synced and renamed over the target if it differs from it.
+
+    :param file_path: The path of the file to write.
+    :param write_to: A function writing the content to the text stream it is given.
+    :return: True if the file was written, False if it was already up to date.
+    """
+    file_path = Path(file_path)
+    file_descriptor, temp_path = create_temp_file(file_path)
+    try:
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as temp_file:
+            write_to(temp_file)
+            temp_file.flush()
+
+            try:
+                unchanged = os.path.getsize(file_path) == os.path.getsize(temp_path) \
+                            and file_digest(file_path) == file_digest(temp_path)
+            except FileNotFoundError:
+                unchanged = False
+
+            if not unchanged:
+                os.fsync(temp_file.fileno())
+
+        if unchanged:
+            os.remove(temp_path)
+            return False
+
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return True
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Returns the peak resident memory of this process, or of the largest of its finished child processes, in MB.
+
+    :param children: Measure the child processes (e.g. pool workers that have exited) instead of this process.
+    :return: The peak memory, or None where it can't be measured.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+CLAIMS_DIR_NAME = ".claims"
+LEASE_SUFFIX = ".lease"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Lets several processes, on one or many hosts, share the same input directory without processing a file twice.
+
+    A file is claimed by renaming it into this worker's claim directory (``<queue_dir>/.claims/<worker_id>``). The
+    rename is atomic on a shared filesystem, so exactly one worker wins each file and the others simply skip it. Every
+    claimed file has a lease file holding its expiry time, renewed while the file is being processed. When a worker
+    dies, its leases expire and any other worker moves the files back into the queue.
+
+    Lease expiry times are wall-clock timestamps, so the clocks of the hosts must be roughly in sync.
+
+    :param queue_dir: The shared input directory.
+    :param file_patterns: The glob patterns of the files to claim, e.g. ``["*.html", "*.html.gz"]``.
+    :param worker_id: A name unique to this worker across all hosts.
+    :param lease_seconds: How long a claim stays valid without being renewed.
+    """
+
+    def __init__(self, queue_dir: Path, file_patterns: Iterable[str], worker_id: str, lease_seconds: float):
+        self.queue_dir = Path(queue_dir)
+        self.file_patterns = list(file_patterns)
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.claims_root = self.queue_dir / CLAIMS_DIR_NAME
+        self.claim_dir = self.claims_root / worker_id
+        self.claim_dir.mkdir(parents=True, exist_ok=True)
+
+    def lease_path(self, claimed_file: Path) -> Path:
+        return claimed_file.with_name(f"{claimed_file.name}{LEASE_SUFFIX}")
+
+    def write_lease(self, claimed_file: Path) -> None:
+        lease = {
+            "worker_id": self.worker_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "expires_at": time.time() + self.lease_seconds,
+        }
+        temp_path = claimed_file.with_name(f".{claimed_file.name}{LEASE_SUFFIX}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as lease_file:
+            json.dump(lease, lease_file)
+        os.replace(temp_path, self.lease_path(claimed_file))
+
+    def claim(self, limit: int) -> List[Path]:
+        """
+        Claims up to ``limit`` files from the queue.
+
+        :param limit: The maximum number of files to claim.
+        :return: The claimed files, now located in this worker's claim directory.
+        """
+        claimed = []
+        for file in sorted(file for pattern in self.file_patterns for file in self.queue_dir.glob(pattern)):
+            if len(claimed) >= limit:
+                break
+
+            claimed_file = self.claim_dir / file.name
+            # The lease is written first, so a claimed file never exists without one
+            self.write_lease(claimed_file)
+            try:
+                os.rename(file, claimed_file)
+            except FileNotFoundError:
+                # Another worker claimed it first
+                os.remove(self.lease_path(claimed_file))
+                continue
+            claimed.append(claimed_file)
+        return claimed
+
+    def renew(self, claimed_files: List[Path]) -> None:
+        for claimed_file in claimed_files:
+            if claimed_file.exists():
+                self.write_lease(claimed_file)
+
+    @contextmanager
+    def keep_alive(self, claimed_files: List[Path]) -> Iterator[None]:
+        """
+        Renews the leases of the claimed files in the background for as long as the context is open.
+        """
+        stop = threading.Event()
+
+        def renew_periodically():
+            while not stop.wait(self.lease_seconds / 3):
+                self.renew(claimed_files)
+
+        thread = threading.Thread(target=renew_periodically, name="lease-renewal", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self, claimed_files: List[Path]) -> None:
+        """
+        Drops the leases of finished files. Files that are still in the claim directory were neither published
+        nor quarantined, and are left there for inspection.
+        """
+        for claimed_file in claimed_files:
+            lease = self.lease_path(claimed_file)
+            if lease.exists():
+                os.remove(lease)
+            if claimed_file.exists():
+                logging.warning(f"{claimed_file} was not moved out of the claim directory after processing")
+
+    def close(self) -> None:
+        """
+        Removes this worker's claim directory if nothing is left in it.
+        """
+        try:
+            self.claim_dir.rmdir()
+        except OSError:
+            pass
+
+    def recover_expired_leases(self) -> int:
+        """
+        Moves files whose lease has expired, from any worker, back into the queue.
+
+        :return: The number of files returned to the queue.
+        """
+        recovered = 0
+        now = time.time()
+        for lease in self.claims_root.glob(f"*/*{LEASE_SUFFIX}"):
+            try:
+                with open(lease, "r", encoding="utf-8") as lease_file:
+                    expires_at = json.load(lease_file)["expires_at"]
+            except (OSError, ValueError, KeyError):
+                continue
+
+            if expires_at > now:
+                continue
+
+            claimed_file = lease.with_name(lease.name[:-len(LEASE_SUFFIX)])
+            try:
+                os.rename(claimed_file, self.queue_dir / claimed_file.name)
+                recovered += 1
+                logging.warning(f"Lease on {claimed_file} expired. Returned it to the queue.")
+            except FileNotFoundError:
+                pass
+
+            try:
+                os.remove(lease)
+            except FileNotFoundError:
+                pass
+        return recovered
@@ -0,0 +1,226 @@
+import gc
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+START_METHODS = ["fork", "forkserver", "spawn"]
+
+# Imported by every worker before its first task, so no task pays for importing the parsing stack
+PRELOAD_MODULES = [
+    "bs4",
+    "yaml",
+    "utils.parser",
+    "utils.quiz",
+    "utils.quiz_writer",
+    "utils.quiz_processor",
+]
+
+# Settings a worker receives once from the pool initializer instead of with every task
+_worker_context: Dict[str, Any] = {}
+
+
+class FileTimeoutError(TimeoutError):
+    """Raised in a worker when a single file takes longer than the per-file timeout."""
+
+
+def run_with_time_limit(function: Callable[[Path], Any], file: Path, timeout: Optional[float]) -> Any:
+    """
+    Calls ``function(file)``, raising FileTimeoutError in the worker if it runs longer than ``timeout`` seconds.
+
+    The limit is enforced with SIGALRM, so on platforms without it (Windows) the file runs unbounded and only the
+    pool watchdog in ``QuizProcessor.map_files`` can recover from a hung worker.
+
+    :param function: The function processing the file.
+    :param file: The file to process.
+    :param timeout: The limit in seconds. None or 0 disables it.
+    :return: Whatever ``function`` returns.
+    """
+    if not timeout or not hasattr(signal, "SIGALRM"):
+        return function(file)
+
+    def on_timeout(signum, frame):
+        raise FileTimeoutError(f"Processing {file} took longer than {timeout} seconds")
+
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function(file)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def run_tracked(function: Callable[[Any], Any], task: Any) -> Any:
+    """
+    Calls ``function(task)`` after telling the pool that this worker process started on ``task``, so a worker that
+    hangs or dies can be matched to the task it was running. See ``WorkerPool.started_tasks``.
+    """
+    started = _worker_context.get("task_started")
+    if started is not None:
+        started.put((os.getpid(), task))
+    return function(task)
+
+
+def terminate_workers(executor: ProcessPoolExecutor, pids: Iterable[int] = ()) -> None:
+    """
+    Kills the worker processes of the pool. Futures that have not finished fail with BrokenProcessPool, and the pool
+    has to be replaced.
+
+    :param executor: The pool. Workers it lists are killed as well, so idle ones do not hold up its shutdown.
+    :param pids: The workers ``run_tracked`` reported. Every worker that is running a tracked task is among them.
+    """
+    pids = set(pids)
+    # ProcessPoolExecutor has no public way to list or stop its workers, only this private mapping
+    processes = getattr(executor, "_processes", None)
+    if processes is None:
+        logging.warning("The process pool does not list its workers, so only workers that started a task are "
+                        "terminated")
+    else:
+        pids.update(process.pid for process in list(processes.values()))
+    for pid in sorted(pids):
+        logging.warning(f"Terminating worker process {pid}")
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def warm_worker(context: Dict[str, Any], task_started=None) -> None:
+    """
+    Pool initializer: preloads the parsing stack, stores the run's settings and freezes everything allocated so far,
+    so the garbage collector never rescans those long-lived objects during the run.
+
+    :param context: Settings every task of this worker needs, e.g. the QuizProcessor configured for the run. A
+                    ``log_path`` entry sets up logging in workers that did not inherit it (spawn and forkserver), and
+                    a true ``profile_memory`` entry turns on memory profiling in the worker.
+    :param task_started: The queue ``run_tracked`` announces started tasks on, or None.
+    """
+    for module in PRELOAD_MODULES:
+        importlib.import_module(module)
+
+    _worker_context.update(context)
+    _worker_context["task_started"] = task_started
+
+    if context.get("profile_memory"):
+        from utils.memory_profile import enable_memory_profiling
+        enable_memory_profiling()
+
+    if "log_path" in context and not logging.getLogger().handlers:
+        from utils.log_config import setup_logging
+        setup_logging(context["log_path"])
+
+    gc.collect()
+    gc.freeze()
+
+
+def worker_context(key: str) -> Any:
+    """
+    Returns a setting passed to ``warm_worker``. Only valid inside a worker process.
+    """
+    return _worker_context[key]
+
+
+class InlineExecutor(Executor):
+    """
+    Runs every task immediately in the calling process. Used when a run is too small to be worth starting a pool.
+
+    :param context: The settings a pool worker would receive, see ``warm_worker``.
+    """
+
+    def __init__(self, context: Dict[str, Any]):
+        warm_worker(context)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as ex:
+            future.set_exception(ex)
+        return future
+
+
+class WorkerPool:
+    """
+    A process pool shared by every phase of a run (or by a long-running service).
+
+    The underlying ProcessPoolExecutor is created on first use, with ``warm_worker`` as its initializer, and is
+    replaced transparently after ``recycle()``. Every replacement starts a new ``generation``, so callers can tell
+    which pool a task was submitted to, and several failures seen on the same pool recycle it only once.
+
+    :param max_workers: The number of worker processes.
+    :param start_method: "fork", "forkserver" or "spawn". None uses the platform default.
+    :param context: The settings passed once to every worker, see ``warm_worker``.
+    :param in_process: Run every task in the calling process instead of starting worker processes.
+    """
+
+    def __init__(self, max_workers: int, start_method: Optional[str] = None, context: Dict[str, Any] = None,
+                 in_process: bool = False):
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.context = context or {}
+        self.in_process = in_process
+        self.generation = 0
+        self._executor: Optional[Executor] = None
+        # Announcements from run_tracked, one queue per pool, since a killed worker can leave it locked
+        self._task_started = None
+        self._last_started: Dict[int, Any] = {}
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.shutdown()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None and self.in_process:
+            self._executor = InlineExecutor(self.context)
+        elif self._executor is None:
+            mp_context = multiprocessing.get_context(self.start_method)
+            if self.start_method == "forkserver":
+                # Workers forked from the server then start with the modules already imported
+                mp_context.set_forkserver_preload(PRELOAD_MODULES)
+            self._task_started = mp_context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context,
+                                                 initializer=warm_worker, initargs=(self.context, self._task_started))
+        return self._executor
+
+    def started_tasks(self) -> Dict[int, Any]:
+        """
+        Returns the task each worker process of the current pool started last, keyed by PID, as announced by
+        ``run_tracked``. Callers running tracked tasks must call this regularly, since announcements are written
+        synchronously and a worker waits once they fill the pipe.
+        """
+        if self._task_started is not None:
+            while not self._task_started.empty():
+                pid, task = self._task_started.get()
+                self._last_started[pid] = task
+        return dict(self._last_started)
+
+    def recycle(self, generation: Optional[int] = None) -> bool:
+        """
+        Kills the current workers. The next use of ``executor`` starts a fresh pool.
+
+        :param generation: The generation the caller saw fail. If the pool was already replaced since, nothing is done.
+        :return: True if the workers were killed.
+        """
+        if self._executor is None or (generation is not None and generation != self.generation):
+            return False
+        self.generation += 1
+        pids = self.started_tasks().keys()
+        self._task_started = None
+        self._last_started = {}
+        terminate_workers(self._executor, pids)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        return True
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None